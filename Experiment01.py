@@ -1,26 +1,19 @@
-import requests
-import time
+import argparse
 import csv
 from typing import List
-from collections import Counter, defaultdict
-import math
-from rapidfuzz import fuzz
 
+from experiment_engine import run_experiment_chains
+from run_journal import RunJournal, load_chains
+from fuzzy_clustering import mutual_information_estimate_fuzzy
+from deepseek_client import RESPONSE_CACHE, TELEMETRY, USAGE, query_deepseek
 
 
-# DeepSeek API Configuration
-API_KEY = "NEED API-KEY TO RUN"
-API_URL = 'https://api.deepseek.com/v1/chat/completions'
-MODEL = 'deepseek-chat'  # Adjust based on your subscription
-
-HEADERS = {
-    'Authorization': f'Bearer {API_KEY}',
-    'Content-Type': 'application/json'
-}
 
 # Parameters
 REPEAT_COUNT = 10
+CONCURRENCY = 8  # Query chains in flight at once
 OUTPUT_FILE = 'deepseek_v3_mi_estimate.csv'
+JOURNAL_FILE = 'journals/Experiment01.jsonl'  # Every response, as it arrives
 
 # ---- Prompt Constructor ----
 def construct_prompt(query: str, prev_answers: List[str]) -> str:
@@ -30,22 +23,6 @@ def construct_prompt(query: str, prev_answers: List[str]) -> str:
     prompt += f"Provide an answer to the following question:\nQ: {query}\nA:"
     return prompt
 
-# ---- Query DeepSeek-v3 ----
-def query_deepseek(prompt: str) -> str:
-    payload = {
-        "model": MODEL,
-        "messages": [{"role": "user", "content": prompt}],
-        "temperature": 1.0
-    }
-
-    response = requests.post(API_URL, headers=HEADERS, json=payload)
-    if response.status_code != 200:
-        print(f"Error: {response.status_code} - {response.text}")
-        return "ERROR"
-    
-    return response.json()['choices'][0]['message']['content'].strip()
-
-    
 
 # # ---- Mutual Information Estimate ----
 # def mutual_information_estimate(responses: List[str]) -> float:
@@ -56,50 +33,34 @@ def query_deepseek(prompt: str) -> str:
 #     return mi
 
 
-def mutual_information_estimate_fuzzy(responses, similarity_threshold=85):
-    # --- Step 1: Cluster similar responses ---
-    clusters = []
-    for response in responses:
-        matched = False
-        for cluster in clusters:
-            if fuzz.ratio(response, cluster[0]) >= similarity_threshold:
-                cluster.append(response)
-                matched = True
-                break
-        if not matched:
-            clusters.append([response])
-
-    # --- Step 2: Get cluster sizes (empirical probabilities) ---
-    total = len(responses)
-    cluster_sizes = [len(c) for c in clusters]
-    probs = [size / total for size in cluster_sizes]
-
-    # --- Step 3: Compute entropy-based MI lower bound ---
-    mi = sum(p * math.log(p / (1 / len(probs))) for p in probs if p > 0)
-    return mi
 # ---- Run Main Experiment ----
-def run_deepseek_experiment(queries: List[str]):
+def run_deepseek_experiment(queries: List[str], resume: bool = False):
+    resume_from = load_chains(JOURNAL_FILE) if resume else None
+    with RunJournal(JOURNAL_FILE, append=resume) as journal:
+        all_responses = run_experiment_chains(
+            queries,
+            lambda query, prev_answers, i: construct_prompt(query, prev_answers),
+            query_deepseek,
+            repeat_count=REPEAT_COUNT,
+            concurrency=CONCURRENCY,
+            journal=journal,
+            resume_from=resume_from,
+        )
+
     with open(OUTPUT_FILE, mode='w', newline='', encoding='utf-8') as csvfile:
         writer = csv.writer(csvfile)
         writer.writerow(["Query", "Y1", "Y2", "MutualInformation", "AllResponses"])
 
-        for query in queries:
-            print(f"Processing: {query}")
-            responses = []
-            for i in range(REPEAT_COUNT):
-                prompt = construct_prompt(query, responses)
-                print(f"\tPROMPT {i}: {prompt} \n")
-                response = query_deepseek(prompt)
-                responses.append(response)
-                print(f'RESPONSE: {response}')
-                time.sleep(1.2)  # Respect rate limit
-                
-
+        for query, responses in zip(queries, all_responses):
             #mi = mutual_information_estimate(responses)
             mi = mutual_information_estimate_fuzzy(responses, similarity_threshold=85)
             writer.writerow([query, responses[0], responses[1] if len(responses) > 1 else "", f"{mi:.4f}", "|".join(responses)])
             print(f"→ MI = {mi:.4f} for query: {query}")
 
+    print(f"Response cache: {RESPONSE_CACHE.stats()}")
+    print(USAGE.format())
+    print(f"Metrics: {TELEMETRY.export()}")
+
 # ---- Example Usage ----
 queries = [
     "What is the capital of the U.K.?",
@@ -112,4 +73,10 @@ queries = [
     "If Monday's child is fair of face, what is Saturday's child?"
 ]
 
-run_deepseek_experiment(queries)
\ No newline at end of file
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--resume', action='store_true',
+                        help="Continue the chains recorded in JOURNAL_FILE instead of starting over")
+    args = parser.parse_args()
+
+    run_deepseek_experiment(queries, resume=args.resume)
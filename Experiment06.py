@@ -1,29 +1,22 @@
-import requests
-import time
+import argparse
 import csv
 from typing import List
-from collections import Counter, defaultdict
-import math
-from rapidfuzz import fuzz
-from sentence_transformers import SentenceTransformer, util
+
+from pipeline import run_pipelined_experiment, store_encode_fn
+from run_journal import RunJournal, load_chains
+from embedding_store import EmbeddingStore
+from lazy_loading import warm_embedding_model
+from deepseek_client import RESPONSE_CACHE, TELEMETRY, USAGE, query_deepseek
 
 """
 MULT-LABEL queries with distractions injected. MI updated to use Semantic Clustering. 
 """
 
-# DeepSeek API Configuration
-API_KEY = "NEED API-KEY TO RUN"
-API_URL = 'https://api.deepseek.com/v1/chat/completions'
-MODEL = 'deepseek-chat'  # Adjust based on your subscription
-
-HEADERS = {
-    'Authorization': f'Bearer {API_KEY}',
-    'Content-Type': 'application/json'
-}
-
 # Parameters
 REPEAT_COUNT = 10
+CONCURRENCY = 8  # Query chains in flight at once
 OUTPUT_FILE = 'deepseek_v3_mi_estimate.csv'
+JOURNAL_FILE = 'journals/Experiment06.jsonl'  # Every response, as it arrives
 
 # ---- Prompt Constructor Injects uncertainty ----
 def construct_prompt(query: str, prev_answers: List[str], distractors: dict = None, iteration: int = 0) -> str:
@@ -40,88 +33,46 @@ def construct_prompt(query: str, prev_answers: List[str], distractors: dict = No
     prompt += f"Provide an answer to the following question:\nQ: {query}\nA:"
     return prompt
 
-# ---- Query DeepSeek-v3 ----
-def query_deepseek(prompt: str) -> str:
-    payload = {
-        "model": MODEL,
-        "messages": [{"role": "user", "content": prompt}],
-        "temperature": 1.0
-    }
-
-    response = requests.post(API_URL, headers=HEADERS, json=payload)
-    if response.status_code != 200:
-        print(f"Error: {response.status_code} - {response.text}")
-        return "ERROR"
-    
-    return response.json()['choices'][0]['message']['content'].strip()
-
-    
-
-
-model = SentenceTransformer('all-MiniLM-L6-v2')
-
-def cluster_responses_semantically(responses, threshold=0.7):
-    """
-    Cluster responses based on semantic similarity using Sentence Transformers.
-    """
-    embeddings = model.encode(responses, convert_to_tensor=True)
-    clusters = []
-    used = set()
-
-    for i in range(len(responses)):
-        if i in used:
-            continue
-        new_cluster = [responses[i]]
-        used.add(i)
-
-        for j in range(i + 1, len(responses)):
-            if j in used:
-                continue
-            similarity = util.pytorch_cos_sim(embeddings[i], embeddings[j]).item()
-            if similarity >= threshold:
-                new_cluster.append(responses[j])
-                used.add(j)
-
-        clusters.append(new_cluster)
-
-    return clusters
-
-def mutual_information_estimate_semantic(responses, similarity_threshold=0.7):
-    clusters = cluster_responses_semantically(responses, threshold=similarity_threshold)
-    
-    # Compute probabilities of each cluster
-    total = len(responses)
-    cluster_sizes = [len(c) for c in clusters]
-    probs = [size / total for size in cluster_sizes]
-
-    # Compute MI score
-    mi = sum(p * math.log(p / (1 / len(probs))) for p in probs if p > 0)
-    return mi
+
+EMBEDDING_MODEL = 'all-MiniLM-L6-v2'  # Loaded in the background while the first calls run
+embedding_store = EmbeddingStore(EMBEDDING_MODEL)
+
 
 # ---- Run Main Experiment ----
 
-def run_deepseek_experiment(queries: List[str]):
+def run_deepseek_experiment(queries: List[str], resume: bool = False):
+    warm_embedding_model(EMBEDDING_MODEL)
+    resume_from = load_chains(JOURNAL_FILE) if resume else None
+    with RunJournal(JOURNAL_FILE, append=resume) as journal:
+        # Responses are embedded and clustered in micro-batches while the chains keep fetching
+        all_responses, estimators, pipeline_stats = run_pipelined_experiment(
+            queries,
+            lambda query, prev_answers, i: construct_prompt(query, prev_answers, distractors=distractors, iteration=i),
+            query_deepseek,
+            repeat_count=REPEAT_COUNT,
+            encode_fn=store_encode_fn(EMBEDDING_MODEL, embedding_store),
+            similarity_threshold=85,
+            concurrency=CONCURRENCY,
+            journal=journal,
+            resume_from=resume_from,
+        )
+
     with open(OUTPUT_FILE, mode='w', newline='', encoding='utf-8') as csvfile:
         writer = csv.writer(csvfile)
         writer.writerow(["Query", "Y1", "Y2", "MutualInformation", "AllResponses"])
 
-        for query in queries:
-            print(f"Processing: {query}")
-            responses = []
-            for i in range(REPEAT_COUNT):
-                prompt = construct_prompt(query, responses, distractors=distractors, iteration=i)
-                print(f"\tPROMPT {i}: {prompt} \n")
-                response = query_deepseek(prompt)
-                responses.append(response)
-                print(f'RESPONSE: {response}\n')
-                time.sleep(1.2)  # Respect rate limit
-                
-
+        for query, responses, estimator in zip(queries, all_responses, estimators):
             #mi = mutual_information_estimate(responses)
-            mi = mutual_information_estimate_semantic(responses, similarity_threshold=85)
+            mi = estimator.mi  # equals mutual_information_estimate_semantic(responses, ...)
             writer.writerow([query, responses[0], responses[1] if len(responses) > 1 else "", f"{mi:.4f}", "|".join(responses)])
             print(f"→ MI = {mi:.4f} for query: {query}")
 
+    print(f"Response cache: {RESPONSE_CACHE.stats()}")
+    print(USAGE.format())
+    print(f"Metrics: {TELEMETRY.export()}")
+    print(f"Embedding store: {embedding_store.stats()}")
+    print(f"Embedding pipeline: {pipeline_stats}")
+
 
 queries = [
     "Name a city in the UK?",
@@ -145,4 +96,10 @@ distractors = {
     ]
 }
 
-run_deepseek_experiment(queries)
\ No newline at end of file
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--resume', action='store_true',
+                        help="Continue the chains recorded in JOURNAL_FILE instead of starting over")
+    args = parser.parse_args()
+
+    run_deepseek_experiment(queries, resume=args.resume)
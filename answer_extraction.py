@@ -0,0 +1,122 @@
+import re
+import threading
+from typing import Callable, Dict, Optional, Sequence, Tuple
+
+"""
+Answer extraction before clustering.
+
+Responses carry boilerplate and explanations around the answer ("A: Manchester.
+(Note: Los Angeles is not a city in the UK; ...)"), and fuzzy ratios and embeddings
+over the whole paragraph cost more and, when the notes echo a distractor, pull
+unrelated answers together. An AnswerExtractor reduces each response to its answer
+span with a chain of rules:
+
+    none        - the response as is
+    strip       - no "A:" / "Answer:" label or echoed "Another answer to question Q
+                  is:", no markdown emphasis, no (parenthetical) or [bracketed] notes
+    first_span  - strip, then only the first line and sentence, without the final
+                  full stop
+
+It is a `processor` for every clustering path (fuzzy, semantic, cascade, online and
+pipelined), caches the result per distinct text, and counts the characters it removed.
+Custom rules are plain str -> str callables.
+"""
+
+DEFAULT_EXTRACTION = 'first_span'
+
+# rule(text) -> text
+ExtractionRule = Callable[[str], str]
+
+_ANSWER_LABEL = re.compile(r'^\s*(?:another answer to question q is|answer|a)\s*:\s*', re.IGNORECASE)
+_EMPHASIS = re.compile(r'(\*{1,3}|_{2,3}|`)(?=\S)(.+?)(?<=\S)\1')
+_PARENTHETICAL = re.compile(r'\s*(?:\([^()]*\)|\[[^\[\]]*\])')
+_SENTENCE_END = re.compile(r'(?<=[.!?])\s+(?=[A-Z"\'(])')
+
+
+# ---- Rules ----
+def strip_answer_label(text: str) -> str:
+    return _ANSWER_LABEL.sub('', text, count=1)
+
+
+def strip_markdown(text: str) -> str:
+    return _EMPHASIS.sub(r'\2', text)
+
+
+def strip_parentheticals(text: str) -> str:
+    # Innermost first, so nested notes go too
+    while True:
+        stripped = _PARENTHETICAL.sub('', text)
+        if stripped == text:
+            return text
+        text = stripped
+
+
+def first_span(text: str) -> str:
+    line = next((line for line in text.strip().splitlines() if line.strip()), '')
+    sentence = _SENTENCE_END.split(line.strip(), maxsplit=1)[0]
+    return sentence.rstrip(' .')
+
+
+EXTRACTION_RULES: Dict[str, Tuple[ExtractionRule, ...]] = {
+    'none': (),
+    'strip': (strip_answer_label, strip_markdown, strip_parentheticals),
+    'first_span': (strip_answer_label, strip_markdown, strip_parentheticals, first_span),
+}
+EXTRACTION_STRATEGIES = tuple(EXTRACTION_RULES)
+
+
+class AnswerExtractor:
+    """
+    Callable text -> answer span. An empty extraction falls back to the stripped text.
+    """
+
+    def __init__(self, strategy: str = DEFAULT_EXTRACTION, rules: Optional[Sequence[ExtractionRule]] = None):
+        if rules is None:
+            if strategy not in EXTRACTION_RULES:
+                raise ValueError(f"strategy must be one of {EXTRACTION_STRATEGIES}, got {strategy!r}")
+            rules = EXTRACTION_RULES[strategy]
+        else:
+            strategy = 'custom'
+        self.strategy = strategy
+        self.rules = tuple(rules)
+        self.calls = 0
+        self.chars_in = 0
+        self.chars_removed = 0
+        self._cache: Dict[str, str] = {}
+        self._lock = threading.Lock()
+
+    def extract(self, text: str) -> str:
+        answer = text
+        for rule in self.rules:
+            answer = rule(answer)
+        return answer.strip() or text.strip()
+
+    def __call__(self, text: str) -> str:
+        answer = self._cache.get(text)
+        if answer is None:
+            answer = self._cache[text] = self.extract(text)
+        with self._lock:
+            self.calls += 1
+            self.chars_in += len(text)
+            self.chars_removed += len(text) - len(answer)
+        return answer
+
+    def stats(self) -> dict:
+        return {'responses': self.calls, 'distinct': len(self._cache),
+                'mean_chars_removed': self.chars_removed / self.calls if self.calls else 0.0,
+                'removed_share': self.chars_removed / self.chars_in if self.chars_in else 0.0}
+
+    def format(self) -> str:
+        stats = self.stats()
+        return (f"answer extraction ({self.strategy}): {stats['responses']} responses "
+                f"({stats['distinct']} distinct), {stats['mean_chars_removed']:.1f} characters removed "
+                f"on average ({stats['removed_share']:.0%} of the text) before similarity")
+
+
+def make_extractor(strategy: Optional[str]) -> Optional[AnswerExtractor]:
+    """
+    An extractor for `strategy`, or None (no processor at all) for None / 'none'.
+    """
+    if strategy in (None, 'none'):
+        return None
+    return AnswerExtractor(strategy)
@@ -0,0 +1,65 @@
+import argparse
+import glob
+import os
+import sys
+import time
+
+REPO = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, REPO)
+import numpy as np
+import pandas as pd
+
+from answer_extraction import EXTRACTION_STRATEGIES, make_extractor
+from fuzzy_clustering import cluster_labels_fuzzy
+from mi_estimators import mi_lower_bound
+
+"""
+Fuzzy clustering of the bundled result CSVs with each answer-extraction strategy:
+characters removed, clustering time, clusters per chain and mean MI.
+
+    python benchmarks/bench_answer_extraction.py
+    python benchmarks/bench_answer_extraction.py --repeat 20 --show 5
+"""
+
+DEFAULT_DATA = [os.path.join(REPO, 'data', '**', '*.csv'), os.path.join(REPO, '*.csv')]
+
+
+def load_chains(patterns: list) -> list:
+    chains = []
+    for pattern in patterns:
+        for path in sorted(glob.glob(pattern, recursive=True)):
+            frame = pd.read_csv(path)
+            if "AllResponses" in frame:
+                chains += [str(responses).split('|') for responses in frame["AllResponses"]]
+    return chains
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Answer extraction before fuzzy clustering")
+    parser.add_argument('--data', nargs='+', default=DEFAULT_DATA)
+    parser.add_argument('--threshold', type=float, default=85)
+    parser.add_argument('--repeat', type=int, default=5, help="Timed passes over all chains")
+    parser.add_argument('--show', type=int, default=0, help="Print this many example extractions")
+    args = parser.parse_args()
+
+    chains = load_chains(args.data)
+    print(f"{len(chains)} chains, {sum(map(len, chains))} responses")
+    for strategy in EXTRACTION_STRATEGIES:
+        extractor = make_extractor(strategy)
+        start = time.perf_counter()
+        for _ in range(args.repeat):
+            labels = [cluster_labels_fuzzy(chain, args.threshold, processor=extractor) for chain in chains]
+        seconds = (time.perf_counter() - start) / args.repeat
+        clusters = np.mean([label.max() + 1 for label in labels])
+        mi = np.mean([mi_lower_bound(label) for label in labels])
+        removed = f", {extractor.format()}" if extractor is not None else ""
+        print(f"{strategy:<10} {seconds * 1000:7.1f} ms per pass, {clusters:.2f} clusters per chain, "
+              f"mean MI {mi:.4f}{removed}")
+
+    extractor = make_extractor('first_span')
+    for text in list(dict.fromkeys(response for chain in chains for response in chain))[:args.show]:
+        print(f"  {text[:80]!r}\n    -> {extractor(text)!r}")
+
+
+if __name__ == '__main__':
+    main()
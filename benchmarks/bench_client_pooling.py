@@ -0,0 +1,130 @@
+import argparse
+import json
+import os
+import statistics
+import sys
+import tempfile
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import requests
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from deepseek_client import _make_requests_session, post_json
+from rate_limiter import RateLimiter, send_with_backoff
+from standin_server import StandInConfig, StandInServer
+
+"""
+Per-call latency of a fresh connection per request vs the pooled keep-alive client,
+measured against a local stand-in for /v1/chat/completions. Then streamed calls through
+send_with_backoff against injected 429s on a 2-connection pool, which must finish:
+a throttled stream that is retried without being closed keeps its pool slot, and once
+the pool is used up every call blocks forever (exit status 1).
+
+    python benchmarks/bench_client_pooling.py --calls 500
+"""
+
+COMPLETION = json.dumps({
+    "choices": [{"index": 0, "message": {"role": "assistant", "content": "London."}}],
+    "usage": {"prompt_tokens": 20, "completion_tokens": 2, "total_tokens": 22}
+}).encode()
+
+
+class StandInHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"  # keep-alive
+    disable_nagle_algorithm = True
+
+    def do_POST(self):
+        self.rfile.read(int(self.headers.get('Content-Length', 0)))
+        self.send_response(200)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(COMPLETION)))
+        self.end_headers()
+        self.wfile.write(COMPLETION)
+
+    def log_message(self, format, *args):
+        pass
+
+
+def time_calls(send, calls: int) -> list:
+    latencies = []
+    for _ in range(calls):
+        start = time.perf_counter()
+        response = send()
+        response.json()
+        latencies.append((time.perf_counter() - start) * 1000)
+    return latencies
+
+
+def report(name: str, latencies: list):
+    latencies = sorted(latencies)
+    p99 = latencies[int(0.99 * (len(latencies) - 1))]
+    print(f"{name:<10} mean {statistics.mean(latencies):7.3f} ms   p50 {statistics.median(latencies):7.3f} ms"
+          f"   p99 {p99:7.3f} ms")
+
+
+def throttled_streaming(calls: int, error_rate: float, deadline: float) -> bool:
+    """
+    `calls` streamed requests through send_with_backoff on a 2-connection pool; False
+    if they did not finish within `deadline` seconds.
+    """
+    config = StandInConfig(error_rate_429=error_rate, retry_after=0.01)
+    payload = {"model": "deepseek-chat", "messages": [{"role": "user", "content": "Q: capital of the U.K.?"}],
+               "stream": True}
+    with StandInServer(config) as server, tempfile.TemporaryDirectory() as workdir:
+        url = f'{server.base_url}/v1/chat/completions'
+        session = _make_requests_session(pool_size=2)
+        limiter = RateLimiter(1e6, 1e9, db_path=os.path.join(workdir, 'rate_limit.sqlite'))
+        retries = []
+
+        def run():
+            for _ in range(calls):
+                stats = {}
+                response = send_with_backoff(lambda: post_json(url, payload, client=session, stream=True),
+                                             limiter, 50, max_retries=50, stats=stats)
+                for _ in response.iter_lines():
+                    pass
+                response.close()
+                retries.append(stats['retries'])
+
+        start = time.perf_counter()
+        worker = threading.Thread(target=run, daemon=True)
+        worker.start()
+        worker.join(deadline)
+        print(f"throttled  {len(retries)}/{calls} streamed calls in {time.perf_counter() - start:.2f}s "
+              f"({sum(retries)} retried 429s, pool of 2)")
+        return not worker.is_alive()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Fresh vs pooled connections, and throttled streaming")
+    parser.add_argument('--calls', type=int, default=300)
+    parser.add_argument('--throttled-calls', type=int, default=20)
+    parser.add_argument('--error-rate', type=float, default=0.6, help="Injected 429 rate for the streamed calls")
+    parser.add_argument('--deadline', type=float, default=30, help="Seconds before the streamed calls count as hung")
+    args = parser.parse_args()
+
+    server = ThreadingHTTPServer(('127.0.0.1', 0), StandInHandler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    url = f'http://127.0.0.1:{server.server_port}/v1/chat/completions'
+    payload = {"model": "deepseek-chat", "messages": [{"role": "user", "content": "Q: capital of the U.K.?"}]}
+
+    unpooled = time_calls(lambda: requests.post(url, json=payload, headers={'Connection': 'close'}), args.calls)
+    session = _make_requests_session(pool_size=4)
+    pooled = time_calls(lambda: post_json(url, payload, client=session), args.calls)
+
+    print(f"{args.calls} calls against {url}")
+    report("unpooled", unpooled)
+    report("pooled", pooled)
+    print(f"speedup    {statistics.mean(unpooled) / statistics.mean(pooled):.2f}x "
+          "(plain TCP; a TLS endpoint also saves the handshake per call)")
+    server.shutdown()
+
+    if not throttled_streaming(args.throttled_calls, args.error_rate, args.deadline):
+        print("throttled streaming hung: retried responses are holding the pool")
+        sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,44 @@
+import argparse
+import os
+import random
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from conversation import CONTEXT_STRATEGIES, Conversation
+
+"""
+Prompt tokens re-sent by a Single-Label run under each context strategy, counted
+locally (no API calls) on synthetic one-word answers.
+
+    python benchmarks/bench_conversation_tokens.py --iterations 100 1000
+"""
+
+SYSTEM_PROMPT = ("Respond to the question that is prefixed with Q: <question>. Some questions have multiple "
+                 "correct answers, only respond with one word answers. Take into account the entire "
+                 "conversation history. Previous responses will be given.")
+QUESTION = "Q: Name a city in the UK?"
+ANSWERS = ["London", "Manchester", "Birmingham", "Edinburgh", "Glasgow", "Liverpool", "Leeds", "Bristol"]
+
+
+def run(strategy: str, iterations: int, seed: int = 0) -> tuple:
+    rng = random.Random(seed)
+    conversation = Conversation(SYSTEM_PROMPT, QUESTION, strategy=strategy)
+    for _ in range(iterations):
+        conversation.add_response(rng.choice(ANSWERS) + ".")
+    return conversation.prompt_tokens_sent, conversation.prompt_tokens()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Prompt tokens re-sent under each context strategy")
+    parser.add_argument('--iterations', type=int, nargs='+', default=[10, 100, 1000])
+    args = parser.parse_args()
+
+    for iterations in args.iterations:
+        print(f"{iterations} iterations")
+        for strategy in CONTEXT_STRATEGIES:
+            total, last = run(strategy, iterations)
+            print(f"  {strategy:>12}: {total:>12,} prompt tokens total, {last:>9,} in the last request")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,121 @@
+import argparse
+import asyncio
+import os
+import sys
+import tempfile
+import threading
+import time
+import zlib
+
+REPO = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, REPO)
+import numpy as np
+
+from bench_runners_standin import DEFAULT_CONFIG, configure_environment
+from semantic_clustering import cluster_responses_semantically
+from standin_server import StandInServer, load_standin_config
+
+"""
+Semantic chains against the local stand-in server, three ways:
+
+    inline     - each chain encodes and clusters its own response after every call
+    after      - all chains first, then one batch encode + clustering per query
+    pipelined  - pipeline.run_pipelined_chains: micro-batched encoding on one worker
+                 thread, overlapped with the fetching
+
+sentence-transformers is not needed: the stand-in encoder costs `--call-ms` per encode
+call plus `--text-ms` per text, holding one lock like a single CPU/GPU would, and maps
+each normalized answer to a fixed random unit vector. Every mode's labels are checked
+against batch clustering of the same responses.
+
+    python benchmarks/bench_embedding_pipeline.py --queries 40 --repeat-count 20
+"""
+
+MULTI_LABEL_QUERIES = ["Name a city in the UK.", "Name a yellow fruit.", "Name an alcoholic drink.",
+                       "Name a ball game that is played by more than 5 players."]
+
+
+class StandInEncoder:
+    def __init__(self, call_seconds: float, text_seconds: float, dim: int = 64):
+        self.call_seconds = call_seconds
+        self.text_seconds = text_seconds
+        self.dim = dim
+        self.calls = 0
+        self._lock = threading.Lock()
+
+    def encode(self, texts, convert_to_numpy=True, **kwargs) -> np.ndarray:
+        with self._lock:
+            self.calls += 1
+            time.sleep(self.call_seconds + self.text_seconds * len(texts))
+        seeds = [zlib.crc32(text.strip(' .').lower().encode()) for text in texts]
+        return np.stack([np.random.default_rng(seed).standard_normal(self.dim) for seed in seeds]).astype(np.float32)
+
+
+def build_prompt(query, prev_answers, iteration):
+    prompt = f"Consider the following question:\nQ: {query}\n"
+    if prev_answers:
+        prompt += f"Another answer to question Q is: {prev_answers[-1]}\n"
+    return prompt + f"Provide an answer to the following question:\nQ: {query}\nA:"
+
+
+async def run_mode(mode: str, queries, repeat_count: int, concurrency: int, encoder: StandInEncoder,
+                   threshold: float):
+    from deepseek_client import query_deepseek
+    from experiment_engine import run_chains
+    from online_mi import OnlineSemanticMI
+    from pipeline import run_pipelined_chains
+
+    if mode == 'pipelined':
+        responses, estimators, stats = await run_pipelined_chains(
+            queries, build_prompt, query_deepseek, repeat_count, encoder.encode, similarity_threshold=threshold,
+            concurrency=concurrency, verbose=False)
+        return responses, [e.labels for e in estimators], stats
+    if mode == 'inline':
+        estimators = {}
+
+        def make_estimator(query, replicate):
+            estimators[query] = OnlineSemanticMI(encoder, threshold)
+            return estimators[query]
+        responses = await run_chains(queries, build_prompt, query_deepseek, repeat_count, concurrency=concurrency,
+                                     verbose=False, make_estimator=make_estimator)
+        return responses, [estimators[query].labels for query in queries], {}
+    responses = await run_chains(queries, build_prompt, query_deepseek, repeat_count, concurrency=concurrency,
+                                 verbose=False)
+    labels = [cluster_responses_semantically(chain, encoder, threshold=threshold) for chain in responses]
+    return responses, labels, {}
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Inline vs after-the-fact vs pipelined semantic clustering")
+    parser.add_argument('--queries', type=int, default=40)
+    parser.add_argument('--repeat-count', type=int, default=20)
+    parser.add_argument('--concurrency', type=int, default=32)
+    parser.add_argument('--call-ms', type=float, default=8.0, help="Stand-in encoder cost per encode call")
+    parser.add_argument('--text-ms', type=float, default=1.0, help="Stand-in encoder cost per text")
+    parser.add_argument('--threshold', type=float, default=0.9)
+    parser.add_argument('--modes', nargs='+', default=['inline', 'after', 'pipelined'])
+    parser.add_argument('--config', default=DEFAULT_CONFIG, help="StandInConfig JSON")
+    args = parser.parse_args()
+
+    queries = [f"{MULTI_LABEL_QUERIES[i % 4]} (variant {i})" for i in range(args.queries)]
+    workdir = tempfile.mkdtemp(prefix='bench-pipeline-')
+    with StandInServer(load_standin_config(args.config)) as server:
+        configure_environment(server.base_url, workdir)
+        print(f"Stand-in at {server.base_url}; {args.queries} chains x {args.repeat_count} calls")
+        for mode in args.modes:
+            encoder = StandInEncoder(args.call_ms / 1000, args.text_ms / 1000)
+            start = time.perf_counter()
+            responses, labels, stats = asyncio.run(run_mode(mode, queries, args.repeat_count, args.concurrency,
+                                                            encoder, args.threshold))
+            wall = time.perf_counter() - start
+            line = f"{mode:<10} {wall:6.2f}s   {encoder.calls:>5} encode calls"
+            if stats:
+                line += f"   mean batch {stats['mean_batch']:.1f}, max queue depth {stats['max_queue_depth']}"
+            free = StandInEncoder(0.0, 0.0)
+            agree = all(np.array_equal(chain_labels, cluster_responses_semantically(chain, free, args.threshold))
+                        for chain, chain_labels in zip(responses, labels))
+            print(line + ("" if agree else "   LABELS DIFFER FROM BATCH CLUSTERING"))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,106 @@
+import argparse
+import os
+import random
+import sys
+import time
+
+from rapidfuzz import fuzz, utils
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from fuzzy_clustering import DEFAULT_LOOP_MAX_TEXTS, cluster_labels_fuzzy
+
+"""
+Throughput of the per-call fuzz.ratio loop (the old mutual_information_estimate_fuzzy)
+vs bulk rapidfuzz cdist clustering, on synthetic responses shaped like the ones in
+data/ ("A: London.", "London", "The capital of the U.K. is **London**."), then the
+number of distinct texts at which cdist starts beating the pairwise loop inside
+cluster_labels_fuzzy (what DEFAULT_LOOP_MAX_TEXTS should track). On one core (Python
+3.11, rapidfuzz 3) the crossover was ~70-100 distinct texts, and workers=-1 stayed
+slower than workers=1 at every size; a 10-response chain took ~40us against ~700us
+for cdist on all cores.
+
+    python benchmarks/bench_fuzzy_clustering.py --sizes 10 100 1000 10000 50000
+"""
+
+ANSWERS = ["London", "Manchester", "Birmingham", "Edinburgh", "Banana", "Lemon", "Whiskey", "Vodka",
+           "Soccer", "Rugby", "John Steinbeck", "George Washington", "Russia", "the harp"]
+TEMPLATES = ["A: {}.", "{}.", "{}", "**{}**", "The answer is {}.", "A: {}. (Note: {} is a common answer.)"]
+
+
+def synthetic_responses(n: int, seed: int = 0) -> list:
+    rng = random.Random(seed)
+    responses = []
+    for _ in range(n):
+        answer = rng.choice(ANSWERS)
+        text = rng.choice(TEMPLATES).format(answer, answer)
+        if rng.random() < 0.2:  # some long-tail paraphrases
+            text += f" ({rng.randint(0, 10 ** 6)})"
+        responses.append(text)
+    return responses
+
+
+def loop_labels(responses: list, threshold: float) -> list:
+    clusters, labels = [], []
+    for response in responses:
+        for label, cluster in enumerate(clusters):
+            if fuzz.ratio(response, cluster[0]) >= threshold:
+                labels.append(label)
+                break
+        else:
+            clusters.append([response])
+            labels.append(len(clusters) - 1)
+    return labels
+
+
+def timed(fn, repeat: int = 1):
+    start = time.perf_counter()
+    for _ in range(repeat):
+        result = fn()
+    return result, (time.perf_counter() - start) / repeat
+
+
+def crossover(sizes: list, threshold: float) -> None:
+    print(f"\n{'n':>7} {'distinct':>9} {'pairwise us':>12} {'cdist us':>9}")
+    first = None
+    for n in sizes:
+        responses = synthetic_responses(n, seed=n)
+        repeat = max(3, 20000 // n)
+        _, pairwise = timed(lambda: cluster_labels_fuzzy(responses, threshold, loop_max_texts=10 ** 9), repeat)
+        _, bulk = timed(lambda: cluster_labels_fuzzy(responses, threshold, loop_max_texts=0), repeat)
+        distinct = len(set(responses))
+        if first is None and bulk < pairwise:
+            first = distinct
+        print(f"{n:>7} {distinct:>9} {pairwise * 1e6:>12.0f} {bulk * 1e6:>9.0f}")
+    print(f"cdist first wins at {first} distinct texts; DEFAULT_LOOP_MAX_TEXTS = {DEFAULT_LOOP_MAX_TEXTS}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Pairwise fuzz.ratio loop vs bulk cdist fuzzy clustering")
+    parser.add_argument('--sizes', type=int, nargs='+', default=[10, 100, 1000, 10000, 50000])
+    parser.add_argument('--crossover-sizes', type=int, nargs='+', default=[20, 40, 60, 80, 100, 150, 200, 300])
+    parser.add_argument('--threshold', type=float, default=85)
+    parser.add_argument('--max-loop-size', type=int, default=10000)
+    args = parser.parse_args()
+
+    print(f"{'n':>7} {'loop resp/s':>12} {'bulk resp/s':>12} {'all cores':>10} {'bulk+processor':>15} "
+          f"{'speedup':>8} {'clusters':>9}")
+    for n in args.sizes:
+        responses = synthetic_responses(n)
+        repeat = max(1, 20000 // n)
+        labels, bulk = timed(lambda: cluster_labels_fuzzy(responses, args.threshold), repeat)
+        _, parallel = timed(lambda: cluster_labels_fuzzy(responses, args.threshold, workers=-1), repeat)
+        _, processed = timed(lambda: cluster_labels_fuzzy(responses, args.threshold,
+                                                          processor=utils.default_process), repeat)
+        if n <= args.max_loop_size:
+            expected, loop = timed(lambda: loop_labels(responses, args.threshold), repeat)
+            assert list(labels) == expected
+            print(f"{n:>7} {n / loop:>12.0f} {n / bulk:>12.0f} {n / parallel:>10.0f} {n / processed:>15.0f} "
+                  f"{loop / bulk:>7.1f}x {labels.max() + 1:>9}")
+        else:
+            print(f"{n:>7} {'-':>12} {n / bulk:>12.0f} {n / parallel:>10.0f} {n / processed:>15.0f} {'-':>8} "
+                  f"{labels.max() + 1:>9}")
+    crossover(args.crossover_sizes, args.threshold)
+
+
+if __name__ == '__main__':
+    main()
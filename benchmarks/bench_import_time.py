@@ -0,0 +1,72 @@
+import argparse
+import json
+import os
+import re
+import subprocess
+import sys
+import time
+
+"""
+Cold-start import cost per entry point, from `python -X importtime`.
+
+Each entry point is imported in a fresh interpreter (the Experiment scripts only run
+under __main__, so importing them measures start-up alone). Reports the total import
+time and the heaviest top-level packages; --output appends the results as one JSON line
+so the numbers can be tracked across commits.
+
+    python benchmarks/bench_import_time.py --output benchmarks/import_times.jsonl
+"""
+
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+ENTRY_POINTS = ['Experiment01', 'Experiment02', 'Experiment03', 'Experiment04', 'Experiment05',
+                'Experiment06', 'run_grid', 'deepseek_client', 'semantic_clustering']
+LINE = re.compile(r'import time:\s+(\d+) \|\s+(\d+) \|(\s+)(\S+)')
+
+
+def import_profile(module: str) -> dict:
+    start = time.perf_counter()
+    result = subprocess.run([sys.executable, '-X', 'importtime', '-c', f'import {module}'],
+                            cwd=REPO_ROOT, capture_output=True, text=True)
+    wall = time.perf_counter() - start
+    if result.returncode != 0:
+        return {'module': module, 'error': result.stderr.strip().splitlines()[-1]}
+
+    # Children are printed before their parent, one indent level (2 spaces) deeper
+    children, total = {}, 0
+    for match in LINE.finditer(result.stderr):
+        cumulative, depth, name = int(match.group(2)), len(match.group(3)), match.group(4)
+        if depth == 1:
+            if name == module:
+                total = cumulative
+                break
+            children = {}  # interpreter start-up (site, encodings, ...)
+        elif depth == 3:
+            children[name] = cumulative
+    heaviest = sorted(children.items(), key=lambda item: -item[1])[:5]
+    return {'module': module, 'import_ms': total / 1000, 'wall_ms': wall * 1000,
+            'heaviest': [(name, us / 1000) for name, us in heaviest]}
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Cold-start import time per entry point")
+    parser.add_argument('modules', nargs='*', default=ENTRY_POINTS)
+    parser.add_argument('--output', help="Append results as a JSON line to this file")
+    args = parser.parse_args()
+
+    results = [import_profile(module) for module in args.modules]
+    for result in results:
+        if 'error' in result:
+            print(f"{result['module']:<22} failed: {result['error']}")
+            continue
+        heaviest = ', '.join(f"{name} {ms:.0f}ms" for name, ms in result['heaviest'])
+        print(f"{result['module']:<22} import {result['import_ms']:8.1f} ms   "
+              f"process {result['wall_ms']:8.1f} ms   [{heaviest}]")
+
+    if args.output:
+        with open(args.output, 'a', encoding='utf-8') as file:
+            file.write(json.dumps({'timestamp': time.time(), 'python': sys.version.split()[0],
+                                   'results': results}) + '\n')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,89 @@
+import argparse
+import glob
+import math
+import os
+import sys
+import time
+
+REPO = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, REPO)
+import numpy as np
+import pandas as pd
+
+from fuzzy_clustering import cluster_labels_fuzzy
+from mi_estimators import ENTROPY_ESTIMATORS, score_labels
+
+"""
+Re-score every run under data/ (and optionally a results store) with every entropy
+estimator and bootstrap intervals, then the same on a large synthetic batch against
+the per-query Python formula of the experiment scripts.
+
+    python benchmarks/bench_mi_estimators.py
+    python benchmarks/bench_mi_estimators.py --synthetic 100000 --store results/store
+"""
+
+
+def script_mi(labels) -> float:
+    probs = np.bincount(labels) / len(labels)
+    return sum(p * math.log(p / (1 / len(probs))) for p in probs if p > 0)
+
+
+def data_labels(pattern: str, threshold: float) -> tuple:
+    names, batch = [], []
+    for path in sorted(glob.glob(pattern, recursive=True)):
+        frame = pd.read_csv(path, usecols=["Query", "AllResponses"])
+        for query, responses in zip(frame["Query"], frame["AllResponses"].fillna("")):
+            names.append(f"{os.path.relpath(path, REPO)}: {query}")
+            batch.append(cluster_labels_fuzzy(responses.split("|"), threshold))
+    return names, batch
+
+
+def store_labels(root: str) -> list:
+    from results_store import load_results
+    frame = load_results(root, columns=['experiment', 'run_id', 'query', 'replicate', 'iteration', 'cluster']).to_pandas()
+    frame = frame.sort_values(['experiment', 'run_id', 'query', 'replicate', 'iteration'])
+    return [group.to_numpy() for _, group in frame.groupby(['experiment', 'run_id', 'query', 'replicate'])['cluster']]
+
+
+def timed(fn):
+    start = time.perf_counter()
+    result = fn()
+    return result, time.perf_counter() - start
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Entropy estimators and bootstrap intervals over stored and synthetic runs")
+    parser.add_argument('--data', default=os.path.join(REPO, 'data', '**', '*.csv'))
+    parser.add_argument('--threshold', type=float, default=85)
+    parser.add_argument('--n-boot', type=int, default=1000)
+    parser.add_argument('--synthetic', type=int, default=10000, help="Synthetic queries to score")
+    parser.add_argument('--store', help="Also re-score every chain in this results store")
+    args = parser.parse_args()
+
+    (names, batch), cluster_seconds = timed(lambda: data_labels(args.data, args.threshold))
+    scores, seconds = timed(lambda: score_labels(batch, n_boot=args.n_boot))
+    print(f"data/: {len(batch)} queries clustered in {cluster_seconds:.3f}s, scored with "
+          f"{len(ENTROPY_ESTIMATORS)} estimators + {args.n_boot} bootstrap resamples in {seconds:.3f}s")
+    for i, name in enumerate(names):
+        print(f"  MI {scores['mi_plugin'][i]:.4f} [{scores['mi_plugin_ci_low'][i]:.4f}, "
+              f"{scores['mi_plugin_ci_high'][i]:.4f}]  miller_madow {scores['mi_miller_madow'][i]:+.4f}  "
+              f"chao_shen {scores['mi_chao_shen'][i]:+.4f}  jackknife {scores['mi_jackknife'][i]:+.4f}  {name}")
+
+    if args.store:
+        chains, load_seconds = timed(lambda: store_labels(args.store))
+        _, seconds = timed(lambda: score_labels(chains, n_boot=args.n_boot))
+        print(f"store: {len(chains)} chains loaded in {load_seconds:.3f}s, scored in {seconds:.3f}s")
+
+    rng = np.random.default_rng(0)
+    synthetic = [rng.zipf(2.0, size=rng.integers(10, 50)) % 8 for _ in range(args.synthetic)]
+    synthetic = [np.unique(labels, return_inverse=True)[1] for labels in synthetic]
+    expected, loop_seconds = timed(lambda: [script_mi(labels) for labels in synthetic])
+    scores, batch_seconds = timed(lambda: score_labels(synthetic, estimators=('plugin',)))
+    _, all_seconds = timed(lambda: score_labels(synthetic, n_boot=args.n_boot))
+    assert np.allclose(scores['mi_plugin'], expected)
+    print(f"synthetic: {args.synthetic} queries, script formula {loop_seconds:.3f}s vs batched {batch_seconds:.3f}s; "
+          f"all estimators + {args.n_boot} bootstrap resamples {all_seconds:.3f}s")
+
+
+if __name__ == '__main__':
+    main()
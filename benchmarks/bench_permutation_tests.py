@@ -0,0 +1,59 @@
+import argparse
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+import numpy as np
+
+from compare_conditions import permutation_pvalues
+from mi_estimators import mi_lower_bound
+
+"""
+Per-query permutation tests of MI(B) - MI(A): the batched engine against one
+shuffle + two MI evaluations at a time, on synthetic two-condition label sets.
+
+    python benchmarks/bench_permutation_tests.py --queries 100 1000 --workers 1 4
+"""
+
+
+def naive_pvalue(a: np.ndarray, b: np.ndarray, n_permutations: int, rng: np.random.Generator) -> float:
+    observed = abs(mi_lower_bound(b) - mi_lower_bound(a))
+    pooled = np.concatenate([a, b])
+    exceed = 0
+    for _ in range(n_permutations):
+        shuffled = rng.permutation(pooled)
+        exceed += abs(mi_lower_bound(shuffled[len(a):]) - mi_lower_bound(shuffled[:len(a)])) >= observed - 1e-12
+    return (exceed + 1) / (n_permutations + 1)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Batched vs one-at-a-time permutation tests of MI(B) - MI(A)")
+    parser.add_argument('--queries', type=int, nargs='+', default=[100, 1000])
+    parser.add_argument('--responses', type=int, default=10, help="Responses per query and condition")
+    parser.add_argument('--permutations', type=int, default=20000)
+    parser.add_argument('--workers', type=int, nargs='+', default=[1, os.cpu_count() or 1])
+    parser.add_argument('--naive-queries', type=int, default=2, help="Queries to time the one-at-a-time loop on")
+    args = parser.parse_args()
+
+    rng = np.random.default_rng(0)
+    for queries in args.queries:
+        labels_a = [rng.integers(0, 3, size=args.responses) for _ in range(queries)]
+        labels_b = [rng.integers(0, 4, size=args.responses) for _ in range(queries)]
+        for workers in sorted(set(args.workers)):
+            start = time.perf_counter()
+            pvalues = permutation_pvalues(labels_a, labels_b, args.permutations, workers=workers)
+            seconds = time.perf_counter() - start
+            print(f"{queries} queries x {args.permutations} permutations, {workers} workers: {seconds:.2f}s "
+                  f"({queries * args.permutations / seconds / 1e6:.2f}M permutations/s), "
+                  f"{np.mean(pvalues < 0.05):.1%} of p < 0.05")
+
+    start = time.perf_counter()
+    for a, b in zip(labels_a[:args.naive_queries], labels_b[:args.naive_queries]):
+        naive_pvalue(a, b, args.permutations, rng)
+    seconds = time.perf_counter() - start
+    print(f"one permutation at a time: {args.naive_queries * args.permutations / seconds / 1e6:.3f}M permutations/s")
+
+
+if __name__ == '__main__':
+    main()
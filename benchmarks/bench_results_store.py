@@ -0,0 +1,69 @@
+import argparse
+import csv
+import os
+import random
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+import pandas as pd
+
+from results_store import ResultsWriter, load_results
+
+"""
+Cross-run analysis over many synthetic runs: the per-query CSVs re-read with pandas
+(as data_analysis.ipynb does) vs one lazy scan of the results store.
+
+    python benchmarks/bench_results_store.py --runs 100 1000
+"""
+
+QUERIES = [f"Synthetic question {i}?" for i in range(8)]
+ANSWERS = ["London.", "A: London.", "Edinburgh.", "Cardiff.", "Belfast | Derry."]
+
+
+def write_runs(directory: str, runs: int, repeat_count: int, seed: int = 0) -> None:
+    rng = random.Random(seed)
+    os.makedirs(os.path.join(directory, 'csv'), exist_ok=True)
+    for run in range(runs):
+        experiment = f'experiment0{run % 6 + 1}'
+        with open(os.path.join(directory, 'csv', f'{experiment}-{run}.csv'), 'w', newline='',
+                  encoding='utf-8') as file, ResultsWriter(os.path.join(directory, 'store'), experiment,
+                                                           run_id=f'run{run:05d}') as writer:
+            rows = csv.writer(file)
+            rows.writerow(["Query", "Y1", "Y2", "MutualInformation", "AllResponses"])
+            for query in QUERIES:
+                responses = [rng.choice(ANSWERS) for _ in range(repeat_count)]
+                rows.writerow([query, responses[0], responses[1], f"{rng.random():.4f}", "|".join(responses)])
+                for iteration, response in enumerate(responses):
+                    writer.append(query=query, replicate=0, iteration=iteration, response=response,
+                                  cluster=ANSWERS.index(response), latency_s=rng.lognormvariate(-3, 0.5))
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Per-query CSVs vs the results store for cross-run analysis")
+    parser.add_argument('--runs', type=int, nargs='+', default=[100, 1000])
+    parser.add_argument('--repeat-count', type=int, default=10)
+    args = parser.parse_args()
+
+    for runs in args.runs:
+        directory = tempfile.mkdtemp(prefix='bench-results-store-')
+        write_runs(directory, runs, args.repeat_count)
+
+        start = time.perf_counter()
+        frames = [pd.read_csv(os.path.join(directory, 'csv', name), usecols=["Query", "AllResponses"])
+                  for name in os.listdir(os.path.join(directory, 'csv')) if name.startswith('experiment02')]
+        csv_responses = sum(len(r.split("|")) for frame in frames for r in frame["AllResponses"])
+        csv_seconds = time.perf_counter() - start
+
+        start = time.perf_counter()
+        table = load_results(os.path.join(directory, 'store'), experiment='experiment02',
+                             columns=['query', 'response', 'cluster'])
+        store_seconds = time.perf_counter() - start
+
+        print(f"{runs} runs: CSV {csv_seconds:.3f}s ({csv_responses} responses after splitting on '|'), "
+              f"store {store_seconds:.3f}s ({table.num_rows} responses)")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,126 @@
+import argparse
+import asyncio
+import dataclasses
+import os
+import subprocess
+import sys
+import tempfile
+import time
+
+REPO = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, REPO)
+from standin_server import StandInServer, load_standin_config
+
+"""
+End-to-end throughput of the experiment runners against the local stand-in server:
+requests/sec, p50/p99 call latency and total wall time.
+
+    python benchmarks/bench_runners_standin.py --concurrency 8 32 64
+    python benchmarks/bench_runners_standin.py --scripts Experiment01 Experiment02
+
+The grid runner is timed in-process (every call is timed client-side, retries
+included); the Experiment scripts run as subprocesses and are timed end to end, with
+the request count taken from the server. The response cache is off and the rate
+limits are lifted, so only the runners and the stand-in are measured.
+"""
+
+DEFAULT_SPECS = [os.path.join(REPO, 'specs', f'experiment0{i}.json') for i in range(1, 5)]
+DEFAULT_CONFIG = os.path.join(REPO, 'benchmarks', 'standin_config.json')
+
+
+def configure_environment(base_url: str, workdir: str) -> dict:
+    env = {
+        'DEEPSEEK_BASE_URL': base_url,
+        'DEEPSEEK_API_KEY': 'standin',
+        'DEEPSEEK_CACHE_MODE': 'off',
+        'DEEPSEEK_RPM': '1000000',
+        'DEEPSEEK_TPM': '1000000000',
+        'DEEPSEEK_RATE_LIMIT_DB': os.path.join(workdir, 'rate_limit.sqlite'),
+        'DEEPSEEK_METRICS_DIR': os.path.join(workdir, 'metrics'),
+    }
+    os.environ.update(env)  # before deepseek_client is imported
+    return env
+
+
+def percentile(values: list, q: float) -> float:
+    values = sorted(values)
+    return values[min(len(values) - 1, int(q * len(values)))]
+
+
+def bench_grid(server: StandInServer, spec_paths: list, concurrency: int, repeat_count: int, workdir: str,
+               replicates: int = 1, multi_sample: bool = False, early_stop: float = None) -> dict:
+    import run_grid
+    from deepseek_client import query_deepseek
+    from experiment_spec import load_spec
+
+    latencies = []
+
+    def timed_query(prompt, sample_index=0, **kwargs):
+        start = time.perf_counter()
+        try:
+            return query_deepseek(prompt, sample_index, **kwargs)
+        finally:
+            latencies.append(time.perf_counter() - start)
+
+    specs = []
+    for path in spec_paths:
+        spec = load_spec(path)
+        specs.append(dataclasses.replace(
+            spec, repeat_count=repeat_count or spec.repeat_count, replicates=replicates,
+            multi_sample=multi_sample, early_stop_tolerance=early_stop,
+            output_file=os.path.join(workdir, 'results', f'{spec.name}-c{concurrency}.csv'),
+            journal_file=os.path.join(workdir, 'journals', f'{spec.name}-c{concurrency}.jsonl'),
+            results_store=os.path.join(workdir, 'store')))
+
+    run_grid.query_deepseek = timed_query
+    requests_before = server.model.requests
+    start = time.perf_counter()
+    asyncio.run(run_grid.run_grid(specs, concurrency=concurrency))
+    wall = time.perf_counter() - start
+    return {'calls': len(latencies), 'requests': server.model.requests - requests_before, 'wall': wall,
+            'p50': percentile(latencies, 0.5), 'p99': percentile(latencies, 0.99)}
+
+
+def bench_script(name: str, server: StandInServer, env: dict, workdir: str) -> dict:
+    before = server.model.requests
+    start = time.perf_counter()
+    subprocess.run([sys.executable, os.path.join(REPO, f'{name}.py')], cwd=workdir, check=True,
+                   env={**os.environ, **env, 'PYTHONPATH': REPO}, stdout=subprocess.DEVNULL)
+    return {'calls': server.model.requests - before, 'wall': time.perf_counter() - start}
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Experiment runners vs the local stand-in server")
+    parser.add_argument('--specs', nargs='+', default=DEFAULT_SPECS, help="Specs for the grid runner")
+    parser.add_argument('--concurrency', type=int, nargs='+', default=[8, 32])
+    parser.add_argument('--repeat-count', type=int, default=0, help="Override each spec's chain length")
+    parser.add_argument('--scripts', nargs='*', default=[], help="Experiment scripts to time, e.g. Experiment02")
+    parser.add_argument('--replicates', type=int, default=1, help="Replicate chains per query")
+    parser.add_argument('--multi-sample', action='store_true', help="Group identical requests into n>1 calls")
+    parser.add_argument('--early-stop', type=float, help="Stop chains once their online MI moves less than this")
+    parser.add_argument('--config', default=DEFAULT_CONFIG, help="StandInConfig JSON")
+    args = parser.parse_args()
+
+    workdir = tempfile.mkdtemp(prefix='bench-standin-')
+    with StandInServer(load_standin_config(args.config)) as server:
+        env = configure_environment(server.base_url, workdir)
+        print(f"Stand-in at {server.base_url}, scratch output in {workdir}")
+
+        for concurrency in args.concurrency:
+            result = bench_grid(server, args.specs, concurrency, args.repeat_count, workdir,
+                                replicates=args.replicates, multi_sample=args.multi_sample,
+                                early_stop=args.early_stop)
+            print(f"grid   concurrency {concurrency:>3}: {result['calls']:>5} calls in {result['wall']:6.2f}s "
+                  f"= {result['calls'] / result['wall']:7.1f} calls/s   p50 {result['p50'] * 1000:6.1f} ms   "
+                  f"p99 {result['p99'] * 1000:6.1f} ms   {result['requests']} HTTP requests")
+
+        for name in args.scripts:
+            result = bench_script(name, server, env, workdir)
+            print(f"{name:<14}: {result['calls']:>5} calls in {result['wall']:6.2f}s "
+                  f"= {result['calls'] / result['wall']:7.1f} req/s (process start included)")
+
+        print(f"Stand-in served {server.model.requests} requests ({server.model.errors} injected 429/500s)")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,81 @@
+import argparse
+import os
+import sys
+import time
+
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from semantic_clustering import greedy_threshold_labels
+
+"""
+Per-pair loop (the old cluster_responses_semantically) vs the vectorized greedy
+threshold clustering, across sample sizes. Uses synthetic MiniLM-sized embeddings
+drawn around a few answer centroids, so no model download is needed.
+
+    python benchmarks/bench_semantic_clustering.py --sizes 10 100 1000 10000
+"""
+
+
+def synthetic_embeddings(n: int, n_answers: int = 12, dim: int = 384, seed: int = 0) -> np.ndarray:
+    rng = np.random.default_rng(seed)
+    centroids = rng.normal(size=(n_answers, dim))
+    answers = rng.zipf(1.5, size=n) % n_answers
+    return (centroids[answers] + 0.3 * rng.normal(size=(n, dim))).astype(np.float32)
+
+
+def pairwise_loop_labels(embeddings: np.ndarray, threshold: float) -> np.ndarray:
+    # Same structure as the original: one cosine similarity per (seed, j) pair
+    try:
+        import torch
+        from sentence_transformers import util
+        tensors = torch.from_numpy(embeddings)
+        cos_sim = lambda i, j: util.pytorch_cos_sim(tensors[i], tensors[j]).item()
+    except ImportError:
+        cos_sim = lambda i, j: float(embeddings[i] @ embeddings[j]
+                                     / (np.linalg.norm(embeddings[i]) * np.linalg.norm(embeddings[j])))
+    labels = np.full(len(embeddings), -1)
+    next_label = 0
+    for i in range(len(embeddings)):
+        if labels[i] != -1:
+            continue
+        labels[i] = next_label
+        for j in range(i + 1, len(embeddings)):
+            if labels[j] == -1 and cos_sim(i, j) >= threshold:
+                labels[j] = next_label
+        next_label += 1
+    return labels
+
+
+def best_of(fn, repeats: int = 3) -> float:
+    timings = []
+    for _ in range(repeats):
+        start = time.perf_counter()
+        fn()
+        timings.append(time.perf_counter() - start)
+    return min(timings)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Loop vs vectorized semantic clustering")
+    parser.add_argument('--sizes', type=int, nargs='+', default=[10, 100, 1000, 5000, 10000])
+    parser.add_argument('--threshold', type=float, default=0.7)
+    parser.add_argument('--max-loop-size', type=int, default=5000,
+                        help="Skip the per-pair loop above this size (it gets very slow)")
+    args = parser.parse_args()
+
+    print(f"{'n':>7} {'loop (s)':>10} {'vectorized (s)':>15} {'speedup':>8} {'clusters':>9}")
+    for n in args.sizes:
+        embeddings = synthetic_embeddings(n)
+        fast = best_of(lambda: greedy_threshold_labels(embeddings, args.threshold))
+        labels = greedy_threshold_labels(embeddings, args.threshold)
+        if n <= args.max_loop_size:
+            slow = best_of(lambda: pairwise_loop_labels(embeddings, args.threshold), repeats=1)
+            assert np.array_equal(labels, pairwise_loop_labels(embeddings, args.threshold))
+            print(f"{n:>7} {slow:>10.4f} {fast:>15.4f} {slow / fast:>7.1f}x {labels.max() + 1:>9}")
+        else:
+            print(f"{n:>7} {'-':>10} {fast:>15.4f} {'-':>8} {labels.max() + 1:>9}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,108 @@
+import argparse
+import glob
+import os
+import re
+import sys
+import time
+import zlib
+
+REPO = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, REPO)
+import numpy as np
+import pandas as pd
+
+from semantic_clustering import cluster_responses_semantically
+from similarity_cascade import CASCADE_STAGES, SimilarityCascade
+
+"""
+Pure-embedding semantic clustering vs the exact -> fuzzy -> embedding cascade, on the
+responses of the result CSVs under data/: texts encoded, pairs settled per stage,
+wall time, and how many chains get exactly the pure path's labels.
+
+    python benchmarks/bench_similarity_cascade.py
+    python benchmarks/bench_similarity_cascade.py --model all-MiniLM-L6-v2 --thresholds 0.7 0.8
+
+Without --model, a stand-in encoder (hashed bag of words, `--text-ms` per text) is
+used, so it runs without sentence-transformers; agreement is only meaningful against
+the real model.
+"""
+
+
+class BagOfWordsEncoder:
+    def __init__(self, text_seconds: float, dim: int = 256):
+        self.text_seconds = text_seconds
+        self.dim = dim
+        self.texts = 0
+
+    def encode(self, texts, convert_to_numpy=True, **kwargs) -> np.ndarray:
+        self.texts += len(texts)
+        time.sleep(self.text_seconds * len(texts))
+        embeddings = np.zeros((len(texts), self.dim))
+        for row, text in zip(embeddings, texts):
+            for word in re.findall(r'\w+', text.lower()):
+                row += np.random.default_rng(zlib.crc32(word.encode())).standard_normal(self.dim)
+        return embeddings
+
+
+class CountingEncoder:
+    def __init__(self, model):
+        self.model = model
+        self.texts = 0
+
+    def encode(self, texts, **kwargs) -> np.ndarray:
+        self.texts += len(texts)
+        return self.model.encode(texts, **kwargs)
+
+
+def load_chains(pattern: str) -> list:
+    chains = []
+    for path in sorted(glob.glob(pattern, recursive=True)):
+        frame = pd.read_csv(path, usecols=["AllResponses"])
+        chains += [str(responses).split('|') for responses in frame["AllResponses"]]
+    return chains
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Pure-embedding vs cascaded semantic clustering")
+    parser.add_argument('--data', default=os.path.join(REPO, 'data', '**', '*.csv'))
+    parser.add_argument('--model', help="SentenceTransformer to compare against (default: stand-in encoder)")
+    parser.add_argument('--text-ms', type=float, default=2.0, help="Stand-in encoder cost per text")
+    parser.add_argument('--thresholds', type=float, nargs='+', default=[0.6, 0.7, 0.8])
+    parser.add_argument('--match-cutoff', type=float, default=95)
+    parser.add_argument('--reject-cutoff', type=float, default=40)
+    args = parser.parse_args()
+
+    chains = load_chains(args.data)
+    print(f"{len(chains)} chains, {sum(map(len, chains))} responses")
+    if args.model:
+        from lazy_loading import get_embedding_model
+        base = get_embedding_model(args.model)
+        make_encoder = lambda: CountingEncoder(base)
+    else:
+        make_encoder = lambda: BagOfWordsEncoder(args.text_ms / 1000)
+
+    for threshold in args.thresholds:
+        encoder = make_encoder()
+        start = time.perf_counter()
+        reference = [cluster_responses_semantically(chain, encoder, threshold=threshold) for chain in chains]
+        pure_seconds, pure_texts = time.perf_counter() - start, encoder.texts
+
+        encoder = make_encoder()
+        resolved = dict.fromkeys(CASCADE_STAGES, 0)
+        agree = 0
+        start = time.perf_counter()
+        for chain, labels in zip(chains, reference):
+            cascade = SimilarityCascade(encoder, threshold, match_cutoff=args.match_cutoff,
+                                        reject_cutoff=args.reject_cutoff)
+            agree += np.array_equal(cascade.labels(chain), labels)
+            for stage in CASCADE_STAGES:
+                resolved[stage] += cascade.resolved[stage]
+        cascade_seconds = time.perf_counter() - start
+
+        print(f"threshold {threshold}: pure {pure_texts} texts encoded in {pure_seconds:.3f}s; "
+              f"cascade {encoder.texts} texts in {cascade_seconds:.3f}s, pairs settled {resolved}; "
+              f"{agree}/{len(chains)} chains with identical labels")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,208 @@
+import asyncio
+import json
+import math
+import os
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import nullcontext
+from statistics import NormalDist
+from typing import Dict, List, Optional
+
+from experiment_engine import DEFAULT_CONCURRENCY, EstimatorFactory, PromptBuilder, QueryFn, run_step
+from online_mi import OnlineMIEstimator
+from run_journal import RunJournal
+
+"""
+Adaptive allocation of a global API-call budget across a query set.
+
+Instead of REPEAT_COUNT iterations for every query, the scheduler gives each query
+`min_samples` iterations and then spends the rest of the budget in rounds, one more
+iteration of its chain per selected query, on the queries whose MI estimate is
+currently the least certain:
+
+    variance - the queries with the widest estimated interval, plus the MI shift a
+               not-yet-seen answer could still cause
+    ucb      - the same, plus a UCB1-style exploration bonus sqrt(2 ln T / n), so a query
+               that looked settled early is revisited
+
+The interval is the delta-method one for the plug-in estimate, MI = log K - H with
+Var(H) ~ (sum p ln^2 p - H^2) / N. A not-yet-seen answer is weighed by the Good-Turing
+missing mass (singletons + 1) / (N + 1) times the log((K + 1) / K) it would add. Single-answer
+factual queries therefore stop early, and multi-label queries ("Name a yellow fruit.")
+soak up the budget.
+
+After every round the allocation state is checkpointed to JSON (written atomically),
+which doubles as the per-query precision report. Resume works through the run journal,
+like run_replicate_chains.
+"""
+
+BUDGET_RULES = ('variance', 'ucb')
+DEFAULT_MIN_SAMPLES = 3
+DEFAULT_EXPLORATION = 0.1
+
+
+def plugin_half_width(counts: List[int], confidence: float = 0.95) -> float:
+    """
+    Delta-method half-width of the confidence interval of the plug-in MI estimate.
+    """
+    n = sum(counts)
+    if n < 2:
+        return math.inf
+    probs = [c / n for c in counts if c]
+    entropy = -sum(p * math.log(p) for p in probs)
+    variance = max(0.0, sum(p * math.log(p) ** 2 for p in probs) - entropy ** 2) / n
+    return NormalDist().inv_cdf(0.5 + confidence / 2) * math.sqrt(variance)
+
+
+def unseen_shift(counts: List[int]) -> float:
+    """
+    Expected MI change from answers not seen yet: missing mass times log((K + 1) / K).
+    """
+    n, k = sum(counts), len(counts)
+    if not k:
+        return math.inf
+    singletons = sum(1 for c in counts if c == 1)
+    return (singletons + 1) / (n + 1) * math.log((k + 1) / k)
+
+
+class BudgetScheduler:
+    def __init__(self, queries: List[str], budget: int, rule: str = 'variance',
+                 min_samples: int = DEFAULT_MIN_SAMPLES, max_samples: Optional[int] = None,
+                 round_size: Optional[int] = None, confidence: float = 0.95,
+                 exploration: float = DEFAULT_EXPLORATION, checkpoint: Optional[str] = None):
+        if rule not in BUDGET_RULES:
+            raise ValueError(f"budget rule must be one of {BUDGET_RULES}, got {rule!r}")
+        self.queries = list(queries)
+        self.budget = budget
+        self.rule = rule
+        self.min_samples = min_samples
+        self.max_samples = max_samples
+        # Queries advanced per round; by default half of them, so the ranking is refreshed often
+        self.round_size = round_size or max(1, len(self.queries) // 2)
+        self.confidence = confidence
+        self.exploration = exploration
+        self.checkpoint_path = checkpoint
+        self.estimators: Dict[str, OnlineMIEstimator] = {}
+        self.rounds = 0
+
+    def attach(self, query: str, estimator: OnlineMIEstimator) -> None:
+        self.estimators[query] = estimator
+
+    @property
+    def spent(self) -> int:
+        return sum(estimator.n for estimator in self.estimators.values())
+
+    def priority(self, query: str) -> float:
+        estimator = self.estimators[query]
+        if estimator.n < self.min_samples:
+            return math.inf
+        score = plugin_half_width(estimator.counts, self.confidence) + unseen_shift(estimator.counts)
+        if self.rule == 'ucb':
+            score += self.exploration * math.sqrt(2 * math.log(max(2, self.spent)) / estimator.n)
+        return score
+
+    def _eligible(self, query: str) -> bool:
+        estimator = self.estimators[query]
+        if self.max_samples is not None and estimator.n >= self.max_samples:
+            return False
+        return estimator.n < self.min_samples or not estimator.converged
+
+    def next_round(self) -> List[str]:
+        """
+        Queries to advance by one iteration each, highest priority first; empty when done.
+        """
+        remaining = self.budget - self.spent
+        candidates = [q for q in self.queries if self._eligible(q)]
+        if remaining <= 0 or not candidates:
+            return []
+        # Ties (e.g. the initial min_samples phase) go to the query with fewer samples
+        ranked = sorted(candidates, key=lambda q: (-self.priority(q), self.estimators[q].n))
+        warmup = [q for q in ranked if self.estimators[q].n < self.min_samples]
+        size = max(len(warmup), self.round_size)
+        return ranked[:min(size, remaining)]
+
+    # ---- Report ----
+    def report(self) -> List[dict]:
+        rows = []
+        for query in self.queries:
+            estimator = self.estimators[query]
+            half_width = plugin_half_width(estimator.counts, self.confidence)
+            rows.append({'query': query, 'samples': estimator.n, 'clusters': estimator.k, 'mi': estimator.mi,
+                         'half_width': half_width if math.isfinite(half_width) else None,
+                         'unseen_shift': unseen_shift(estimator.counts) if estimator.n else None,
+                         'converged': estimator.converged})
+        return rows
+
+    def state(self) -> dict:
+        return {'budget': self.budget, 'spent': self.spent, 'rule': self.rule, 'rounds': self.rounds,
+                'min_samples': self.min_samples, 'max_samples': self.max_samples,
+                'confidence': self.confidence, 'queries': self.report()}
+
+    def checkpoint(self) -> None:
+        if not self.checkpoint_path:
+            return
+        if os.path.dirname(self.checkpoint_path):
+            os.makedirs(os.path.dirname(self.checkpoint_path), exist_ok=True)
+        with open(self.checkpoint_path + '.tmp', 'w', encoding='utf-8') as file:
+            json.dump(self.state(), file, indent=2)
+        os.replace(self.checkpoint_path + '.tmp', self.checkpoint_path)
+
+    def check_resume(self) -> None:
+        """
+        Refuse to resume a checkpoint made with a different rule. The budget may change:
+        resuming with a larger one keeps spending where the last run stopped.
+        """
+        if not self.checkpoint_path or not os.path.exists(self.checkpoint_path):
+            return
+        with open(self.checkpoint_path, encoding='utf-8') as file:
+            saved = json.load(file)
+        if saved.get('rule') != self.rule:
+            raise ValueError(f"{self.checkpoint_path}: checkpoint used rule {saved.get('rule')!r}, not {self.rule!r}")
+        self.rounds = saved.get('rounds', 0)
+
+    def format(self) -> str:
+        lines = [f"Budget {self.spent}/{self.budget} calls ({self.rule}, {self.rounds} rounds):"]
+        for row in self.report():
+            width = f"± {row['half_width']:.4f}" if row['half_width'] is not None else "± -"
+            lines.append(f"  {row['samples']:>4} samples  MI {row['mi']:.4f} {width}  "
+                         f"({row['clusters']} clusters)  {row['query']}")
+        return '\n'.join(lines)
+
+
+# ---- Driver ----
+async def run_budgeted_chains(queries: List[str], build_prompt: PromptBuilder, query_fn: QueryFn,
+                              scheduler: BudgetScheduler, make_estimator: EstimatorFactory,
+                              concurrency: int = DEFAULT_CONCURRENCY, verbose: bool = True,
+                              journal: Optional[RunJournal] = None,
+                              resume_from: Optional[Dict[str, List[str]]] = None,
+                              executor: Optional[ThreadPoolExecutor] = None,
+                              semaphore: Optional[asyncio.Semaphore] = None) -> List[List[List[str]]]:
+    """
+    One chain per query, lengthened round by round as `scheduler` allocates the budget.
+    Returns responses[query][0], the shape run_replicate_chains returns for one replicate.
+    """
+    loop = asyncio.get_running_loop()
+    resume_from = resume_from or {}
+    semaphore = semaphore or asyncio.Semaphore(concurrency)
+    scheduler.check_resume()
+    chains = {query: list(resume_from.get(query, [])) for query in queries}
+
+    with nullcontext(executor) if executor else ThreadPoolExecutor(max_workers=concurrency) as executor:
+        for query in queries:
+            estimator = make_estimator(query, 0)
+            if chains[query]:
+                await loop.run_in_executor(executor, estimator.extend, chains[query])
+            scheduler.attach(query, estimator)
+
+        async def step(query: str) -> None:
+            async with semaphore:
+                await run_step(query, chains[query], build_prompt, query_fn, executor, verbose=verbose,
+                               journal=journal, estimator=scheduler.estimators[query])
+
+        while True:
+            selected = scheduler.next_round()
+            if not selected:
+                break
+            await asyncio.gather(*(step(query) for query in selected))
+            scheduler.rounds += 1
+            scheduler.checkpoint()
+    return [[chains[query]] for query in queries]
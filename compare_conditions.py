@@ -0,0 +1,295 @@
+import argparse
+import csv
+import os
+from concurrent.futures import ProcessPoolExecutor
+from typing import Callable, Dict, List, Optional, Sequence, Tuple
+
+import numpy as np
+
+from mi_estimators import mi_estimate
+
+"""
+Compare MI between two conditions, e.g. without vs with distractors.
+
+Each query's responses from both conditions are clustered together, so a label means
+the same answer in both, and then:
+
+  per query   - a permutation test of MI(B) - MI(A): under "the distractor changes
+                nothing" the condition of each response is exchangeable, so the pooled
+                labels are reshuffled between the conditions n_permutations times. All
+                permutations of a block of queries are one (queries x permutations x
+                responses) array pass; large query sets are split across processes.
+                Bootstrap intervals of the difference resample each condition's counts.
+  across      - a paired sign-flip permutation test on the per-query differences, plus
+                bootstrap intervals of the mean difference and of the paired effect
+                size d_z = mean / sd.
+
+Per-query p-values come with Benjamini-Hochberg q-values, since every query is a test.
+
+    python compare_conditions.py data/Single-Labels/mi_estimate_noDistraction.csv \\
+        data/Single-Labels/mi_estimate_distracted.csv
+    python compare_conditions.py --store results/store experiment02 experiment03
+"""
+
+DEFAULT_PERMUTATIONS = 20000
+DEFAULT_N_BOOT = 2000
+DEFAULT_MAX_BLOCK_CELLS = 4 * 1024 * 1024  # label cells per permutation block
+# Fewest queries worth shipping to another process
+PARALLEL_MIN_QUERIES = 64
+
+# cluster_fn(responses) -> one cluster label per response
+ClusterFn = Callable[[List[str]], np.ndarray]
+
+
+def _counts(labels: np.ndarray, width: int) -> np.ndarray:
+    """
+    Counts over the last axis of an integer label array, as (..., width).
+    """
+    rows = labels.reshape(-1, labels.shape[-1])
+    offsets = (np.arange(len(rows)) * width)[:, None]
+    counts = np.bincount((rows + offsets).ravel(), minlength=len(rows) * width)
+    return counts.reshape(labels.shape[:-1] + (width,))
+
+
+# ---- Per Query ----
+def _permutation_block(pooled: np.ndarray, n_a: int, n_permutations: int, estimator: str,
+                       seed: np.random.SeedSequence, max_block_cells: int) -> np.ndarray:
+    """
+    Two-sided permutation p-values for queries with the same (n_a, n_b) split;
+    `pooled` is (queries x responses), condition A first.
+    """
+    rng = np.random.default_rng(seed)
+    width = int(pooled.max()) + 1
+    total = _counts(pooled, width)
+    counts_a = _counts(pooled[:, :n_a], width)
+    observed = mi_estimate(total - counts_a, estimator) - mi_estimate(counts_a, estimator)
+    exceed = np.zeros(len(pooled), dtype=np.int64)
+    step = max(1, max_block_cells // max(1, pooled.size))
+    for start in range(0, n_permutations, step):
+        size = min(step, n_permutations - start)
+        shuffled = rng.permuted(np.repeat(pooled[:, None, :], size, axis=1), axis=-1)
+        counts_a = _counts(shuffled[..., :n_a], width)  # condition B gets the rest of the pool
+        differences = mi_estimate(total[:, None, :] - counts_a, estimator) - mi_estimate(counts_a, estimator)
+        exceed += (np.abs(differences) >= np.abs(observed)[:, None] - 1e-12).sum(axis=1)
+    return (exceed + 1) / (n_permutations + 1)
+
+
+def permutation_pvalues(labels_a: Sequence[np.ndarray], labels_b: Sequence[np.ndarray],
+                        n_permutations: int = DEFAULT_PERMUTATIONS, estimator: str = 'plugin',
+                        seed: Optional[int] = 0, workers: int = 1,
+                        max_block_cells: int = DEFAULT_MAX_BLOCK_CELLS) -> np.ndarray:
+    """
+    Per-query p-value of MI(B) - MI(A) != 0. labels_a[i] and labels_b[i] must come from
+    one joint clustering of query i's responses.
+    """
+    groups: Dict[Tuple[int, int], List[int]] = {}
+    for i, (a, b) in enumerate(zip(labels_a, labels_b)):
+        groups.setdefault((len(a), len(b)), []).append(i)
+
+    jobs = []
+    for (n_a, _), indices in sorted(groups.items()):
+        pooled = np.stack([np.concatenate([labels_a[i], labels_b[i]]).astype(np.int64) for i in indices])
+        chunks = min(max(1, workers), max(1, len(indices) // PARALLEL_MIN_QUERIES))
+        for chunk in np.array_split(np.arange(len(indices)), chunks):
+            jobs.append(([indices[i] for i in chunk], pooled[chunk], n_a))
+
+    seeds = np.random.SeedSequence(seed).spawn(len(jobs))
+    args = [(pooled, n_a, n_permutations, estimator, job_seed, max_block_cells)
+            for (_, pooled, n_a), job_seed in zip(jobs, seeds)]
+    if workers > 1 and len(jobs) > 1:
+        with ProcessPoolExecutor(max_workers=workers) as pool:
+            results = list(pool.map(_permutation_block, *zip(*args)))
+    else:
+        results = [_permutation_block(*job_args) for job_args in args]
+
+    pvalues = np.full(len(labels_a), np.nan)
+    for (indices, _, _), result in zip(jobs, results):
+        pvalues[indices] = result
+    return pvalues
+
+
+def bootstrap_differences(labels_a: Sequence[np.ndarray], labels_b: Sequence[np.ndarray],
+                          n_boot: int = DEFAULT_N_BOOT, confidence: float = 0.95, estimator: str = 'plugin',
+                          seed: Optional[int] = 0,
+                          max_block_cells: int = DEFAULT_MAX_BLOCK_CELLS) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    Percentile interval of MI(B) - MI(A) per query, resampling each condition from the
+    multinomial of its own cluster counts.
+    """
+    width = max(int(max(a.max(initial=0), b.max(initial=0))) for a, b in zip(labels_a, labels_b)) + 1
+    counts_a = np.stack([np.bincount(a, minlength=width) for a in labels_a])
+    counts_b = np.stack([np.bincount(b, minlength=width) for b in labels_b])
+    rng = np.random.default_rng(seed)
+
+    def resample(counts: np.ndarray, size: int) -> np.ndarray:
+        n = counts.sum(axis=1)
+        probs = counts / np.maximum(n, 1)[:, None]
+        probs[n == 0, 0] = 1.0
+        return rng.multinomial(np.maximum(n, 1), probs, size=(size, len(n)))
+
+    step = max(1, max_block_cells // max(1, counts_a.size))
+    differences = np.concatenate([
+        mi_estimate(resample(counts_b, size), estimator) - mi_estimate(resample(counts_a, size), estimator)
+        for size in (min(step, n_boot - start) for start in range(0, n_boot, step))])
+    alpha = (1.0 - confidence) / 2
+    low, high = np.quantile(differences, [alpha, 1.0 - alpha], axis=0)
+    return low, high
+
+
+def benjamini_hochberg(pvalues: np.ndarray) -> np.ndarray:
+    pvalues = np.asarray(pvalues, dtype=np.float64)
+    order = np.argsort(pvalues)
+    ranked = pvalues[order] * len(pvalues) / np.arange(1, len(pvalues) + 1)
+    qvalues = np.empty_like(pvalues)
+    qvalues[order] = np.minimum(1.0, np.minimum.accumulate(ranked[::-1])[::-1])
+    return qvalues
+
+
+# ---- Across Queries ----
+def paired_test(differences: np.ndarray, n_permutations: int = DEFAULT_PERMUTATIONS, n_boot: int = DEFAULT_N_BOOT,
+                confidence: float = 0.95, seed: Optional[int] = 0) -> dict:
+    """
+    Sign-flip permutation test and bootstrap intervals for the mean per-query difference.
+    """
+    d = np.asarray(differences, dtype=np.float64)
+    rng = np.random.default_rng(seed)
+    mean = d.mean()
+    flips = rng.choice(np.array([-1.0, 1.0]), size=(n_permutations, len(d)))
+    p_value = ((np.abs(flips @ d / len(d)) >= abs(mean) - 1e-12).sum() + 1) / (n_permutations + 1)
+
+    samples = d[rng.integers(0, len(d), size=(n_boot, len(d)))]
+    means = samples.mean(axis=1)
+    sds = samples.std(axis=1, ddof=1) if len(d) > 1 else np.full(n_boot, np.nan)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        effect_sizes = np.where(sds > 0, means / sds, np.nan)
+        sd = d.std(ddof=1) if len(d) > 1 else np.nan
+        d_z = mean / sd if sd > 0 else np.nan
+    alpha = (1.0 - confidence) / 2
+    return {'queries': len(d), 'mean_difference': mean, 'p_value': p_value,
+            'mean_ci': tuple(np.quantile(means, [alpha, 1.0 - alpha])),
+            'd_z': d_z, 'd_z_ci': tuple(np.nanquantile(effect_sizes, [alpha, 1.0 - alpha]))
+            if np.isfinite(effect_sizes).any() else (np.nan, np.nan),
+            'confidence': confidence}
+
+
+# ---- Comparison ----
+def compare_conditions(responses_a: Dict[str, List[str]], responses_b: Dict[str, List[str]], cluster_fn: ClusterFn,
+                       n_permutations: int = DEFAULT_PERMUTATIONS, n_boot: int = DEFAULT_N_BOOT,
+                       confidence: float = 0.95, estimator: str = 'plugin', seed: Optional[int] = 0,
+                       workers: int = 1) -> dict:
+    """
+    Per-query and paired comparison of the queries present in both conditions.
+    """
+    queries = [query for query in responses_a if query in responses_b]
+    if not queries:
+        raise ValueError("the two conditions have no query in common")
+    labels_a, labels_b = [], []
+    for query in queries:
+        a, b = responses_a[query], responses_b[query]
+        labels = np.asarray(cluster_fn(list(a) + list(b)), dtype=np.int64)
+        labels_a.append(labels[:len(a)])
+        labels_b.append(labels[len(a):])
+
+    width = max(int(np.concatenate([a, b]).max()) for a, b in zip(labels_a, labels_b)) + 1
+    mi_a = np.array([mi_estimate(np.bincount(a, minlength=width), estimator) for a in labels_a])
+    mi_b = np.array([mi_estimate(np.bincount(b, minlength=width), estimator) for b in labels_b])
+    differences = mi_b - mi_a
+    pvalues = permutation_pvalues(labels_a, labels_b, n_permutations, estimator, seed=seed, workers=workers)
+    ci_low, ci_high = bootstrap_differences(labels_a, labels_b, n_boot, confidence, estimator, seed=seed)
+    per_query = [{'query': query, 'n_a': len(a), 'n_b': len(b), 'mi_a': mi_a[i], 'mi_b': mi_b[i],
+                  'difference': differences[i], 'ci_low': ci_low[i], 'ci_high': ci_high[i],
+                  'p_value': pvalues[i], 'q_value': q}
+                 for i, (query, a, b, q) in enumerate(zip(queries, labels_a, labels_b, benjamini_hochberg(pvalues)))]
+    return {'estimator': estimator, 'n_permutations': n_permutations, 'per_query': per_query,
+            'paired': paired_test(differences, n_permutations, n_boot, confidence, seed=seed)}
+
+
+def format_comparison(result: dict, names: Tuple[str, str] = ('A', 'B')) -> str:
+    a, b = names
+    lines = [f"MI({b}) - MI({a}), {result['estimator']} estimator, {result['n_permutations']} permutations:"]
+    for row in result['per_query']:
+        lines.append(f"  {row['mi_a']:.4f} -> {row['mi_b']:.4f}  diff {row['difference']:+.4f} "
+                     f"[{row['ci_low']:+.4f}, {row['ci_high']:+.4f}]  p {row['p_value']:.4f}  "
+                     f"q {row['q_value']:.4f}  {row['query']}")
+    paired = result['paired']
+    lines.append(f"Paired over {paired['queries']} queries: mean diff {paired['mean_difference']:+.4f} "
+                 f"[{paired['mean_ci'][0]:+.4f}, {paired['mean_ci'][1]:+.4f}], d_z {paired['d_z']:+.3f} "
+                 f"[{paired['d_z_ci'][0]:+.3f}, {paired['d_z_ci'][1]:+.3f}], sign-flip p {paired['p_value']:.4f}")
+    return '\n'.join(lines)
+
+
+# ---- Inputs ----
+def load_csv_responses(path: str) -> Dict[str, List[str]]:
+    """
+    Query -> responses from a results CSV (its "|"-joined AllResponses column).
+    """
+    with open(path, newline='', encoding='utf-8') as file:
+        return {row['Query']: row['AllResponses'].split('|') for row in csv.DictReader(file)}
+
+
+def load_store_responses(root: str, experiment: str, run_id: Optional[str] = None) -> Dict[str, List[str]]:
+    """
+    Query -> responses (every replicate) of one run in the results store, the latest by default.
+    """
+    from results_store import load_results, run_index
+    run_id = run_id or (run_index(root).get(experiment) or [None])[-1]
+    if run_id is None:
+        raise ValueError(f"no runs of {experiment!r} under {root}")
+    frame = load_results(root, experiment=experiment, run_id=run_id,
+                         columns=['query', 'replicate', 'iteration', 'response']).to_pandas()
+    frame = frame.sort_values(['query', 'replicate', 'iteration'])
+    return {query: list(group) for query, group in frame.groupby('query', sort=False)['response']}
+
+
+def make_cluster_fn(clustering: str, threshold: float, embedding_model: Optional[str] = None) -> ClusterFn:
+    if clustering == 'semantic':
+        from lazy_loading import DEFAULT_EMBEDDING_MODEL, get_embedding_model
+        from semantic_clustering import cluster_responses_semantically
+        model = get_embedding_model(embedding_model or DEFAULT_EMBEDDING_MODEL)
+        return lambda responses: cluster_responses_semantically(responses, model, threshold=threshold)
+    if clustering == 'cascade':
+        from lazy_loading import DEFAULT_EMBEDDING_MODEL
+        from similarity_cascade import cluster_labels_cascade
+        return lambda responses: cluster_labels_cascade(responses, similarity_threshold=threshold,
+                                                        model_name=embedding_model or DEFAULT_EMBEDDING_MODEL)
+    from fuzzy_clustering import cluster_labels_fuzzy
+    return lambda responses: cluster_labels_fuzzy(responses, similarity_threshold=threshold)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Permutation tests of MI between two conditions")
+    parser.add_argument('a', help="Condition A: a results CSV, or an experiment name with --store")
+    parser.add_argument('b', help="Condition B: a results CSV, or an experiment name with --store")
+    parser.add_argument('--store', help="Read both conditions from this results store (latest run of each)")
+    parser.add_argument('--runs', nargs=2, metavar=('RUN_A', 'RUN_B'), help="Run ids to use with --store")
+    parser.add_argument('--clustering', choices=('fuzzy', 'semantic', 'cascade'), default='fuzzy')
+    parser.add_argument('--threshold', type=float, help="Similarity threshold (default 85 fuzzy, 0.7 semantic/cascade)")
+    parser.add_argument('--estimator', default='plugin', help="See mi_estimators.ENTROPY_ESTIMATORS")
+    parser.add_argument('--permutations', type=int, default=DEFAULT_PERMUTATIONS)
+    parser.add_argument('--n-boot', type=int, default=DEFAULT_N_BOOT)
+    parser.add_argument('--workers', type=int, default=os.cpu_count() or 1)
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--output', help="Write the per-query table to this CSV")
+    args = parser.parse_args()
+
+    if args.store:
+        runs = args.runs or (None, None)
+        responses_a = load_store_responses(args.store, args.a, runs[0])
+        responses_b = load_store_responses(args.store, args.b, runs[1])
+    else:
+        responses_a, responses_b = load_csv_responses(args.a), load_csv_responses(args.b)
+    threshold = args.threshold if args.threshold is not None else (85 if args.clustering == 'fuzzy' else 0.7)
+
+    result = compare_conditions(responses_a, responses_b, make_cluster_fn(args.clustering, threshold),
+                                n_permutations=args.permutations, n_boot=args.n_boot, estimator=args.estimator,
+                                seed=args.seed, workers=args.workers)
+    print(format_comparison(result, (os.path.basename(args.a), os.path.basename(args.b))))
+    if args.output:
+        with open(args.output, 'w', newline='', encoding='utf-8') as file:
+            writer = csv.DictWriter(file, fieldnames=list(result['per_query'][0]))
+            writer.writeheader()
+            writer.writerows(result['per_query'])
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,135 @@
+import math
+import re
+from collections import Counter
+from typing import Dict, List, Optional
+
+"""
+Conversation engine for the Single-Label runners.
+
+The runners ask one question over and over, showing the model its previous answers.
+Sent as-is, the history grows twice per turn: the assistant reply is appended to
+`messages`, and the next user message repeats every answer so far. Iteration 100
+re-sends thousands of tokens, and the total cost of a run is quadratic.
+
+Conversation keeps the answers and renders each request from one of four strategies:
+
+    full         - the original layout, every turn (quadratic; for comparison)
+    window       - the question plus the last `window` answers
+    answer_set   - the question plus each distinct answer once, with its count
+    token_budget - the question plus as many recent answers as fit in `token_budget`
+
+All but `full` send a fixed [system, user] pair whose size is bounded, so total
+token cost is linear in the number of iterations. `count_message_tokens` gives the
+request size before it is sent.
+"""
+
+CONTEXT_STRATEGIES = ('full', 'window', 'answer_set', 'token_budget')
+
+DEFAULT_WINDOW = 10
+DEFAULT_TOKEN_BUDGET = 512
+
+# Chat formats spend a few tokens per message on role markers, plus a reply primer
+TOKENS_PER_MESSAGE = 4
+TOKENS_PER_REPLY = 2
+
+_PIECES = re.compile(r"\w+|[^\w\s]")
+
+
+# ---- Token Counting ----
+def count_tokens(text: str) -> int:
+    """
+    Local estimate of the BPE token count of `text`: one token per punctuation mark
+    and per 4 characters of each word. It errs slightly high for English prose.
+    """
+    return sum(math.ceil(len(piece) / 4) for piece in _PIECES.findall(text))
+
+
+def count_message_tokens(messages: List[Dict[str, str]]) -> int:
+    return sum(TOKENS_PER_MESSAGE + count_tokens(m['content']) for m in messages) + TOKENS_PER_REPLY
+
+
+# ---- Conversation ----
+class Conversation:
+    def __init__(self, system_prompt: str, question: str, strategy: str = 'full',
+                 window: int = DEFAULT_WINDOW, token_budget: int = DEFAULT_TOKEN_BUDGET):
+        if strategy not in CONTEXT_STRATEGIES:
+            raise ValueError(f"strategy must be one of {CONTEXT_STRATEGIES}, got {strategy!r}")
+        self.system_msg = {'role': "system", 'content': system_prompt}
+        self.question = question
+        self.strategy = strategy
+        self.window = window
+        self.token_budget = token_budget
+        self.answers: List[str] = []  # what the model was shown, in order
+        self.exchanges: List[Dict[str, str]] = []  # each sent user message and its reply (not 'full')
+        self.prompt_tokens_sent = 0
+        self._counts = Counter()
+        self._history = [self.system_msg, {'role': "user", 'content': question}]  # 'full' only
+        self._history_tokens = count_message_tokens(self._history)
+        self._usr_prompt = question
+
+    @staticmethod
+    def render(question: str, answers: List[str]) -> str:
+        """
+        The runners' user prompt: the question, then "A: <first>", then "Another response: <each other>".
+        """
+        prompt = question
+        for i, answer in enumerate(answers):
+            prompt += f"\n A: {answer}" if i == 0 else f"\n Another response: {answer}"
+        return prompt
+
+    def _kept_answers(self) -> List[str]:
+        if self.strategy == 'window':
+            return self.answers[-self.window:] if self.window > 0 else []
+        if self.strategy == 'answer_set':
+            return [answer if count == 1 else f"{answer} (x{count})" for answer, count in self._counts.items()]
+
+        # token_budget: newest answers first, until the next one would not fit
+        base = count_message_tokens([self.system_msg, {'role': "user", 'content': self.question}])
+        kept = []
+        for answer in reversed(self.answers):
+            cost = count_tokens(f"\n Another response: {answer}")
+            if base + cost > self.token_budget:
+                break
+            base += cost
+            kept.append(answer)
+        return kept[::-1]
+
+    def messages(self) -> List[Dict[str, str]]:
+        """
+        The messages to send for the next turn.
+        """
+        if self.strategy == 'full':
+            return list(self._history)
+        return [self.system_msg, {'role': "user", 'content': self.render(self.question, self._kept_answers())}]
+
+    def prompt_tokens(self) -> int:
+        if self.strategy == 'full':
+            return self._history_tokens
+        return count_message_tokens(self.messages())
+
+    def add_response(self, response: str, shown: Optional[str] = None) -> None:
+        """
+        Record the model's reply. `shown` replaces it in later prompts (e.g. a planted
+        false answer); the reply itself is still kept in the transcript.
+        """
+        self.prompt_tokens_sent += self.prompt_tokens()
+        if self.strategy != 'full':
+            self.exchanges += [self.messages()[-1], {'role': "assistant", 'content': response}]
+        shown = response if shown is None else shown
+        self.answers.append(shown)
+        self._counts[shown.strip()] += 1
+
+        if self.strategy == 'full':
+            self._usr_prompt += f"\n A: {shown}" if len(self.answers) == 1 else f"\n Another response: {shown}"
+            turn = [{'role': "assistant", 'content': response}, {'role': "user", 'content': self._usr_prompt}]
+            self._history += turn
+            self._history_tokens += count_message_tokens(turn) - TOKENS_PER_REPLY
+
+    def transcript(self) -> List[Dict[str, str]]:
+        """
+        Messages to save: the full history under 'full', otherwise each sent user
+        message and the reply to it.
+        """
+        if self.strategy == 'full':
+            return list(self._history)
+        return [self.system_msg] + self.exchanges
@@ -0,0 +1,276 @@
+import os
+import threading
+import time
+from typing import Optional
+
+import requests
+
+from multi_sample import DEFAULT_MAX_N, DEFAULT_WINDOW, MultiSampleBatcher
+from rate_limiter import RateLimiter, estimate_tokens, send_with_backoff
+from response_cache import ResponseCache
+from streaming import StreamReport, consume_http_stream, consume_openai_stream, get_stop_condition
+from telemetry import Telemetry
+from usage_report import UsageReport
+
+"""
+Shared DeepSeek client for the Experiment scripts and the OpenAI-SDK runners.
+
+One pooled, keep-alive HTTP client per process instead of a fresh TCP+TLS handshake per
+call, with connect/read deadlines so a stalled socket can no longer hang a run, and a
+bounded pool size. HTTP/2 is used when DEEPSEEK_HTTP2=1 and httpx[http2] is installed.
+Endpoint and key come from the environment; nothing secret lives in the scripts.
+"""
+
+# DeepSeek API Configuration
+API_KEY = os.environ.get('DEEPSEEK_API_KEY', "NEED API-KEY TO RUN")
+BASE_URL = os.environ.get('DEEPSEEK_BASE_URL', 'https://api.deepseek.com').rstrip('/')
+API_URL = f'{BASE_URL}/v1/chat/completions'
+MODEL = os.environ.get('DEEPSEEK_MODEL', 'deepseek-chat')  # Adjust based on your subscription
+
+HEADERS = {
+    'Authorization': f'Bearer {API_KEY}',
+    'Content-Type': 'application/json'
+}
+
+# Connection parameters
+CONNECT_TIMEOUT = float(os.environ.get('DEEPSEEK_CONNECT_TIMEOUT', 10))
+READ_TIMEOUT = float(os.environ.get('DEEPSEEK_READ_TIMEOUT', 120))
+POOL_SIZE = int(os.environ.get('DEEPSEEK_POOL_SIZE', 16))
+HTTP2 = os.environ.get('DEEPSEEK_HTTP2', '0') == '1'
+
+# Shared RPM/TPM budget (DEEPSEEK_RPM / DEEPSEEK_TPM), replaces the fixed sleep between calls
+LIMITER = RateLimiter()
+# Response cache (DEEPSEEK_CACHE_MODE=readwrite|replay|off), reruns cost no API calls
+RESPONSE_CACHE = ResponseCache()
+# Token usage and context-cache hits of every live call in this process
+USAGE = UsageReport('all calls')
+# Per-call latency/token/status histograms, exported with TELEMETRY.export() at the end of a run
+TELEMETRY = Telemetry()
+# Groups identical concurrent requests into one n>1 call (opt-in per call with multi_sample=True)
+MULTI_SAMPLE = MultiSampleBatcher(lambda payload, n: _post_chat(dict(payload, n=n) if n > 1 else payload),
+                                  window=float(os.environ.get('DEEPSEEK_MULTI_SAMPLE_WINDOW', DEFAULT_WINDOW)),
+                                  max_n=int(os.environ.get('DEEPSEEK_MULTI_SAMPLE_MAX_N', DEFAULT_MAX_N)))
+
+_lock = threading.Lock()
+_http_client = None
+_openai_client = None
+
+
+# ---- HTTP Client ----
+def _make_requests_session(pool_size: int) -> requests.Session:
+    session = requests.Session()
+    adapter = requests.adapters.HTTPAdapter(pool_connections=1, pool_maxsize=pool_size, pool_block=True)
+    session.mount('https://', adapter)
+    session.mount('http://', adapter)
+    session.headers.update(HEADERS)
+    return session
+
+
+def _make_httpx_client(pool_size: int, http2: bool, headers: Optional[dict] = None):
+    import httpx
+    return httpx.Client(
+        http2=http2,
+        headers=headers,
+        timeout=httpx.Timeout(READ_TIMEOUT, connect=CONNECT_TIMEOUT),
+        limits=httpx.Limits(max_connections=pool_size, max_keepalive_connections=pool_size),
+    )
+
+
+def get_http_client():
+    """
+    Process-wide pooled client: httpx over HTTP/2 when enabled and available,
+    otherwise a requests.Session.
+    """
+    global _http_client
+    with _lock:
+        if _http_client is None:
+            if HTTP2:
+                try:
+                    _http_client = _make_httpx_client(POOL_SIZE, http2=True, headers=HEADERS)
+                except ImportError:
+                    print("HTTP/2 requested but httpx[http2] is not installed; using requests")
+            if _http_client is None:
+                _http_client = _make_requests_session(POOL_SIZE)
+        return _http_client
+
+
+def post_json(url: str, payload: dict, client=None, stream: bool = False):
+    client = client or get_http_client()
+    if isinstance(client, requests.Session):
+        return client.post(url, json=payload, timeout=(CONNECT_TIMEOUT, READ_TIMEOUT), stream=stream)
+    if stream:
+        return client.send(client.build_request('POST', url, json=payload), stream=True)
+    return client.post(url, json=payload)
+
+
+def _transport_errors() -> tuple:
+    errors = (requests.exceptions.ConnectionError, requests.exceptions.Timeout)
+    if HTTP2:
+        try:
+            import httpx
+            errors += (httpx.TransportError,)
+        except ImportError:
+            pass
+    return errors
+
+
+class APIError(Exception):
+    def __init__(self, message: str, status_code: Optional[int] = None):
+        super().__init__(message)
+        self.status_code = status_code
+
+
+# ---- Query DeepSeek-v3 ----
+def _record_usage(data: dict, latency: float, usage: Optional[UsageReport]) -> None:
+    for report in (USAGE, usage):
+        if report is not None:
+            report.record(data.get('usage'), latency)
+
+
+def _fetch_with_telemetry(cache_payload: dict, sample_index, call, stats: dict) -> dict:
+    """
+    RESPONSE_CACHE.fetch, recording the call in TELEMETRY. `call` sets stats['live']
+    when it runs and may set stats['retries'].
+    """
+    start = time.perf_counter()
+    try:
+        data = RESPONSE_CACHE.fetch(cache_payload, sample_index, call)
+    except Exception as e:
+        TELEMETRY.record_call(time.perf_counter() - start, getattr(e, 'status_code', None) or type(e).__name__,
+                              stats.get('retries', 0))
+        raise
+    if stats.get('shared'):
+        TELEMETRY.record_call(time.perf_counter() - start, 200, source='multi_sample')
+    elif stats.get('live'):
+        TELEMETRY.record_call(time.perf_counter() - start, 200, stats.get('retries', 0), data.get('usage'))
+    else:
+        TELEMETRY.record_call(time.perf_counter() - start, 200, source='response_cache')
+    return data
+
+
+def _post_chat(payload: dict, stop_condition=None, report: Optional[StreamReport] = None,
+               stats: Optional[dict] = None) -> dict:
+    """
+    One live request (retried under LIMITER); streamed and cut short when `stop_condition` is given.
+    """
+    estimated_tokens = estimate_tokens(payload)
+    start = time.perf_counter()
+    response = send_with_backoff(lambda: post_json(API_URL, payload, stream=bool(stop_condition)),
+                                 LIMITER, estimated_tokens, retry_on=_transport_errors(), stats=stats)
+    if response.status_code != 200:
+        if stop_condition and hasattr(response, 'read'):
+            response.read()  # a streamed httpx body must be read before .text
+        raise APIError(f"{response.status_code} - {response.text}", response.status_code)
+    if stop_condition:
+        data = consume_http_stream(response, stop_condition, start)
+        if report is not None:
+            report.record(data)
+    else:
+        data = response.json()
+    LIMITER.record_usage(estimated_tokens, data.get('usage'))
+    return data
+
+
+def chat_completion(payload: dict, sample_index=0, stop: Optional[str] = None,
+                    report: Optional[StreamReport] = None, usage: Optional[UsageReport] = None,
+                    multi_sample: bool = False) -> dict:
+    """
+    Response JSON for `payload`, served from RESPONSE_CACHE when this sample slot
+    was fetched before. Non-200 responses raise APIError and are never cached.
+    With `stop` (see streaming.STOP_CONDITIONS) the response is streamed and cut off
+    as soon as the answer is complete; live streams are recorded in `report`.
+    Token usage of live calls goes to USAGE and to `usage`. With `multi_sample`,
+    identical concurrent requests share one n>1 call (not combined with `stop`).
+    """
+    stop_condition = get_stop_condition(stop)
+    if stop_condition:
+        payload = dict(payload, stream=True, stream_options={'include_usage': True})
+
+    stats = {}
+
+    def call() -> dict:
+        stats['live'] = True
+        start = time.perf_counter()
+        if multi_sample and not stop_condition:
+            data, primary = MULTI_SAMPLE.request(payload)
+            stats['shared'] = not primary
+        else:
+            data = _post_chat(payload, stop_condition, report, stats)
+        if not stats.get('shared'):  # a shared call's usage is counted once, with its first choice
+            _record_usage(data, time.perf_counter() - start, usage)
+        return data
+
+    cache_payload = dict(payload, stream_stop=stop) if stop else payload
+    return _fetch_with_telemetry(cache_payload, sample_index, call, stats)
+
+
+def query_deepseek(prompt: str, sample_index=0, temperature: float = 1.0, max_tokens: Optional[int] = None,
+                   stop: Optional[str] = None, report: Optional[StreamReport] = None,
+                   usage: Optional[UsageReport] = None, multi_sample: bool = False) -> str:
+    payload = {
+        "model": MODEL,
+        "messages": [{"role": "user", "content": prompt}],
+        "temperature": temperature
+    }
+    if max_tokens is not None:
+        payload["max_tokens"] = max_tokens
+
+    try:
+        data = chat_completion(payload, sample_index, stop=stop, report=report, usage=usage,
+                               multi_sample=multi_sample)
+    except (APIError,) + _transport_errors() as e:
+        print(f"Error: {e}")
+        return "ERROR"
+    return data['choices'][0]['message']['content'].strip()
+
+
+# ---- OpenAI SDK Client ----
+def get_openai_client(max_retries: Optional[int] = None):
+    """
+    Shared OpenAI-SDK client for the Single-Label runners, on the same pooling,
+    timeout and HTTP/2 settings as the requests path.
+    """
+    global _openai_client
+    from openai import OpenAI
+
+    with _lock:
+        if _openai_client is None:
+            kwargs = {} if max_retries is None else {'max_retries': max_retries}
+            try:
+                http_client = _make_httpx_client(POOL_SIZE, http2=HTTP2)
+            except ImportError:
+                print("HTTP/2 requested but the h2 package is not installed; using HTTP/1.1")
+                http_client = _make_httpx_client(POOL_SIZE, http2=False)
+            _openai_client = OpenAI(api_key=API_KEY, base_url=BASE_URL, http_client=http_client, **kwargs)
+        return _openai_client
+
+
+def create_chat_completion(client, sample_index=0, stop: Optional[str] = None,
+                           report: Optional[StreamReport] = None, usage: Optional[UsageReport] = None,
+                           **kwargs) -> dict:
+    """
+    Cached `client.chat.completions.create(**kwargs)`, returned as a plain dict, with
+    live calls under LIMITER. `stop`, `report` and `usage` work as in chat_completion.
+    """
+    stop_condition = get_stop_condition(stop)
+    stats = {}  # the SDK retries internally, so only 'live' is known here
+
+    def call() -> dict:
+        stats['live'] = True
+        estimated_tokens = estimate_tokens(kwargs)
+        LIMITER.acquire(estimated_tokens)
+        start = time.perf_counter()
+        if not stop_condition:
+            data = client.chat.completions.create(**kwargs).model_dump()
+        else:
+            stream = client.chat.completions.create(**dict(kwargs, stream=True),
+                                                    stream_options={'include_usage': True})
+            data = consume_openai_stream(stream, stop_condition, start)
+            if report is not None:
+                report.record(data)
+        LIMITER.record_usage(estimated_tokens, data.get('usage'))
+        _record_usage(data, time.perf_counter() - start, usage)
+        return data
+
+    cache_payload = dict(kwargs, stream=True, stream_stop=stop) if stop else kwargs
+    return _fetch_with_telemetry(cache_payload, sample_index, call, stats)
@@ -0,0 +1,141 @@
+import hashlib
+import os
+import re
+import sqlite3
+import threading
+import unicodedata
+from typing import List
+
+import numpy as np
+
+"""
+Content-addressed embedding cache for the SentenceTransformer path.
+
+Responses are short and highly repetitive ("A: London.", "Banana."), so each distinct
+text is encoded once per model and kept forever. Vectors live in a memory-mapped
+float16/float32 matrix (`vectors.<dtype>`) that grows by doubling; an SQLite offset
+index maps sha256(model name + normalized text) to a row. Neither the matrix nor the
+index is held in RAM, so memory stays flat however large the corpus grows, and
+re-scoring historical runs only encodes texts never seen before. Several processes may
+share a store: each append reserves its rows under SQLite's write lock.
+"""
+
+DEFAULT_STORE_ROOT = os.environ.get('EMBEDDING_STORE_DIR', os.path.join(
+    os.path.dirname(os.path.abspath(__file__)), 'data', 'embeddings'))
+INITIAL_CAPACITY = 1024
+
+
+def normalize_text(text: str) -> str:
+    return re.sub(r'\s+', ' ', unicodedata.normalize('NFKC', text)).strip()
+
+
+def text_key(model_name: str, text: str) -> bytes:
+    return hashlib.sha256(f"{model_name}\0{text}".encode('utf-8')).digest()
+
+
+class EmbeddingStore:
+    def __init__(self, model_name: str, root: str = DEFAULT_STORE_ROOT, dtype: str = 'float16'):
+        self.model_name = model_name
+        self.dtype = np.dtype(dtype)
+        self.dir = os.path.join(root, re.sub(r'[^\w.-]+', '_', model_name))
+        os.makedirs(self.dir, exist_ok=True)
+        self.vectors_path = os.path.join(self.dir, f'vectors.{self.dtype.name}')
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+
+        self._index = sqlite3.connect(os.path.join(self.dir, 'index.sqlite'), timeout=60,
+                                      check_same_thread=False)
+        self._index.execute("CREATE TABLE IF NOT EXISTS offsets (key BLOB PRIMARY KEY, row INTEGER)")
+        self._index.execute("CREATE TABLE IF NOT EXISTS meta (name TEXT PRIMARY KEY, value INTEGER)")
+        self._index.commit()
+        meta = dict(self._index.execute("SELECT name, value FROM meta"))
+        self.dim = meta.get('dim')
+        self.rows = meta.get('rows', 0)
+        self._vectors = None
+        if self.dim is not None:
+            self._map(max(self.rows, INITIAL_CAPACITY))
+
+    # ---- Storage ----
+    def _map(self, capacity: int) -> None:
+        needed = capacity * self.dim * self.dtype.itemsize
+        if not os.path.exists(self.vectors_path) or os.path.getsize(self.vectors_path) < needed:
+            with open(self.vectors_path, 'ab') as file:
+                file.truncate(needed)
+        capacity = os.path.getsize(self.vectors_path) // (self.dim * self.dtype.itemsize)
+        self._vectors = np.memmap(self.vectors_path, dtype=self.dtype, mode='r+', shape=(capacity, self.dim))
+
+    def _append(self, keys: List[bytes], embeddings: np.ndarray) -> None:
+        # Other processes may share the store: BEGIN IMMEDIATE takes SQLite's write lock,
+        # so the row range is reserved from the current meta.rows and written before
+        # anyone else can claim it
+        self._index.execute("BEGIN IMMEDIATE")
+        try:
+            meta = dict(self._index.execute("SELECT name, value FROM meta"))
+            self.rows = meta.get('rows', 0)
+            if meta.get('dim') is None:
+                self._index.execute("INSERT INTO meta VALUES ('dim', ?)", (embeddings.shape[1],))
+            self.dim = meta.get('dim', embeddings.shape[1])
+            # Texts another process stored in the meantime keep its row
+            taken = self._lookup(keys)
+            fresh = [i for i, key in enumerate(keys) if key not in taken]
+            end = self.rows + len(fresh)
+            self._ensure_capacity(end)
+            self._vectors[self.rows:end] = embeddings[fresh]
+            self._vectors.flush()
+            self._index.executemany("INSERT INTO offsets VALUES (?, ?)",
+                                    zip((keys[i] for i in fresh), range(self.rows, end)))
+            self._index.execute("INSERT OR REPLACE INTO meta VALUES ('rows', ?)", (end,))
+            self._index.commit()
+        except BaseException:
+            self._index.rollback()
+            raise
+        self.rows = end
+
+    def _ensure_capacity(self, rows: int) -> None:
+        if self._vectors is None:
+            self._map(max(rows, INITIAL_CAPACITY))
+        elif rows > len(self._vectors):
+            # The file may already have been grown by another process
+            self._vectors.flush()
+            self._map(max(rows, 2 * len(self._vectors)))
+
+    def _lookup(self, keys: List[bytes]) -> dict:
+        found = {}
+        for start in range(0, len(keys), 500):
+            chunk = keys[start:start + 500]
+            found.update(self._index.execute(
+                f"SELECT key, row FROM offsets WHERE key IN ({','.join('?' * len(chunk))})", chunk))
+        return found
+
+    # ---- Encoding ----
+    def encode(self, texts: List[str], model, batch_size: int = 256) -> np.ndarray:
+        """
+        float32 embeddings for `texts` (in order), encoding only texts never seen before.
+        """
+        normalized = [normalize_text(text) for text in texts]
+        keys = [text_key(self.model_name, text) for text in normalized]
+
+        with self._lock:
+            rows = self._lookup(list(set(keys)))
+            missing = {}
+            for key, text in zip(keys, normalized):
+                if key not in rows:
+                    missing.setdefault(key, text)
+            self.hits += len(texts) - sum(key not in rows for key in keys)
+            self.misses += len(missing)
+
+            if missing:
+                embeddings = model.encode(list(missing.values()), batch_size=batch_size, convert_to_numpy=True)
+                self._append(list(missing), np.asarray(embeddings))
+                rows.update(self._lookup(list(missing)))
+
+            if not texts:
+                return np.zeros((0, self.dim or 0), dtype=np.float32)
+            if self.dim is None:
+                self.dim = dict(self._index.execute("SELECT name, value FROM meta"))['dim']
+            self._ensure_capacity(max(rows.values()) + 1)
+            return np.asarray(self._vectors[[rows[key] for key in keys]], dtype=np.float32)
+
+    def stats(self) -> dict:
+        return {'hits': self.hits, 'misses': self.misses, 'stored': self.rows}
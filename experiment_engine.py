@@ -0,0 +1,183 @@
+import asyncio
+import contextvars
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import nullcontext
+from typing import Callable, Dict, List, Optional
+
+from online_mi import OnlineMIEstimator
+from run_journal import RunJournal
+from telemetry import capture_call, labelled
+
+"""
+Asyncio engine for the experiment chains.
+
+Only the iterations inside one query's chain depend on each other (iteration i is
+prompted with the answers of iterations < i), so every chain runs as its own
+coroutine. Chains for different queries are interleaved up to `concurrency` at a time
+and the results come back in the order of `queries`, so CSV output stays deterministic.
+Wall-clock time scales with chain length instead of queries x chain length.
+
+run_replicate_chains runs R independent chains per query side by side, trading
+parallelism for chain length when estimating the spread of the MI estimate.
+
+With `make_estimator`, each chain feeds its responses to an online MI estimator (see
+online_mi), journals the running estimate, and stops before `repeat_count` once the
+estimator reports convergence.
+"""
+
+DEFAULT_CONCURRENCY = 8
+# sample_index offset between replicate chains, so each replicate has its own cache slots
+REPLICATE_STRIDE = 1_000_000
+
+# build_prompt(query, prev_answers, iteration) -> prompt
+PromptBuilder = Callable[[str, List[str], int], str]
+# query_fn(prompt, sample_index) -> response (blocking; runs on a worker thread)
+QueryFn = Callable[[str, int], str]
+# make_estimator(query, replicate) -> a fresh online MI estimator for that chain, or a
+# pipeline.PipelinedEstimator that clusters submitted responses off the chain's path
+EstimatorFactory = Callable[[str, int], OnlineMIEstimator]
+
+
+def replicate_chain_id(query: str, replicate: int) -> str:
+    """
+    Journal key of a replicate chain; replicate 0 keeps the plain query.
+    """
+    return query if replicate == 0 else f"{query}#{replicate}"
+
+
+async def feed_estimator(estimator, responses: List[str], executor: ThreadPoolExecutor) -> Optional[float]:
+    """
+    Hand responses to a chain's estimator; returns the updated MI, or None when a
+    pipelined estimator will cluster them later.
+    """
+    if isinstance(estimator, OnlineMIEstimator):
+        # Clustering can be CPU-bound (embeddings); keep it off the event loop
+        return await asyncio.get_running_loop().run_in_executor(executor, estimator.extend, responses)
+    for response in responses:
+        await estimator.submit(response)
+    return None
+
+
+# ---- Single Chain ----
+async def run_step(query: str, responses: List[str], build_prompt: PromptBuilder, query_fn: QueryFn,
+                   executor: ThreadPoolExecutor, verbose: bool = True, journal: Optional[RunJournal] = None,
+                   replicate: int = 0, estimator: Optional[OnlineMIEstimator] = None) -> str:
+    """
+    Run the chain's next iteration and append its response to `responses`.
+    """
+    loop = asyncio.get_running_loop()
+    chain_id = replicate_chain_id(query, replicate)
+    i = len(responses)
+    prompt = build_prompt(query, responses, i)
+    if verbose:
+        print(f"[{chain_id}]\tPROMPT {i}: {prompt} \n")
+    # Calls made on the worker thread carry this chain's telemetry labels
+    with labelled(query=query):
+        context = contextvars.copy_context()
+    call = context.run(capture_call)
+    response = await loop.run_in_executor(executor, context.run, query_fn, prompt,
+                                          replicate * REPLICATE_STRIDE + i)
+    responses.append(response)
+    entry = {}
+    if estimator is not None:
+        mi = await feed_estimator(estimator, [response], executor)
+        if mi is not None:
+            entry['mi'] = mi
+    if journal is not None:
+        journal.record(chain=chain_id, iteration=i, prompt=prompt, response=response, call=call, **entry)
+    if verbose:
+        print(f"[{chain_id}]\tRESPONSE {i}: {response}\n")
+    return response
+
+
+async def run_chain(query: str, build_prompt: PromptBuilder, query_fn: QueryFn,
+                    repeat_count: int, executor: ThreadPoolExecutor,
+                    iteration_delay: float = 0.0, verbose: bool = True,
+                    journal: Optional[RunJournal] = None, resume_from: Optional[List[str]] = None,
+                    replicate: int = 0, estimator: Optional[OnlineMIEstimator] = None) -> List[str]:
+    chain_id = replicate_chain_id(query, replicate)
+    responses = list(resume_from or [])[:repeat_count]
+    if responses and verbose:
+        print(f"[{chain_id}]\tResuming at iteration {len(responses)}")
+    if estimator is not None and responses:
+        await feed_estimator(estimator, responses, executor)
+    for i in range(len(responses), repeat_count):
+        if estimator is not None and estimator.converged:
+            if verbose:
+                print(f"[{chain_id}]\tMI converged at {estimator.mi:.4f} after {i} iterations; stopping")
+            break
+        await run_step(query, responses, build_prompt, query_fn, executor, verbose=verbose, journal=journal,
+                       replicate=replicate, estimator=estimator)
+        if iteration_delay:
+            await asyncio.sleep(iteration_delay)
+    return responses
+
+
+# ---- All Chains ----
+async def run_replicate_chains(queries: List[str], build_prompt: PromptBuilder, query_fn: QueryFn,
+                               repeat_count: int, replicates: int = 1, concurrency: int = DEFAULT_CONCURRENCY,
+                               iteration_delay: float = 0.0, verbose: bool = True,
+                               journal: Optional[RunJournal] = None,
+                               resume_from: Optional[Dict[str, List[str]]] = None,
+                               executor: Optional[ThreadPoolExecutor] = None,
+                               semaphore: Optional[asyncio.Semaphore] = None,
+                               make_estimator: Optional[EstimatorFactory] = None) -> List[List[List[str]]]:
+    """
+    Run `replicates` independent chains per query, at most `concurrency` chains in flight.
+    Returns responses[query][replicate] in the order of `queries`. Each replicate is
+    journaled under replicate_chain_id(query, replicate) and draws its own samples.
+    Chains stopped early by their estimator are shorter than `repeat_count`.
+    """
+    resume_from = resume_from or {}
+    semaphore = semaphore or asyncio.Semaphore(concurrency)
+
+    with nullcontext(executor) if executor else ThreadPoolExecutor(max_workers=concurrency) as executor:
+        async def bounded_chain(query: str, replicate: int) -> List[str]:
+            async with semaphore:
+                if verbose:
+                    print(f"Processing: {replicate_chain_id(query, replicate)}")
+                return await run_chain(query, build_prompt, query_fn, repeat_count, executor,
+                                       iteration_delay=iteration_delay, verbose=verbose, journal=journal,
+                                       resume_from=resume_from.get(replicate_chain_id(query, replicate)),
+                                       replicate=replicate,
+                                       estimator=make_estimator(query, replicate) if make_estimator else None)
+
+        chains = await asyncio.gather(*(bounded_chain(query, replicate)
+                                        for query in queries for replicate in range(replicates)))
+    return [chains[q * replicates:(q + 1) * replicates] for q in range(len(queries))]
+
+
+async def run_chains(queries: List[str], build_prompt: PromptBuilder, query_fn: QueryFn,
+                     repeat_count: int, concurrency: int = DEFAULT_CONCURRENCY,
+                     iteration_delay: float = 0.0, verbose: bool = True,
+                     journal: Optional[RunJournal] = None,
+                     resume_from: Optional[Dict[str, List[str]]] = None,
+                     executor: Optional[ThreadPoolExecutor] = None,
+                     semaphore: Optional[asyncio.Semaphore] = None,
+                     make_estimator: Optional[EstimatorFactory] = None) -> List[List[str]]:
+    """
+    Run one chain per query, at most `concurrency` chains in flight.
+    Returns the responses of each chain in the order of `queries`. Chains found in
+    `resume_from` (see run_journal.load_chains) continue from where they stopped.
+    Pass a shared `executor` and `semaphore` to bound several experiments together.
+    """
+    chains = await run_replicate_chains(queries, build_prompt, query_fn, repeat_count, replicates=1,
+                                        concurrency=concurrency, iteration_delay=iteration_delay,
+                                        verbose=verbose, journal=journal, resume_from=resume_from,
+                                        executor=executor, semaphore=semaphore, make_estimator=make_estimator)
+    return [replicates[0] for replicates in chains]
+
+
+def run_experiment_chains(queries: List[str], build_prompt: PromptBuilder, query_fn: QueryFn,
+                          repeat_count: int, concurrency: int = DEFAULT_CONCURRENCY,
+                          iteration_delay: float = 0.0, verbose: bool = True,
+                          journal: Optional[RunJournal] = None,
+                          resume_from: Optional[Dict[str, List[str]]] = None,
+                          make_estimator: Optional[EstimatorFactory] = None) -> List[List[str]]:
+    """
+    Blocking entry point for the Experiment scripts.
+    """
+    return asyncio.run(run_chains(queries, build_prompt, query_fn, repeat_count,
+                                  concurrency=concurrency, iteration_delay=iteration_delay,
+                                  verbose=verbose, journal=journal, resume_from=resume_from,
+                                  make_estimator=make_estimator))
@@ -0,0 +1,110 @@
+import json
+import os
+from dataclasses import dataclass, field, fields
+from typing import Dict, List, Optional
+
+from lazy_loading import DEFAULT_EMBEDDING_MODEL
+from answer_extraction import EXTRACTION_STRATEGIES
+from budget_scheduler import BUDGET_RULES
+from prompts import PROMPT_LAYOUTS, PROMPT_STRATEGIES
+from similarity_cascade import DEFAULT_MATCH_CUTOFF, DEFAULT_REJECT_CUTOFF
+from streaming import get_stop_condition
+
+"""
+Declarative experiment specs.
+
+A spec is a JSON or TOML file (YAML too when PyYAML is installed) whose keys are the
+fields of ExperimentSpec, e.g.
+
+    {
+        "name": "experiment06",
+        "queries": ["Name a city in the UK?"],
+        "distractors": {"Name a city in the UK?": ["Los Angeles."]},
+        "prompt_strategy": "last_answer",
+        "inject_distractors": true,
+        "clustering": "semantic",
+        "similarity_threshold": 0.7
+    }
+"""
+
+CLUSTERING_BACKENDS = ('fuzzy', 'semantic', 'cascade')
+
+
+@dataclass
+class ExperimentSpec:
+    name: str
+    queries: List[str]
+    description: str = ''
+    distractors: Dict[str, List[str]] = field(default_factory=dict)
+    prompt_strategy: str = 'last_answer'
+    prompt_layout: str = 'question_last'  # 'static_first' maximizes the context-cache prefix
+    inject_distractors: bool = False
+    repeat_count: int = 10
+    replicates: int = 1  # independent chains per query, run concurrently
+    confidence: float = 0.95  # of the MI confidence interval across replicates
+    multi_sample: bool = False  # share one n>1 call between identical concurrent requests
+    early_stop_tolerance: Optional[float] = None  # stop a chain once its MI moves less than this...
+    early_stop_patience: int = 5  # ...over this many responses
+    min_iterations: int = 5  # never stop a chain before this many responses
+    call_budget: Optional[int] = None  # total calls, allocated adaptively; replaces repeat_count
+    budget_rule: str = 'variance'  # see budget_scheduler.BUDGET_RULES
+    clustering: str = 'fuzzy'
+    similarity_threshold: float = 85  # rapidfuzz score for 'fuzzy', cosine for 'semantic' and 'cascade'
+    embedding_model: str = DEFAULT_EMBEDDING_MODEL
+    # 'cascade': fuzzy scores settled without embeddings above and below these; a heuristic that can
+    # label differently from 'semantic' (100 and None never do, see similarity_cascade)
+    cascade_match_cutoff: float = DEFAULT_MATCH_CUTOFF
+    cascade_reject_cutoff: Optional[float] = DEFAULT_REJECT_CUTOFF
+    answer_extraction: str = 'none'  # cluster extracted answer spans; see answer_extraction.EXTRACTION_STRATEGIES
+    stream_stop: Optional[str] = None  # e.g. 'first_newline'; see streaming.STOP_CONDITIONS
+    max_tokens: Optional[int] = None  # None leaves the answer length uncapped
+    output_file: Optional[str] = None  # defaults to results/<name>.csv
+    journal_file: Optional[str] = None  # defaults to journals/<name>.jsonl
+    results_store: Optional[str] = 'results/store'  # per-response Parquet rows; None to skip
+
+    def __post_init__(self):
+        if self.prompt_strategy not in PROMPT_STRATEGIES:
+            raise ValueError(f"{self.name}: unknown prompt_strategy {self.prompt_strategy!r}")
+        if self.prompt_layout not in PROMPT_LAYOUTS:
+            raise ValueError(f"{self.name}: prompt_layout must be one of {PROMPT_LAYOUTS}")
+        if self.clustering not in CLUSTERING_BACKENDS:
+            raise ValueError(f"{self.name}: clustering must be one of {CLUSTERING_BACKENDS}")
+        if self.answer_extraction not in EXTRACTION_STRATEGIES:
+            raise ValueError(f"{self.name}: answer_extraction must be one of {EXTRACTION_STRATEGIES}")
+        if self.cascade_reject_cutoff is not None and self.cascade_reject_cutoff >= self.cascade_match_cutoff:
+            raise ValueError(f"{self.name}: cascade_reject_cutoff must be below cascade_match_cutoff")
+        if not self.queries:
+            raise ValueError(f"{self.name}: no queries")
+        if self.replicates < 1:
+            raise ValueError(f"{self.name}: replicates must be >= 1")
+        if self.budget_rule not in BUDGET_RULES:
+            raise ValueError(f"{self.name}: budget_rule must be one of {BUDGET_RULES}")
+        if self.call_budget is not None and self.replicates != 1:
+            raise ValueError(f"{self.name}: call_budget runs one chain per query; set replicates to 1")
+        if self.early_stop_tolerance is not None and self.early_stop_tolerance < 0:
+            raise ValueError(f"{self.name}: early_stop_tolerance must be >= 0")
+        get_stop_condition(self.stream_stop)
+        self.output_file = self.output_file or os.path.join('results', f'{self.name}.csv')
+        self.journal_file = self.journal_file or os.path.join('journals', f'{self.name}.jsonl')
+
+
+def load_spec(path: str) -> ExperimentSpec:
+    extension = os.path.splitext(path)[1].lower()
+    if extension == '.toml':
+        import tomllib
+        with open(path, 'rb') as file:
+            data = tomllib.load(file)
+    elif extension in ('.yaml', '.yml'):
+        import yaml
+        with open(path, encoding='utf-8') as file:
+            data = yaml.safe_load(file)
+    else:
+        with open(path, encoding='utf-8') as file:
+            data = json.load(file)
+
+    known = {f.name for f in fields(ExperimentSpec)}
+    unknown = set(data) - known
+    if unknown:
+        raise ValueError(f"{path}: unknown spec keys {sorted(unknown)}")
+    data.setdefault('name', os.path.splitext(os.path.basename(path))[0])
+    return ExperimentSpec(**data)
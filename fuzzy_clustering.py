@@ -0,0 +1,111 @@
+from collections import Counter
+from typing import Callable, List, Optional
+
+import numpy as np
+from rapidfuzz import fuzz, process
+
+from mi_estimators import mi_lower_bound
+
+"""
+Bulk fuzzy clustering for the MI estimate.
+
+`mutual_information_estimate_fuzzy` used to compare every response against `cluster[0]`
+of each existing cluster with one `fuzz.ratio` call at a time. Here responses are
+deduplicated (after an optional preprocessing processor, applied once per distinct
+text), and score matrices against the cluster seeds come from `rapidfuzz.process.cdist`
+with a `score_cutoff`, on one thread unless `workers` asks for more (a thread pool only
+pays off for thousands of texts). Below `loop_max_texts` distinct texts, e.g. a
+10-response chain, cdist's set-up costs more than it saves and the pairs are scored one
+at a time; bench_fuzzy_clustering.py reports the crossover. With seed_order='input' the assignment is exactly
+the original one (first seed, in creation order, scoring >= threshold); with
+seed_order='frequency' the most common answers seed first, so the result no longer
+depends on the order the responses arrived in.
+"""
+
+DEFAULT_MAX_BLOCK_CELLS = 16 * 1024 * 1024  # float64 cells per score matrix
+DEFAULT_LOOP_MAX_TEXTS = 64  # distinct texts up to which the pairwise loop beats cdist
+
+
+def _loop_labels(texts: List[str], similarity_threshold, scorer) -> np.ndarray:
+    # The original greedy loop, over distinct texts: the first seed scoring >= threshold wins
+    seeds: List[str] = []
+    labels = np.empty(len(texts), dtype=np.int32)
+    for i, text in enumerate(texts):
+        for label, seed in enumerate(seeds):
+            if scorer(text, seed, score_cutoff=similarity_threshold) >= similarity_threshold:
+                break
+        else:
+            label = len(seeds)
+            seeds.append(text)
+        labels[i] = label
+    return labels
+
+
+def _bulk_labels(texts: List[str], similarity_threshold, scorer, workers: int, max_block_cells: int) -> np.ndarray:
+    unique_labels = np.full(len(texts), -1, dtype=np.int32)
+    seeds: List[str] = []
+
+    start = 0
+    while start < len(texts):
+        rows = max(1, min(len(texts) - start, max_block_cells // max(1, len(seeds))))
+        block = np.arange(start, start + rows)
+        start += rows
+
+        # Against the existing seeds: the first (oldest) matching seed wins
+        if seeds:
+            scores = process.cdist([texts[i] for i in block], seeds, scorer=scorer,
+                                   score_cutoff=similarity_threshold, workers=workers, dtype=np.float64)
+            matched = scores >= similarity_threshold
+            has_match = matched.any(axis=1)
+            unique_labels[block[has_match]] = matched[has_match].argmax(axis=1)
+            block = block[~has_match]
+
+        # The rest seed new clusters one at a time, in order
+        while block.size:
+            seed = block[0]
+            unique_labels[seed] = len(seeds)
+            seeds.append(texts[seed])
+            rest = block[1:]
+            if rest.size:
+                scores = process.cdist([texts[seed]], [texts[i] for i in rest], scorer=scorer,
+                                       score_cutoff=similarity_threshold, workers=workers, dtype=np.float64)[0]
+                joined = scores >= similarity_threshold
+                unique_labels[rest[joined]] = unique_labels[seed]
+                rest = rest[~joined]
+            block = rest
+
+    return unique_labels
+
+
+def cluster_labels_fuzzy(responses: List[str], similarity_threshold=85, processor: Optional[Callable] = None,
+                         scorer=fuzz.ratio, workers: int = 1, seed_order: str = 'input',
+                         max_block_cells: int = DEFAULT_MAX_BLOCK_CELLS,
+                         loop_max_texts: int = DEFAULT_LOOP_MAX_TEXTS) -> np.ndarray:
+    """
+    Cluster label (0, 1, ... in seed order) for each response.
+    """
+    keys = [processor(r) for r in responses] if processor else list(responses)
+    # Identical texts always land in the same cluster, so only distinct ones are scored
+    counts = Counter(keys)  # in first-seen order
+    if seed_order == 'input':
+        texts = list(counts)
+    elif seed_order == 'frequency':
+        texts = sorted(counts, key=lambda text: (-counts[text], text))
+    else:
+        raise ValueError(f"seed_order must be 'input' or 'frequency', got {seed_order!r}")
+
+    if len(texts) <= loop_max_texts:
+        unique_labels = _loop_labels(texts, similarity_threshold, scorer)
+    else:
+        unique_labels = _bulk_labels(texts, similarity_threshold, scorer, workers, max_block_cells)
+    label_of = dict(zip(texts, unique_labels.tolist()))
+    return np.fromiter((label_of[key] for key in keys), dtype=np.int32, count=len(keys))
+
+
+def mutual_information_estimate_fuzzy(responses, similarity_threshold=85, processor: Optional[Callable] = None,
+                                      seed_order: str = 'input'):
+    # --- Step 1: Cluster similar responses ---
+    labels = cluster_labels_fuzzy(responses, similarity_threshold, processor=processor, seed_order=seed_order)
+
+    # --- Step 2: Entropy-based MI lower bound from the cluster sizes ---
+    return mi_lower_bound(labels)
@@ -0,0 +1,67 @@
+import threading
+
+"""
+Lazy loading for the embedding model.
+
+Importing sentence_transformers pulls in torch and takes seconds, and constructing the
+SentenceTransformer takes longer still, so neither should happen at script import time.
+`get_embedding_model` loads a model on first use and shares it process-wide;
+`warm_embedding_model` starts that load on a background thread so it overlaps with the
+first API calls instead of delaying them.
+"""
+
+DEFAULT_EMBEDDING_MODEL = 'all-MiniLM-L6-v2'
+
+_models = {}
+_loading = {}
+_lock = threading.Lock()
+
+
+# ---- Embedding Model ----
+def _load(name: str, done: threading.Event) -> None:
+    try:
+        from sentence_transformers import SentenceTransformer
+        model = SentenceTransformer(name)
+        with _lock:
+            _models[name] = model
+    finally:
+        done.set()
+
+
+def _start_loading(name: str) -> threading.Event:
+    # Caller holds _lock
+    done = _loading.get(name)
+    if done is None:
+        done = _loading[name] = threading.Event()
+        threading.Thread(target=_load, args=(name, done), daemon=True, name=f"load-{name}").start()
+    return done
+
+
+def warm_embedding_model(name: str = DEFAULT_EMBEDDING_MODEL) -> None:
+    """
+    Start loading `name` in the background; returns immediately.
+    """
+    with _lock:
+        if name not in _models:
+            _start_loading(name)
+
+
+def get_embedding_model(name: str = DEFAULT_EMBEDDING_MODEL):
+    """
+    The process-wide model `name`, waiting for (or starting) its load if needed.
+    """
+    with _lock:
+        if name in _models:
+            return _models[name]
+        done = _start_loading(name)
+    done.wait()
+    with _lock:
+        if name not in _models:
+            # The background load failed; retry in the foreground so the error surfaces
+            _loading.pop(name, None)
+    if name not in _models:
+        from sentence_transformers import SentenceTransformer
+        model = SentenceTransformer(name)
+        with _lock:
+            _models[name] = model
+    return _models[name]
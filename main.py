@@ -1,10 +1,10 @@
-from openai import OpenAI
+from deepseek_client import MODEL, get_openai_client
 
 
-client = OpenAI(api_key=API_KEY, base_url="https://api.deepseek.com")
+client = get_openai_client()
 
 response = client.chat.completions.create(
-    model="deepseek-chat",
+    model=MODEL,
     messages=[
         {
             "role": "system", 
@@ -0,0 +1,191 @@
+from typing import Dict, Optional, Sequence, Tuple
+
+import numpy as np
+
+"""
+Batched entropy / MI estimators over cluster labels.
+
+Every query's responses end up as an array of cluster labels; a batch of them (one
+per query, of different lengths) becomes one (queries x clusters) count matrix, and
+every estimator below is a handful of array operations on that matrix, so thousands
+of queries are scored at once.
+
+Entropy estimators (nats):
+
+    plugin        - maximum likelihood, -sum p log p; biased low for small N
+    miller_madow  - plugin + (K - 1) / 2N
+    chao_shen     - Horvitz-Thompson over coverage-adjusted probabilities (Chao & Shen
+                    2003); accounts for answers not seen yet
+    jackknife     - leave-one-out bias correction of the plugin estimate
+
+The MI lower bound of the experiment scripts, sum p log(p K) = log K - H with K the
+observed clusters, is reported for each of them (mi_estimate(counts, 'plugin') is the
+scripts' number). Bootstrap confidence intervals resample every query's counts from
+its own multinomial in one vectorized draw per block of resamples, shared by all
+estimators.
+"""
+
+ENTROPY_ESTIMATORS = ('plugin', 'miller_madow', 'chao_shen', 'jackknife')
+DEFAULT_N_BOOT = 1000
+DEFAULT_MAX_BLOCK_CELLS = 8 * 1024 * 1024  # int64 cells per block of bootstrap draws
+
+
+def _xlogx(x) -> np.ndarray:
+    """
+    x log x with 0 log 0 = 0. Counts are small integers, so for those it is a table lookup.
+    """
+    x = np.asarray(x)
+    if np.issubdtype(x.dtype, np.integer):
+        values = np.arange(max(int(x.max(initial=0)), 0) + 2, dtype=np.float64)
+        table = values * np.log(np.maximum(values, 1.0))
+        return table[np.maximum(x, 0)]
+    x = x.astype(np.float64, copy=False)
+    return np.where(x > 0, x * np.log(np.where(x > 0, x, 1.0)), 0.0)
+
+
+def label_counts(label_batch: Sequence) -> np.ndarray:
+    """
+    (queries x clusters) int64 counts from one label array per query (ragged).
+    """
+    lengths = np.fromiter((len(labels) for labels in label_batch), dtype=np.int64, count=len(label_batch))
+    if not lengths.sum():
+        return np.zeros((len(lengths), 1), dtype=np.int64)
+    flat = np.concatenate([np.asarray(labels, dtype=np.int64).ravel() for labels in label_batch])
+    width = int(flat.max()) + 1
+    rows = np.repeat(np.arange(len(lengths)), lengths)
+    return np.bincount(rows * width + flat, minlength=len(lengths) * width).reshape(len(lengths), width)
+
+
+# ---- Entropy ----
+def plugin_entropy(counts) -> np.ndarray:
+    counts = np.asarray(counts)
+    n = counts.sum(axis=-1).astype(np.float64)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        return np.log(n) - _xlogx(counts).sum(axis=-1) / n
+
+
+def miller_madow_entropy(counts) -> np.ndarray:
+    counts = np.asarray(counts)
+    n = counts.sum(axis=-1)
+    k = (counts > 0).sum(axis=-1)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        return plugin_entropy(counts) + (k - 1) / (2.0 * n)
+
+
+def chao_shen_entropy(counts) -> np.ndarray:
+    counts = np.asarray(counts)
+    n = counts.sum(axis=-1).astype(np.float64)
+    singletons = (counts == 1).sum(axis=-1)
+    singletons = np.where(singletons == n, n - 1, singletons)  # all singletons would give zero coverage
+    with np.errstate(divide='ignore', invalid='ignore'):
+        coverage = 1.0 - singletons / n
+        p = coverage[..., None] * counts / n[..., None]
+        inclusion = 1.0 - (1.0 - p) ** n[..., None]
+        terms = np.where(counts > 0, -_xlogx(p) / inclusion, 0.0)
+    return np.where(n > 0, terms.sum(axis=-1), np.nan)
+
+
+def jackknife_entropy(counts) -> np.ndarray:
+    counts = np.asarray(counts)
+    n = counts.sum(axis=-1).astype(np.float64)
+    total = _xlogx(counts).sum(axis=-1)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        # Entropy with one response of cluster j left out, for every j at once
+        left_out = total[..., None] - _xlogx(counts) + _xlogx(counts - 1)
+        h_minus = np.log(n - 1)[..., None] - left_out / (n - 1)[..., None]
+        mean_minus = np.where(counts > 0, counts * h_minus, 0.0).sum(axis=-1) / n
+        jackknife = n * plugin_entropy(counts) - (n - 1) * mean_minus
+    return np.where(n > 1, jackknife, plugin_entropy(counts))
+
+
+_ENTROPY = {
+    'plugin': plugin_entropy,
+    'miller_madow': miller_madow_entropy,
+    'chao_shen': chao_shen_entropy,
+    'jackknife': jackknife_entropy,
+}
+
+
+def entropy(counts, estimator: str = 'plugin') -> np.ndarray:
+    if estimator not in _ENTROPY:
+        raise ValueError(f"estimator must be one of {ENTROPY_ESTIMATORS}, got {estimator!r}")
+    return _ENTROPY[estimator](counts)
+
+
+# ---- MI ----
+def mi_estimate(counts, estimator: str = 'plugin') -> np.ndarray:
+    """
+    log K - H per row; a single cluster is exactly 0 and an empty row is NaN.
+    Bias-corrected entropies can exceed log K, so those MI values can be negative.
+    """
+    counts = np.asarray(counts)
+    k = (counts > 0).sum(axis=-1)
+    with np.errstate(divide='ignore'):
+        mi = np.log(k) - entropy(counts, estimator)
+    if estimator == 'plugin':
+        mi = np.maximum(mi, 0.0)  # H <= log K exactly; only rounding can make it negative
+    return np.where(k > 1, mi, np.where(k == 1, 0.0, np.nan))
+
+
+def mi_lower_bound(labels) -> float:
+    """
+    The experiment scripts' MI for one array of cluster labels.
+    """
+    return float(mi_estimate(label_counts([labels]), 'plugin')[0])
+
+
+def bootstrap_intervals(counts, estimators: Sequence[str] = ('plugin',), n_boot: int = DEFAULT_N_BOOT,
+                        confidence: float = 0.95, seed: Optional[int] = 0,
+                        max_block_cells: int = DEFAULT_MAX_BLOCK_CELLS) -> Dict[str, Tuple[np.ndarray, np.ndarray]]:
+    """
+    Percentile bootstrap interval of mi_estimate per row and estimator: every row is
+    resampled from the multinomial of its own counts, `n_boot` times, and all
+    estimators are evaluated on the same resamples.
+    """
+    counts = np.asarray(counts)
+    n = counts.sum(axis=-1)
+    rng = np.random.default_rng(seed)
+    probs = counts / np.maximum(n, 1)[:, None]
+    probs[n == 0, 0] = 1.0
+
+    block = max(1, max_block_cells // max(1, counts.size))
+    draws: Dict[str, list] = {estimator: [] for estimator in estimators}
+    for start in range(0, n_boot, block):
+        resampled = rng.multinomial(np.maximum(n, 1), probs, size=(min(block, n_boot - start), len(n)))
+        for estimator in estimators:
+            draws[estimator].append(mi_estimate(resampled, estimator))
+
+    alpha = (1.0 - confidence) / 2
+    intervals = {}
+    for estimator in estimators:
+        low, high = np.quantile(np.concatenate(draws[estimator], axis=0), [alpha, 1.0 - alpha], axis=0)
+        intervals[estimator] = (np.where(n > 0, low, np.nan), np.where(n > 0, high, np.nan))
+    return intervals
+
+
+def bootstrap_ci(counts, estimator: str = 'plugin', n_boot: int = DEFAULT_N_BOOT, confidence: float = 0.95,
+                 seed: Optional[int] = 0) -> Tuple[np.ndarray, np.ndarray]:
+    return bootstrap_intervals(counts, (estimator,), n_boot=n_boot, confidence=confidence, seed=seed)[estimator]
+
+
+def score_labels(label_batch: Sequence, estimators: Sequence[str] = ENTROPY_ESTIMATORS,
+                 n_boot: int = 0, confidence: float = 0.95, seed: Optional[int] = 0) -> Dict[str, np.ndarray]:
+    """
+    Column arrays, one entry per query: n, clusters, and entropy_<estimator> and
+    mi_<estimator> for each estimator (plus mi_<estimator>_ci_low/_high with n_boot > 0).
+
+    Every estimator depends only on the sorted cluster sizes, so queries with the same
+    profile (most of them, for short chains) are scored once.
+    """
+    counts = -np.sort(-label_counts(label_batch), axis=1)
+    profiles, inverse = np.unique(counts, axis=0, return_inverse=True)
+    inverse = inverse.ravel()
+    scores = {'n': counts.sum(axis=-1), 'clusters': (counts > 0).sum(axis=-1)}
+    for estimator in estimators:
+        scores[f'entropy_{estimator}'] = entropy(profiles, estimator)[inverse]
+        scores[f'mi_{estimator}'] = mi_estimate(profiles, estimator)[inverse]
+    if n_boot:
+        intervals = bootstrap_intervals(profiles, estimators, n_boot=n_boot, confidence=confidence, seed=seed)
+        for estimator, (low, high) in intervals.items():
+            scores[f'mi_{estimator}_ci_low'], scores[f'mi_{estimator}_ci_high'] = low[inverse], high[inverse]
+    return scores
@@ -0,0 +1,127 @@
+import json
+import threading
+from concurrent.futures import Future
+from typing import Callable, Dict, List, Optional, Tuple
+
+"""
+Group identical concurrent requests into one multi-sample (n > 1) call.
+
+Iteration 0 of every replicate chain sends the same prompt, and with the last_answer
+strategy two chains whose previous answers match send the same prompt too. Instead
+of k identical requests, the first caller with a given payload waits up to `window`
+seconds for others, then one request with n=k is sent and its choices are handed
+out, one per caller. Each caller still caches its response under its own sample slot.
+
+Endpoints that ignore `n` (fewer choices come back) or reject it (400/422) are
+detected on the first try: callers left without a choice fall back to their own
+single-sample calls, and the batcher passes requests straight through afterwards.
+"""
+
+DEFAULT_WINDOW = 0.02
+DEFAULT_MAX_N = 16
+
+# call_n(payload, n) -> the response dict of one request asking for n choices
+CallN = Callable[[dict, int], dict]
+
+
+def split_choices(data: dict) -> List[dict]:
+    """
+    One single-choice response per choice of a multi-sample response. The call's
+    usage goes with the first; the rest carry usage None.
+    """
+    responses = []
+    for position, choice in enumerate(data.get('choices') or []):
+        response = {key: value for key, value in data.items() if key not in ('choices', 'usage')}
+        response['choices'] = [dict(choice, index=0)]
+        response['usage'] = data.get('usage') if position == 0 else None
+        response['multi_sample'] = {'n': len(data['choices']), 'position': position}
+        responses.append(response)
+    return responses
+
+
+class _Group:
+    def __init__(self, payload: dict):
+        self.payload = payload
+        self.futures: List[Future] = []
+        self.full = threading.Event()
+
+
+class MultiSampleBatcher:
+    def __init__(self, call_n: CallN, window: float = DEFAULT_WINDOW, max_n: int = DEFAULT_MAX_N,
+                 unsupported_status: Tuple[int, ...] = (400, 422)):
+        self.call_n = call_n
+        self.window = window
+        self.max_n = max_n
+        self.unsupported_status = unsupported_status
+        self.supports_n: Optional[bool] = None  # unknown until the first n > 1 call
+        self.requests = 0
+        self.calls = 0
+        self._open: Dict[str, _Group] = {}
+        self._lock = threading.Lock()
+
+    def request(self, payload: dict) -> Tuple[dict, bool]:
+        """
+        One single-choice response for `payload` (blocking), and whether this caller's
+        share carries the usage of the underlying call.
+        """
+        with self._lock:
+            self.requests += 1
+            if self.supports_n is False:
+                self.calls += 1
+                passthrough = True
+            else:
+                passthrough = False
+                key = json.dumps(payload, sort_keys=True, ensure_ascii=False)
+                group = self._open.get(key)
+                leader = group is None
+                if leader:
+                    group = self._open[key] = _Group(payload)
+                future = Future()
+                group.futures.append(future)
+                if len(group.futures) >= self.max_n:
+                    del self._open[key]
+                    group.full.set()
+        if passthrough:
+            return self.call_n(payload, 1), True
+
+        if leader:
+            group.full.wait(self.window)
+            with self._lock:
+                if self._open.get(key) is group:
+                    del self._open[key]
+            self._dispatch(group)
+
+        result = future.result()
+        if result is None:
+            # The endpoint gave this caller no choice; make a call of its own
+            with self._lock:
+                self.calls += 1
+            return self.call_n(payload, 1), True
+        return result
+
+    def _dispatch(self, group: _Group) -> None:
+        n = len(group.futures)
+        with self._lock:
+            self.calls += 1
+        try:
+            data = self.call_n(group.payload, n)
+        except Exception as e:
+            if n > 1 and getattr(e, 'status_code', None) in self.unsupported_status:
+                self.supports_n = False
+                for future in group.futures:
+                    future.set_result(None)
+                return
+            for future in group.futures:
+                future.set_exception(e)
+            return
+
+        responses = split_choices(data) if n > 1 else [data]
+        if n > 1:
+            with self._lock:
+                # Keep batching only while the endpoint keeps honoring n
+                self.supports_n = len(responses) >= n
+        for position, future in enumerate(group.futures):
+            future.set_result((responses[position], position == 0) if position < len(responses) else None)
+
+    def stats(self) -> dict:
+        return {'requests': self.requests, 'calls': self.calls, 'supports_n': self.supports_n}
@@ -0,0 +1,196 @@
+import math
+from typing import Callable, Dict, List, Optional
+
+import numpy as np
+from rapidfuzz import fuzz, process
+
+from lazy_loading import DEFAULT_EMBEDDING_MODEL, get_embedding_model
+from semantic_clustering import normalize_embeddings
+from similarity_cascade import SimilarityCascade
+
+"""
+Incremental MI estimate, updated per response.
+
+The batch estimators recluster the whole chain after it is done. An online estimator
+keeps the cluster counts and one representative per cluster instead: a new response
+is compared against the k representatives (O(k)) and joins the first one it matches,
+or founds a new cluster. Representatives are each cluster's first response, which
+is exactly what the batch greedy clustering compares against, so after the last
+response the labels and the MI equal those of mutual_information_estimate_fuzzy
+(seed_order='input'), mutual_information_estimate_semantic and
+mutual_information_estimate_cascade.
+
+The MI estimate is sum_i p_i log(p_i K) = log K - H with H = log N - S / N and
+S = sum_i c_i log c_i, so one count increment updates it in O(1).
+
+With a `tolerance`, the estimator reports `converged` once the estimate has moved by
+at most `tolerance` over the last `patience` responses (and at least `min_samples`
+have arrived); the experiment engine stops the chain there.
+"""
+
+DEFAULT_PATIENCE = 5
+DEFAULT_MIN_SAMPLES = 5
+
+
+def _c_log_c(count: int) -> float:
+    return count * math.log(count) if count > 1 else 0.0
+
+
+class OnlineMIEstimator:
+    """
+    Counts, entropy and MI trajectory; subclasses decide which cluster a response joins.
+    """
+
+    def __init__(self, tolerance: Optional[float] = None, patience: int = DEFAULT_PATIENCE,
+                 min_samples: int = DEFAULT_MIN_SAMPLES):
+        self.tolerance = tolerance
+        self.patience = patience
+        self.min_samples = min_samples
+        self.counts: List[int] = []
+        self.labels: List[int] = []
+        self.trajectory: List[float] = []  # MI after each response
+        self._sum_c_log_c = 0.0
+
+    def assign(self, response: str) -> int:
+        raise NotImplementedError
+
+    def add(self, response: str) -> float:
+        """
+        Cluster one response and return the updated MI estimate.
+        """
+        return self._record(self.assign(response))
+
+    def _record(self, label: int) -> float:
+        if label == len(self.counts):
+            self.counts.append(0)
+        count = self.counts[label]
+        self._sum_c_log_c += _c_log_c(count + 1) - _c_log_c(count)
+        self.counts[label] = count + 1
+        self.labels.append(label)
+        self.trajectory.append(self.mi)
+        return self.trajectory[-1]
+
+    def extend(self, responses: List[str]) -> float:
+        for response in responses:
+            self.add(response)
+        return self.mi
+
+    @property
+    def n(self) -> int:
+        return len(self.labels)
+
+    @property
+    def k(self) -> int:
+        return len(self.counts)
+
+    @property
+    def entropy(self) -> float:
+        if not self.n:
+            return 0.0
+        return max(0.0, math.log(self.n) - self._sum_c_log_c / self.n)
+
+    @property
+    def mi(self) -> float:
+        if not self.n:
+            return 0.0
+        return max(0.0, math.log(self.k) - self.entropy)
+
+    @property
+    def converged(self) -> bool:
+        if self.tolerance is None or self.n < max(self.min_samples, self.patience + 1):
+            return False
+        recent = self.trajectory[-(self.patience + 1):]
+        return max(recent) - min(recent) <= self.tolerance
+
+
+class OnlineFuzzyMI(OnlineMIEstimator):
+    """
+    Online counterpart of mutual_information_estimate_fuzzy (seed_order='input').
+    """
+
+    def __init__(self, similarity_threshold: float = 85, processor: Optional[Callable] = None,
+                 scorer=fuzz.ratio, **kwargs):
+        super().__init__(**kwargs)
+        self.similarity_threshold = similarity_threshold
+        self.processor = processor
+        self.scorer = scorer
+        self.seeds: List[str] = []
+        self._known: Dict[str, int] = {}  # identical texts always share a cluster
+
+    def assign(self, response: str) -> int:
+        key = self.processor(response) if self.processor else response
+        label = self._known.get(key)
+        if label is None:
+            if self.seeds:
+                scores = process.cdist([key], self.seeds, scorer=self.scorer,
+                                       score_cutoff=self.similarity_threshold, dtype=np.float64)[0]
+                matched = scores >= self.similarity_threshold
+                label = int(matched.argmax()) if matched.any() else len(self.seeds)
+            else:
+                label = 0
+            if label == len(self.seeds):
+                self.seeds.append(key)
+            self._known[key] = label
+        return label
+
+
+class OnlineSemanticMI(OnlineMIEstimator):
+    """
+    Online counterpart of mutual_information_estimate_semantic. With an EmbeddingStore,
+    a response seen before (in any run) is not encoded again. With model=None,
+    `model_name` is loaded on the first `assign`, i.e. on the engine's worker thread
+    rather than the event loop.
+    """
+
+    def __init__(self, model, similarity_threshold: float = 0.7, store=None, processor: Optional[Callable] = None,
+                 model_name: str = DEFAULT_EMBEDDING_MODEL, **kwargs):
+        super().__init__(**kwargs)
+        self.model = model
+        self.model_name = model_name
+        self.similarity_threshold = similarity_threshold
+        self.store = store
+        self.processor = processor
+        self.seeds = np.zeros((0, 0), dtype=np.float32)  # one normalized embedding per cluster
+
+    def assign(self, response: str) -> int:
+        if self.processor is not None:
+            response = self.processor(response)
+        if self.model is None:
+            self.model = get_embedding_model(self.model_name)
+        if self.store is not None:
+            embedding = self.store.encode([response], self.model)
+        else:
+            embedding = self.model.encode([response], convert_to_numpy=True)
+        return self._assign_embedding(embedding)
+
+    def add_embedding(self, embedding) -> float:
+        """
+        Like `add`, for a response already encoded elsewhere (see pipeline).
+        """
+        return self._record(self._assign_embedding(np.asarray(embedding).reshape(1, -1)))
+
+    def _assign_embedding(self, embedding) -> int:
+        embedding = normalize_embeddings(embedding)
+        if len(self.seeds):
+            matched = self.seeds @ embedding[0] >= self.similarity_threshold
+            if matched.any():
+                return int(matched.argmax())
+            self.seeds = np.vstack([self.seeds, embedding])
+        else:
+            self.seeds = embedding
+        return len(self.seeds) - 1
+
+
+class OnlineCascadeMI(OnlineMIEstimator):
+    """
+    Online counterpart of mutual_information_estimate_cascade; `cascade.stats()` counts
+    the pairs each stage settled. Its labels match OnlineSemanticMI's only as far as the
+    cascade's fuzzy cutoffs agree with the model (see similarity_cascade).
+    """
+
+    def __init__(self, cascade: SimilarityCascade, **kwargs):
+        super().__init__(**kwargs)
+        self.cascade = cascade
+
+    def assign(self, response: str) -> int:
+        return self.cascade.assign(response)
@@ -0,0 +1,261 @@
+import asyncio
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Callable, Dict, List, Optional, Tuple
+
+import numpy as np
+
+from experiment_engine import DEFAULT_CONCURRENCY, PromptBuilder, QueryFn, run_chains
+from online_mi import OnlineSemanticMI
+from run_journal import RunJournal
+
+"""
+Pipelined fetch -> embed -> cluster stages for semantic clustering.
+
+Without it, a chain's responses are encoded one `model.encode` call at a time, or all
+after the network loop, so the CPU idles during API waits and the API idles during
+encoding. Here the stages run concurrently and are connected by bounded queues:
+
+    fetch    - the experiment engine's chains; each response is submitted to the
+               pipeline and the chain moves straight on to its next call
+    embed    - collects texts from all in-flight chains into micro-batches (up to
+               `max_batch`, or whatever arrived within `max_wait` of the first) and
+               runs one encode per batch on a dedicated worker thread
+    cluster  - feeds each embedding to its chain's OnlineSemanticMI, in order
+
+When a queue is full, the stage feeding it waits (a chain's submit, or the embed
+stage's hand-off), so memory stays bounded by the queue sizes. End-to-end time tends
+to max(network, encoding) instead of their sum. If a stage dies (say the model cannot
+be loaded), the other one stops too, and every pending and later submit, and drain,
+raise its error, so the chains stop calling the API instead of blocking on a full queue.
+
+A chain's early-stopping check sees the responses clustered so far, which can lag the
+fetched ones by what is in the queues.
+"""
+
+DEFAULT_MAX_BATCH = 64
+DEFAULT_MAX_WAIT = 0.005
+DEFAULT_QUEUE_SIZE = 256
+
+# encode_fn(texts) -> (len(texts) x dim) embeddings; runs on the embed worker thread
+EncodeFn = Callable[[List[str]], np.ndarray]
+
+_DONE = object()
+
+
+class PipelinedEstimator:
+    """
+    A chain's view of the pipeline: the engine submits responses to it, and everything
+    else (labels, trajectory, mi, converged, ...) comes from the wrapped estimator.
+    """
+
+    def __init__(self, pipeline: 'EmbeddingPipeline', estimator: OnlineSemanticMI):
+        self.pipeline = pipeline
+        self.estimator = estimator
+
+    async def submit(self, response: str) -> None:
+        await self.pipeline.submit(self.estimator, response)
+
+    def __getattr__(self, name):
+        return getattr(self.estimator, name)
+
+
+class EmbeddingPipeline:
+    def __init__(self, encode_fn: EncodeFn, max_batch: int = DEFAULT_MAX_BATCH, max_wait: float = DEFAULT_MAX_WAIT,
+                 queue_size: int = DEFAULT_QUEUE_SIZE, processor: Optional[Callable[[str], str]] = None):
+        self.encode_fn = encode_fn
+        self.processor = processor  # e.g. an answer_extraction.AnswerExtractor, applied before queueing
+        self.max_batch = max_batch
+        self.max_wait = max_wait
+        self.queue_size = queue_size
+        self.batches = 0
+        self.texts = 0
+        self.encode_seconds = 0.0
+        self.max_depth = 0
+        self._texts: Optional[asyncio.Queue] = None
+        self._embedded: Optional[asyncio.Queue] = None
+        self._tasks: List[asyncio.Task] = []
+        self._encoder = ThreadPoolExecutor(max_workers=1, thread_name_prefix='embed')
+        self._error: Optional[BaseException] = None  # why a stage died; raised to every submit
+        self._failed: Optional[asyncio.Event] = None
+
+    # ---- Lifecycle ----
+    async def __aenter__(self) -> 'EmbeddingPipeline':
+        self._texts = asyncio.Queue(maxsize=self.queue_size)
+        self._embedded = asyncio.Queue(maxsize=self.queue_size)
+        self._failed = asyncio.Event()
+        self._tasks = [asyncio.create_task(self._embed_stage(), name='embed-stage'),
+                       asyncio.create_task(self._cluster_stage(), name='cluster-stage')]
+        return self
+
+    async def __aexit__(self, exc_type, exc, tb) -> None:
+        if exc_type is None:
+            await self.drain()
+            return
+        # The chains failed or were cancelled: nothing left is worth clustering
+        self._error = self._error or exc
+        for task in self._tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        self._tasks = []
+        self._encoder.shutdown(wait=False)
+
+    async def drain(self) -> None:
+        """
+        Finish clustering everything submitted so far and stop the stages. Raises the
+        error a stage died of, if any.
+        """
+        if self._tasks:
+            await self._put(self._texts, _DONE)
+            try:
+                await asyncio.gather(*self._tasks, return_exceptions=True)
+            finally:
+                self._tasks = []
+                self._encoder.shutdown(wait=False)
+        self._raise_if_failed()
+
+    def wrap(self, estimator: OnlineSemanticMI) -> PipelinedEstimator:
+        return PipelinedEstimator(self, estimator)
+
+    async def submit(self, estimator: OnlineSemanticMI, text: str) -> None:
+        """
+        Queue one response; waits only while the embed stage is `queue_size` behind.
+        Raises the error a stage died of, if any.
+        """
+        self._raise_if_failed()
+        if self.processor is not None:
+            text = self.processor(text)
+        await self._put(self._texts, (estimator, text))
+        self._raise_if_failed()
+        self.max_depth = max(self.max_depth, self._texts.qsize())
+
+    def _raise_if_failed(self) -> None:
+        if self._error is not None:
+            raise self._error
+
+    def _fail(self, error: BaseException) -> None:
+        if self._error is None:
+            self._error = error
+        self._failed.set()
+        # A dead stage takes the other one down with it, so neither waits on the queue between them
+        for task in self._tasks:
+            if task is not asyncio.current_task():
+                task.cancel()
+
+    async def _put(self, queue: asyncio.Queue, item) -> None:
+        """
+        queue.put that gives up once a stage has died (nobody would ever take the item).
+        """
+        if self._error is not None:
+            return
+        if not queue.full():
+            queue.put_nowait(item)
+            return
+        put = asyncio.ensure_future(queue.put(item))
+        failed = asyncio.ensure_future(self._failed.wait())
+        try:
+            await asyncio.wait((put, failed), return_when=asyncio.FIRST_COMPLETED)
+        finally:
+            for task in (put, failed):
+                task.cancel()
+
+    # ---- Stages ----
+    async def _embed_stage(self) -> None:
+        loop = asyncio.get_running_loop()
+        done = False
+        try:
+            while not done and self._error is None:
+                item = await self._texts.get()
+                if item is _DONE:
+                    break
+                batch = [item]
+                deadline = loop.time() + self.max_wait
+                while len(batch) < self.max_batch:
+                    timeout = deadline - loop.time()
+                    try:
+                        item = self._texts.get_nowait() if timeout <= 0 else await asyncio.wait_for(
+                            self._texts.get(), timeout)
+                    except (asyncio.QueueEmpty, asyncio.TimeoutError):
+                        break
+                    if item is _DONE:
+                        done = True
+                        break
+                    batch.append(item)
+
+                start = time.perf_counter()
+                embeddings = await loop.run_in_executor(self._encoder, self.encode_fn, [text for _, text in batch])
+                self.encode_seconds += time.perf_counter() - start
+                self.batches += 1
+                self.texts += len(batch)
+                for (estimator, _), embedding in zip(batch, embeddings):
+                    await self._put(self._embedded, (estimator, embedding))
+        except BaseException as error:
+            self._fail(error)
+            raise
+        finally:
+            if self._error is None:
+                await self._put(self._embedded, _DONE)
+            elif not self._embedded.full():
+                self._embedded.put_nowait(_DONE)
+
+    async def _cluster_stage(self) -> None:
+        try:
+            while True:
+                item = await self._embedded.get()
+                if item is _DONE:
+                    return
+                estimator, embedding = item
+                estimator.add_embedding(embedding)
+        except BaseException as error:
+            self._fail(error)
+            raise
+
+    def stats(self) -> dict:
+        return {'texts': self.texts, 'batches': self.batches,
+                'mean_batch': self.texts / self.batches if self.batches else 0.0,
+                'encode_seconds': self.encode_seconds, 'max_queue_depth': self.max_depth}
+
+
+def store_encode_fn(model_name: str, store=None) -> EncodeFn:
+    """
+    Encode through an EmbeddingStore when given (texts seen before are not re-encoded),
+    loading the model on the embed thread on first use.
+    """
+    from lazy_loading import get_embedding_model
+
+    def encode(texts: List[str]) -> np.ndarray:
+        model = get_embedding_model(model_name)
+        if store is not None:
+            return store.encode(texts, model)
+        return model.encode(texts, convert_to_numpy=True)
+    return encode
+
+
+# ---- Entry Point ----
+async def run_pipelined_chains(queries: List[str], build_prompt: PromptBuilder, query_fn: QueryFn,
+                               repeat_count: int, encode_fn: EncodeFn, similarity_threshold: float = 0.7,
+                               concurrency: int = DEFAULT_CONCURRENCY, verbose: bool = True,
+                               journal: Optional[RunJournal] = None,
+                               resume_from: Optional[Dict[str, List[str]]] = None,
+                               **pipeline_options) -> Tuple[List[List[str]], List[OnlineSemanticMI], dict]:
+    """
+    run_chains with the embed and cluster stages alongside. Returns the responses, one
+    clustered OnlineSemanticMI per query, and the pipeline's stats.
+    """
+    estimators: Dict[str, OnlineSemanticMI] = {}
+    async with EmbeddingPipeline(encode_fn, **pipeline_options) as pipeline:
+        def make_estimator(query: str, replicate: int) -> PipelinedEstimator:
+            estimators[query] = OnlineSemanticMI(None, similarity_threshold)
+            return pipeline.wrap(estimators[query])
+
+        responses = await run_chains(queries, build_prompt, query_fn, repeat_count, concurrency=concurrency,
+                                     verbose=verbose, journal=journal, resume_from=resume_from,
+                                     make_estimator=make_estimator)
+    return responses, [estimators[query] for query in queries], pipeline.stats()
+
+
+def run_pipelined_experiment(*args, **kwargs) -> Tuple[List[List[str]], List[OnlineSemanticMI], dict]:
+    """
+    Blocking entry point for the Experiment scripts.
+    """
+    return asyncio.run(run_pipelined_chains(*args, **kwargs))
@@ -0,0 +1,72 @@
+from typing import Callable, Dict, List, Optional
+
+"""
+Prompt strategies shared by the experiment specs.
+
+    cumulative  - every previous answer is listed (Experiment01)
+    last_answer - only the most recent answer is listed (Experiment02-06)
+
+Either strategy injects the query's distractors at iteration 1 when they are given.
+
+Two layouts are available:
+
+    question_last - the original Experiment layout: the question, the previous answers,
+                    then the question again
+    static_first  - the fixed instruction, then the question, then the answers, then
+                    "A:". Nothing variable precedes the static text, so consecutive
+                    prompts of a chain share the longest possible prefix and DeepSeek's
+                    context cache can serve it (hits count in whole 64-token units).
+                    With the cumulative strategy each prompt extends the previous one.
+"""
+
+PROMPT_LAYOUTS = ('question_last', 'static_first')
+
+STATIC_PREAMBLE = "Provide an answer to the question Q below. Other answers to Q may be listed after it.\n"
+
+
+# ---- Prompt Constructors ----
+def _assemble(query: str, answer_lines: List[str], distractor_lines: List[str], layout: str) -> str:
+    if layout == 'static_first':
+        # The one-off distractors go after the append-only answer history
+        return STATIC_PREAMBLE + f"Q: {query}\n" + ''.join(answer_lines + distractor_lines) + "A:"
+    return (f"Consider the following question:\nQ: {query}\n" + ''.join(distractor_lines + answer_lines)
+            + f"Provide an answer to the following question:\nQ: {query}\nA:")
+
+
+def _distractor_lines(query: str, distractors: Optional[dict], iteration: int) -> List[str]:
+    # Inject distractors only at iteration 1 (optional)
+    if distractors and iteration == 1 and query in distractors:
+        return [f"Another answer to question Q is: {distractor}\n" for distractor in distractors[query]]
+    return []
+
+
+def construct_prompt_cumulative(query: str, prev_answers: List[str], distractors: dict = None,
+                                iteration: int = 0, layout: str = 'question_last') -> str:
+    answer_lines = [f"Another answer to question Q is {ans}\n" for ans in prev_answers]
+    return _assemble(query, answer_lines, _distractor_lines(query, distractors, iteration), layout)
+
+
+def construct_prompt_last_answer(query: str, prev_answers: List[str], distractors: dict = None,
+                                 iteration: int = 0, layout: str = 'question_last') -> str:
+    answer_lines = [f"Another answer to question Q is: {prev_answers[-1]}\n"] if prev_answers else []
+    return _assemble(query, answer_lines, _distractor_lines(query, distractors, iteration), layout)
+
+
+PROMPT_STRATEGIES = {
+    'cumulative': construct_prompt_cumulative,
+    'last_answer': construct_prompt_last_answer,
+}
+
+
+def make_prompt_builder(strategy: str, distractors: Optional[Dict[str, List[str]]] = None,
+                        layout: str = 'question_last') -> Callable:
+    """
+    build_prompt(query, prev_answers, iteration) for the experiment engine.
+    """
+    if strategy not in PROMPT_STRATEGIES:
+        raise ValueError(f"Unknown prompt strategy {strategy!r}; expected one of {sorted(PROMPT_STRATEGIES)}")
+    if layout not in PROMPT_LAYOUTS:
+        raise ValueError(f"Unknown prompt layout {layout!r}; expected one of {PROMPT_LAYOUTS}")
+    construct = PROMPT_STRATEGIES[strategy]
+    return lambda query, prev_answers, i: construct(query, prev_answers, distractors=distractors, iteration=i,
+                                                    layout=layout)
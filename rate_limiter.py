@@ -0,0 +1,195 @@
+import asyncio
+import os
+import random
+import sqlite3
+import tempfile
+import threading
+import time
+from email.utils import parsedate_to_datetime
+from typing import Callable, Optional
+
+"""
+Shared token-bucket rate limiter with adaptive 429/5xx backoff.
+
+Two buckets are enforced together: requests-per-minute and tokens-per-minute. Bucket
+state lives in a small SQLite file (one row per limiter name), updated inside an
+IMMEDIATE transaction, so the same budget is shared by every thread, coroutine and
+process on the host that points at the same file. A 429/5xx response pushes a shared
+`blocked_until` timestamp forward (from Retry-After when the server sends one), so all
+workers back off together instead of each one hammering the API.
+"""
+
+DEFAULT_DB_PATH = os.environ.get(
+    'DEEPSEEK_RATE_LIMIT_DB', os.path.join(tempfile.gettempdir(), 'deepseek_rate_limit.sqlite'))
+DEFAULT_RPM = float(os.environ.get('DEEPSEEK_RPM', 60))
+DEFAULT_TPM = float(os.environ.get('DEEPSEEK_TPM', 200_000))
+
+RETRYABLE_STATUS = {429, 500, 502, 503, 504}
+# Rough completion size charged up front when the payload sets no max_tokens
+DEFAULT_COMPLETION_ESTIMATE = 256
+
+
+# ---- Token Estimate ----
+def estimate_tokens(payload: dict) -> int:
+    """
+    Cheap pre-send estimate (~4 characters per token) of prompt + completion tokens.
+    """
+    chars = sum(len(m.get('content') or '') for m in payload.get('messages', []))
+    return chars // 4 + 1 + payload.get('max_tokens', DEFAULT_COMPLETION_ESTIMATE) * payload.get('n', 1)
+
+
+# ---- Token Bucket ----
+class RateLimiter:
+    def __init__(self, requests_per_minute: float = DEFAULT_RPM, tokens_per_minute: float = DEFAULT_TPM,
+                 db_path: str = DEFAULT_DB_PATH, name: str = 'deepseek', burst_seconds: float = 10.0):
+        self.name = name
+        self.db_path = db_path
+        self.request_rate = requests_per_minute / 60.0
+        self.token_rate = tokens_per_minute / 60.0
+        self.request_capacity = max(1.0, self.request_rate * burst_seconds)
+        self.token_capacity = max(1.0, self.token_rate * burst_seconds)
+        self._local = threading.local()
+
+        with self._connect() as conn:
+            conn.execute("""CREATE TABLE IF NOT EXISTS buckets (
+                                name TEXT PRIMARY KEY, requests REAL, tokens REAL,
+                                updated REAL, blocked_until REAL)""")
+            conn.execute("INSERT OR IGNORE INTO buckets VALUES (?, ?, ?, ?, 0)",
+                         (name, self.request_capacity, self.token_capacity, time.time()))
+
+    def _connect(self) -> sqlite3.Connection:
+        conn = getattr(self._local, 'conn', None)
+        if conn is None:
+            conn = sqlite3.connect(self.db_path, timeout=30, isolation_level=None)
+            conn.execute("PRAGMA journal_mode=WAL")
+            self._local.conn = conn
+        return conn
+
+    def _transact(self, update: Callable[[float, float, float, float], tuple]):
+        # update(now, requests, tokens, blocked_until) -> (requests, tokens, blocked_until, result)
+        conn = self._connect()
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            requests_level, tokens_level, updated, blocked_until = conn.execute(
+                "SELECT requests, tokens, updated, blocked_until FROM buckets WHERE name = ?",
+                (self.name,)).fetchone()
+            now = time.time()
+            elapsed = max(0.0, now - updated)
+            requests_level = min(self.request_capacity, requests_level + elapsed * self.request_rate)
+            tokens_level = min(self.token_capacity, tokens_level + elapsed * self.token_rate)
+            requests_level, tokens_level, blocked_until, result = update(
+                now, requests_level, tokens_level, blocked_until)
+            conn.execute("UPDATE buckets SET requests = ?, tokens = ?, updated = ?, blocked_until = ? "
+                         "WHERE name = ?", (requests_level, tokens_level, now, blocked_until, self.name))
+            conn.execute("COMMIT")
+        except BaseException:
+            conn.execute("ROLLBACK")
+            raise
+        return result
+
+    def try_acquire(self, tokens: int = 1) -> float:
+        """
+        Take one request and `tokens` tokens if available. Returns 0 on success,
+        otherwise the number of seconds to wait before trying again.
+        """
+        # A request larger than the whole bucket is let through once the bucket is full
+        needed = min(tokens, self.token_capacity)
+
+        def update(now, requests_level, tokens_level, blocked_until):
+            if blocked_until > now:
+                return requests_level, tokens_level, blocked_until, blocked_until - now
+            if requests_level >= 1 and tokens_level >= needed:
+                return requests_level - 1, tokens_level - tokens, blocked_until, 0.0
+            wait = max((1 - requests_level) / self.request_rate,
+                       (needed - tokens_level) / self.token_rate, 0.01)
+            return requests_level, tokens_level, blocked_until, wait
+
+        return self._transact(update)
+
+    def acquire(self, tokens: int = 1) -> None:
+        while True:
+            wait = self.try_acquire(tokens)
+            if wait <= 0:
+                return
+            time.sleep(wait)
+
+    async def acquire_async(self, tokens: int = 1) -> None:
+        while True:
+            wait = self.try_acquire(tokens)
+            if wait <= 0:
+                return
+            await asyncio.sleep(wait)
+
+    def adjust_tokens(self, delta: int) -> None:
+        """
+        Correct the token bucket once the real usage is known (positive = charge more).
+        """
+        def update(now, requests_level, tokens_level, blocked_until):
+            return requests_level, tokens_level - delta, blocked_until, None
+
+        self._transact(update)
+
+    def block_for(self, seconds: float) -> None:
+        """
+        Pause every user of this bucket for `seconds` (never shortens an existing pause).
+        """
+        def update(now, requests_level, tokens_level, blocked_until):
+            return requests_level, tokens_level, max(blocked_until, now + seconds), None
+
+        self._transact(update)
+
+    def record_usage(self, estimated_tokens: int, usage: Optional[dict]) -> None:
+        if usage and 'total_tokens' in usage:
+            self.adjust_tokens(usage['total_tokens'] - estimated_tokens)
+
+
+# ---- Backoff ----
+def retry_after_seconds(headers) -> Optional[float]:
+    value = headers.get('Retry-After') if headers is not None else None
+    if not value:
+        return None
+    try:
+        return max(0.0, float(value))
+    except ValueError:
+        pass
+    try:
+        return max(0.0, parsedate_to_datetime(value).timestamp() - time.time())
+    except (TypeError, ValueError):
+        return None
+
+
+def backoff_delay(attempt: int, base: float = 1.0, cap: float = 60.0) -> float:
+    # Exponential backoff with full jitter
+    return random.uniform(0, min(cap, base * 2 ** attempt))
+
+
+def send_with_backoff(send: Callable, limiter: RateLimiter, estimated_tokens: int, max_retries: int = 5,
+                      retry_on: tuple = (), stats: Optional[dict] = None):
+    """
+    Call `send()` (returns a requests-style response) under the limiter, retrying on
+    429/5xx and on the exception types in `retry_on` (e.g. timeouts). The last response
+    is returned whatever its status; the last exception is re-raised. The number of
+    retries made is kept in stats['retries'].
+    """
+    for attempt in range(max_retries + 1):
+        if stats is not None:
+            stats['retries'] = attempt
+        limiter.acquire(estimated_tokens)
+        try:
+            response = send()
+        except retry_on as e:
+            if attempt == max_retries:
+                raise
+            delay = backoff_delay(attempt)
+            print(f"Request failed: {e!r}, retrying in {delay:.1f}s")
+            time.sleep(delay)
+            continue
+        if response.status_code not in RETRYABLE_STATUS or attempt == max_retries:
+            return response
+        # A streamed response holds its pooled connection until closed
+        response.close()
+        delay = retry_after_seconds(response.headers)
+        if delay is None:
+            delay = backoff_delay(attempt)
+        print(f"Throttled: {response.status_code}, retrying in {delay:.1f}s")
+        limiter.block_for(delay)
@@ -0,0 +1,48 @@
+import math
+from statistics import NormalDist
+from typing import List
+
+"""
+Aggregate MI estimates across replicate chains.
+
+Each replicate chain gives one MI estimate for its query; their mean, sample variance
+and a Student-t confidence interval for the mean say how far a single-chain number
+can be trusted. The t quantile is computed with the standard library (exact for 1
+and 2 degrees of freedom, Cornish-Fisher expansion beyond), so scipy is not needed.
+"""
+
+
+def t_critical(confidence: float, df: int) -> float:
+    """
+    Two-sided Student-t critical value, e.g. t_critical(0.95, 4) ~= 2.776.
+    """
+    p = 0.5 + confidence / 2
+    if df == 1:
+        return math.tan(math.pi * (p - 0.5))
+    if df == 2:
+        return (2 * p - 1) / math.sqrt(2 * p * (1 - p))
+    z = NormalDist().inv_cdf(p)
+    return (z
+            + (z ** 3 + z) / (4 * df)
+            + (5 * z ** 5 + 16 * z ** 3 + 3 * z) / (96 * df ** 2)
+            + (3 * z ** 7 + 19 * z ** 5 + 17 * z ** 3 - 15 * z) / (384 * df ** 3)
+            + (79 * z ** 9 + 776 * z ** 7 + 1482 * z ** 5 - 1920 * z ** 3 - 945 * z) / (92160 * df ** 4))
+
+
+def summarize_replicates(estimates: List[float], confidence: float = 0.95) -> dict:
+    """
+    Mean, sample variance and t confidence interval of per-replicate MI estimates.
+    With one replicate the variance and interval are undefined (NaN).
+    """
+    n = len(estimates)
+    if not n:
+        raise ValueError("no replicate estimates")
+    mean = sum(estimates) / n
+    if n == 1:
+        return {'replicates': 1, 'mean': mean, 'variance': math.nan, 'sem': math.nan,
+                'ci_low': math.nan, 'ci_high': math.nan, 'confidence': confidence}
+    variance = sum((x - mean) ** 2 for x in estimates) / (n - 1)
+    sem = math.sqrt(variance / n)
+    half_width = t_critical(confidence, n - 1) * sem
+    return {'replicates': n, 'mean': mean, 'variance': variance, 'sem': sem,
+            'ci_low': mean - half_width, 'ci_high': mean + half_width, 'confidence': confidence}
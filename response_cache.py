@@ -0,0 +1,128 @@
+import hashlib
+import json
+import os
+import sqlite3
+import threading
+import time
+from typing import Optional
+
+"""
+Persistent on-disk cache of chat completions.
+
+Keys are a SHA-256 of the full request payload (model, messages, temperature, ...) plus
+a sample-slot index, so repeated temperature-1.0 samples of the same prompt stay
+distinct but are reproducible across reruns. Entries are evicted least-recently-used
+once the stored bytes exceed `max_bytes`. Modes:
+
+    readwrite - serve hits, call the API and store on a miss (default)
+    replay    - read only; a miss raises CacheMiss instead of calling the API
+    off       - bypass the cache entirely
+"""
+
+DEFAULT_CACHE_PATH = os.environ.get('DEEPSEEK_CACHE_PATH', os.path.join(
+    os.path.dirname(os.path.abspath(__file__)), 'data', 'response_cache.sqlite'))
+DEFAULT_CACHE_MODE = os.environ.get('DEEPSEEK_CACHE_MODE', 'readwrite')
+DEFAULT_MAX_BYTES = int(os.environ.get('DEEPSEEK_CACHE_MAX_BYTES', 512 * 1024 * 1024))
+
+CACHE_MODES = ('readwrite', 'replay', 'off')
+
+
+class CacheMiss(KeyError):
+    pass
+
+
+def cache_key(payload: dict, sample_index=0) -> str:
+    blob = json.dumps({'payload': payload, 'sample': sample_index}, sort_keys=True, ensure_ascii=False)
+    return hashlib.sha256(blob.encode('utf-8')).hexdigest()
+
+
+class ResponseCache:
+    def __init__(self, path: str = DEFAULT_CACHE_PATH, mode: str = DEFAULT_CACHE_MODE,
+                 max_bytes: int = DEFAULT_MAX_BYTES):
+        if mode not in CACHE_MODES:
+            raise ValueError(f"mode must be one of {CACHE_MODES}, got {mode!r}")
+        self.path = path
+        self.mode = mode
+        self.max_bytes = max_bytes
+        self.hits = 0
+        self.misses = 0
+        self._stored_bytes = None
+        self._lock = threading.Lock()
+        self._local = threading.local()
+
+        if mode != 'off':
+            if os.path.dirname(path):
+                os.makedirs(os.path.dirname(path), exist_ok=True)
+            self._connect().execute("""CREATE TABLE IF NOT EXISTS responses (
+                                           key TEXT PRIMARY KEY, response TEXT,
+                                           size INTEGER, accessed REAL)""")
+
+    def _connect(self) -> sqlite3.Connection:
+        conn = getattr(self._local, 'conn', None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=30, isolation_level=None)
+            conn.execute("PRAGMA journal_mode=WAL")
+            self._local.conn = conn
+        return conn
+
+    def get(self, key: str) -> Optional[dict]:
+        row = self._connect().execute("SELECT response FROM responses WHERE key = ?", (key,)).fetchone()
+        with self._lock:
+            if row is None:
+                self.misses += 1
+                return None
+            self.hits += 1
+        if self.mode == 'readwrite':
+            self._connect().execute("UPDATE responses SET accessed = ? WHERE key = ?", (time.time(), key))
+        return json.loads(row[0])
+
+    def put(self, key: str, response: dict) -> None:
+        if self.mode != 'readwrite':
+            return
+        blob = json.dumps(response, ensure_ascii=False)
+        size = len(blob.encode('utf-8'))
+        conn = self._connect()
+        conn.execute("INSERT OR REPLACE INTO responses VALUES (?, ?, ?, ?)", (key, blob, size, time.time()))
+        with self._lock:
+            if self._stored_bytes is None:
+                self._stored_bytes = self._total_bytes(conn)
+            else:
+                self._stored_bytes += size
+            if self._stored_bytes > self.max_bytes:
+                self._evict(conn)
+
+    def _total_bytes(self, conn: sqlite3.Connection) -> int:
+        return conn.execute("SELECT COALESCE(SUM(size), 0) FROM responses").fetchone()[0]
+
+    def _evict(self, conn: sqlite3.Connection) -> None:
+        # Other processes may share the file, so re-read the real total first
+        total = self._total_bytes(conn)
+        doomed = []
+        for key, size in conn.execute("SELECT key, size FROM responses ORDER BY accessed"):
+            if total <= self.max_bytes:
+                break
+            doomed.append((key,))
+            total -= size
+        conn.executemany("DELETE FROM responses WHERE key = ?", doomed)
+        self._stored_bytes = total
+
+    def fetch(self, payload: dict, sample_index, call) -> dict:
+        """
+        Cached response for (payload, sample_index); `call()` produces it on a miss.
+        """
+        if self.mode == 'off':
+            return call()
+        key = cache_key(payload, sample_index)
+        cached = self.get(key)
+        if cached is not None:
+            return cached
+        if self.mode == 'replay':
+            raise CacheMiss(f"no cached response for sample {sample_index} of this payload (replay mode)")
+        response = call()
+        self.put(key, response)
+        return response
+
+    def stats(self) -> dict:
+        total = self.hits + self.misses
+        return {'hits': self.hits, 'misses': self.misses,
+                'hit_rate': self.hits / total if total else 0.0}
@@ -0,0 +1,157 @@
+import hashlib
+import os
+import time
+import uuid
+from typing import Dict, List, Optional
+from urllib.parse import quote
+
+import pyarrow as pa
+import pyarrow.dataset as ds
+import pyarrow.parquet as pq
+
+"""
+Columnar per-response results store.
+
+One row per (run, query, replicate, iteration): the prompt's hash, the response, the
+call's latency, tokens, retries and source, and the response's cluster label. Rows
+are Parquet files in a hive layout,
+
+    <root>/experiment=<name>/run_id=<id>/part-00000.parquet
+
+so the loader scans every run lazily and pushes filters on experiment and run_id down
+to directory pruning, and filters on the other columns down to Parquet row-group
+statistics:
+
+    load_results('results/store', experiment='experiment02', columns=['query', 'cluster'])
+    load_results('results/store', filter=ds.field('latency_s') > 5).to_pandas()
+
+Unlike the CSV's "|".join(responses), a response containing a pipe stays one response.
+"""
+
+DEFAULT_STORE_ROOT = os.path.join('results', 'store')
+DEFAULT_BATCH_SIZE = 4096
+
+ROW_SCHEMA = pa.schema([
+    ('query', pa.string()),
+    ('replicate', pa.int32()),
+    ('iteration', pa.int32()),
+    ('prompt_hash', pa.string()),
+    ('response', pa.string()),
+    ('cluster', pa.int32()),
+    ('mi', pa.float64()),  # the chain's running MI estimate after this response
+    ('latency_s', pa.float64()),
+    ('prompt_tokens', pa.int32()),
+    ('completion_tokens', pa.int32()),
+    ('retries', pa.int32()),
+    ('status', pa.string()),
+    ('source', pa.string()),  # 'api', 'response_cache' or 'multi_sample'; null when unknown
+    ('recorded_at', pa.float64()),
+])
+
+PARTITION_SCHEMA = pa.schema([('experiment', pa.string()), ('run_id', pa.string())])
+PARTITIONING = ds.partitioning(PARTITION_SCHEMA, flavor='hive')
+# Explicit, so files written before a column was added read it as null
+DATASET_SCHEMA = pa.unify_schemas([ROW_SCHEMA, PARTITION_SCHEMA])
+
+
+def prompt_hash(prompt: str) -> str:
+    return hashlib.sha256(prompt.encode('utf-8')).hexdigest()
+
+
+def new_run_id() -> str:
+    """
+    Sorts by start time, unique across processes.
+    """
+    return f"{time.strftime('%Y%m%dT%H%M%S')}-{uuid.uuid4().hex[:8]}"
+
+
+# ---- Writing ----
+class ResultsWriter:
+    """
+    Buffers rows and writes one Parquet file per `batch_size` rows, so a long run
+    never holds more than one batch and a crash loses at most the unflushed one.
+    """
+
+    def __init__(self, root: str, experiment: str, run_id: Optional[str] = None,
+                 batch_size: int = DEFAULT_BATCH_SIZE):
+        self.run_id = run_id or new_run_id()
+        self.directory = os.path.join(root, f"experiment={quote(experiment, safe='')}",
+                                      f"run_id={quote(self.run_id, safe='')}")
+        self.batch_size = batch_size
+        self.rows_written = 0
+        self._rows: List[dict] = []
+        self._parts = 0
+
+    def append(self, **row) -> None:
+        unknown = set(row) - set(ROW_SCHEMA.names)
+        if unknown:
+            raise ValueError(f"unknown results columns {sorted(unknown)}")
+        row.setdefault('recorded_at', time.time())
+        self._rows.append(row)
+        if len(self._rows) >= self.batch_size:
+            self.flush()
+
+    def extend(self, rows: List[dict]) -> None:
+        for row in rows:
+            self.append(**row)
+
+    def flush(self) -> None:
+        if not self._rows:
+            return
+        os.makedirs(self.directory, exist_ok=True)
+        table = pa.Table.from_pylist(self._rows, schema=ROW_SCHEMA)
+        path = os.path.join(self.directory, f'part-{self._parts:05d}.parquet')
+        # Dot-prefixed until complete: the dataset scan skips it, so readers never see half a file
+        tmp = os.path.join(self.directory, f'.part-{self._parts:05d}.parquet.tmp')
+        pq.write_table(table, tmp, compression='zstd')
+        os.replace(tmp, path)
+        self._parts += 1
+        self.rows_written += len(self._rows)
+        self._rows = []
+
+    def close(self) -> None:
+        self.flush()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+# ---- Reading ----
+def results_dataset(root: str = DEFAULT_STORE_ROOT) -> ds.Dataset:
+    """
+    Every run under `root` as one lazy dataset; nothing is read until it is scanned.
+    """
+    return ds.dataset(root, format='parquet', partitioning=PARTITIONING, schema=DATASET_SCHEMA)
+
+
+def load_results(root: str = DEFAULT_STORE_ROOT, filter: Optional[ds.Expression] = None,
+                 columns: Optional[List[str]] = None, **equals) -> pa.Table:
+    """
+    Rows matching `filter` and every column=value in `equals` (a list value matches any
+    of its items), restricted to `columns`. Call .to_pandas() on the result for a frame.
+    """
+    if not os.path.isdir(root):
+        empty = pa.Table.from_pylist([], schema=DATASET_SCHEMA)
+        return empty.select(columns) if columns else empty
+    for name, value in equals.items():
+        condition = ds.field(name).isin(value) if isinstance(value, (list, tuple, set)) else ds.field(name) == value
+        filter = condition if filter is None else filter & condition
+    return results_dataset(root).to_table(columns=columns, filter=filter)
+
+
+def run_index(root: str = DEFAULT_STORE_ROOT) -> Dict[str, List[str]]:
+    """
+    Run ids per experiment, from the directory layout alone.
+    """
+    runs: Dict[str, List[str]] = {}
+    if not os.path.isdir(root):
+        return runs
+    for fragment in results_dataset(root).get_fragments():
+        keys = ds.get_partition_keys(fragment.partition_expression)
+        runs.setdefault(keys['experiment'], [])
+        if keys['run_id'] not in runs[keys['experiment']]:
+            runs[keys['experiment']].append(keys['run_id'])
+    return {experiment: sorted(ids) for experiment, ids in sorted(runs.items())}
@@ -0,0 +1,316 @@
+import argparse
+import asyncio
+import csv
+import dataclasses
+import functools
+import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import nullcontext
+from typing import Dict, List, Optional, Tuple
+
+import numpy as np
+
+from answer_extraction import EXTRACTION_STRATEGIES, AnswerExtractor, make_extractor
+from budget_scheduler import BudgetScheduler, run_budgeted_chains
+from deepseek_client import MULTI_SAMPLE, RESPONSE_CACHE, TELEMETRY, USAGE, query_deepseek
+from embedding_store import EmbeddingStore
+from experiment_engine import replicate_chain_id, run_replicate_chains
+from experiment_spec import ExperimentSpec, load_spec
+from fuzzy_clustering import cluster_labels_fuzzy
+from lazy_loading import get_embedding_model, warm_embedding_model
+from mi_estimators import mi_lower_bound
+from online_mi import OnlineCascadeMI, OnlineFuzzyMI, OnlineMIEstimator, OnlineSemanticMI
+from pipeline import EmbeddingPipeline, store_encode_fn
+from prompts import make_prompt_builder
+from replicate_stats import summarize_replicates
+from run_journal import RunJournal, load_chains, load_journal
+from semantic_clustering import cluster_responses_semantically
+from similarity_cascade import CASCADE_STAGES, SimilarityCascade
+from streaming import StreamReport
+from telemetry import labelled
+from usage_report import UsageReport
+
+"""
+Run a grid of experiment specs in one process.
+
+All specs share one HTTP client pool, response cache, rate limiter, embedding model and
+embedding store, and their chains are scheduled together on one executor under one
+global concurrency bound. Total wall time is roughly that of the longest condition
+instead of the sum of six cold starts.
+
+    python run_grid.py specs/*.json
+    python run_grid.py specs/experiment05.json specs/experiment06.json --resume
+    python run_grid.py specs/experiment02.json --replicates 8
+    python run_grid.py specs/experiment03.json --budget 200
+"""
+
+# Enough to keep every chain of the six bundled specs in flight; the rate limiter is the real cap
+DEFAULT_GRID_CONCURRENCY = 32
+
+_embedding_stores: Dict[str, EmbeddingStore] = {}
+_stores_lock = threading.Lock()
+_extractors: Dict[str, Optional[AnswerExtractor]] = {}
+
+
+# ---- Scoring ----
+def _embedding_store(spec: ExperimentSpec) -> EmbeddingStore:
+    with _stores_lock:
+        if spec.embedding_model not in _embedding_stores:
+            _embedding_stores[spec.embedding_model] = EmbeddingStore(spec.embedding_model)
+        return _embedding_stores[spec.embedding_model]
+
+
+def _answer_extractor(spec: ExperimentSpec) -> Optional[AnswerExtractor]:
+    # One per spec, so its cache and character counts cover the whole run
+    with _stores_lock:
+        if spec.name not in _extractors:
+            _extractors[spec.name] = make_extractor(spec.answer_extraction)
+        return _extractors[spec.name]
+
+
+def make_cascade(spec: ExperimentSpec) -> SimilarityCascade:
+    # The model is only loaded if some pair needs the embedding stage
+    return SimilarityCascade(similarity_threshold=spec.similarity_threshold, match_cutoff=spec.cascade_match_cutoff,
+                             reject_cutoff=spec.cascade_reject_cutoff, store=_embedding_store(spec),
+                             model_name=spec.embedding_model, processor=_answer_extractor(spec))
+
+
+def cluster_labels(spec: ExperimentSpec, responses: List[str]) -> np.ndarray:
+    if spec.clustering == 'semantic':
+        return cluster_responses_semantically(responses, get_embedding_model(spec.embedding_model),
+                                              threshold=spec.similarity_threshold, store=_embedding_store(spec),
+                                              processor=_answer_extractor(spec))
+    if spec.clustering == 'cascade':
+        return make_cascade(spec).labels(responses)
+    return cluster_labels_fuzzy(responses, similarity_threshold=spec.similarity_threshold,
+                                processor=_answer_extractor(spec))
+
+
+def make_estimator(spec: ExperimentSpec) -> OnlineMIEstimator:
+    """
+    An online estimator that clusters like `cluster_labels` and stops per the spec.
+    """
+    stopping = dict(tolerance=spec.early_stop_tolerance, patience=spec.early_stop_patience,
+                    min_samples=spec.min_iterations)
+    if spec.clustering == 'semantic':
+        # The model is resolved on the worker thread at the first response, never on the event loop
+        return OnlineSemanticMI(None, spec.similarity_threshold, store=_embedding_store(spec),
+                                processor=_answer_extractor(spec), model_name=spec.embedding_model, **stopping)
+    if spec.clustering == 'cascade':
+        return OnlineCascadeMI(make_cascade(spec), **stopping)
+    return OnlineFuzzyMI(spec.similarity_threshold, processor=_answer_extractor(spec), **stopping)
+
+
+def score_responses(spec: ExperimentSpec, responses: List[str]) -> float:
+    return mi_lower_bound(cluster_labels(spec, responses))
+
+
+def store_results(spec: ExperimentSpec, all_chains: List[List[List[str]]], all_labels: List[List[np.ndarray]],
+                  run_id: Optional[str] = None,
+                  trajectories: Optional[Dict[Tuple[str, int], List[float]]] = None) -> str:
+    """
+    One results-store row per response, with its prompt and call metadata from the
+    journal (the last entry for an iteration wins, as on resume) and the chain's
+    running MI from `trajectories[(query, replicate)]`. Returns the run id.
+    """
+    # pyarrow and pandas only load for specs that keep a results store
+    from results_store import ResultsWriter, prompt_hash
+
+    trajectories = trajectories or {}
+    entries = {(entry['chain'], entry['iteration']): entry for entry in load_journal(spec.journal_file)}
+    with ResultsWriter(spec.results_store, spec.name, run_id=run_id) as writer:
+        for query, chains, labels in zip(spec.queries, all_chains, all_labels):
+            for replicate, (chain, chain_labels) in enumerate(zip(chains, labels)):
+                chain_id = replicate_chain_id(query, replicate)
+                trajectory = trajectories.get((query, replicate), [])
+                for iteration, (response, label) in enumerate(zip(chain, chain_labels)):
+                    entry = entries.get((chain_id, iteration), {})
+                    call = entry.get('call') or {}
+                    writer.append(query=query, replicate=replicate, iteration=iteration,
+                                  prompt_hash=prompt_hash(entry['prompt']) if 'prompt' in entry else None,
+                                  response=response, cluster=int(label),
+                                  mi=trajectory[iteration] if iteration < len(trajectory) else None,
+                                  latency_s=call.get('latency_s'),
+                                  prompt_tokens=call.get('prompt_tokens'),
+                                  completion_tokens=call.get('completion_tokens'), retries=call.get('retries'),
+                                  status=call.get('status'), source=call.get('source'))
+    return writer.run_id
+
+
+def write_results(spec: ExperimentSpec, all_chains: List[List[List[str]]],
+                  estimators: Optional[Dict[Tuple[str, int], OnlineMIEstimator]] = None) -> None:
+    """
+    One CSV row per query. With replicates, MutualInformation is the mean over the
+    replicate chains and the spread follows in extra columns; Y1/Y2/AllResponses
+    come from replicate 0. Every response also goes to the results store.
+
+    Chains whose online estimator saw every response reuse its labels (they equal the
+    batch ones) instead of being clustered again.
+    """
+    estimators = estimators or {}
+
+    def chain_labels(query: str, replicate: int, chain: List[str]) -> np.ndarray:
+        estimator = estimators.get((query, replicate))
+        if estimator is not None and estimator.n == len(chain):
+            return np.asarray(estimator.labels, dtype=np.int32)
+        return cluster_labels(spec, chain)
+
+    all_labels = [[chain_labels(query, replicate, chain) for replicate, chain in enumerate(chains)]
+                  for query, chains in zip(spec.queries, all_chains)]
+    if os.path.dirname(spec.output_file):
+        os.makedirs(os.path.dirname(spec.output_file), exist_ok=True)
+    with open(spec.output_file, mode='w', newline='', encoding='utf-8') as csvfile:
+        writer = csv.writer(csvfile)
+        header = ["Query", "Y1", "Y2", "MutualInformation", "AllResponses"]
+        if spec.replicates > 1:
+            header += ["MI_Variance", f"MI_CI{spec.confidence:.0%}_Low", f"MI_CI{spec.confidence:.0%}_High",
+                       "MI_Replicates"]
+        writer.writerow(header)
+
+        for query, chains, labels in zip(spec.queries, all_chains, all_labels):
+            responses = chains[0]
+            mis = [mi_lower_bound(chain_labels) for chain_labels in labels]
+            stats = summarize_replicates(mis, spec.confidence)
+            row = [query, responses[0], responses[1] if len(responses) > 1 else "", f"{stats['mean']:.4f}", "|".join(responses)]
+            if spec.replicates > 1:
+                row += [f"{stats['variance']:.6f}", f"{stats['ci_low']:.4f}", f"{stats['ci_high']:.4f}",
+                        "|".join(f"{mi:.4f}" for mi in mis)]
+                print(f"[{spec.name}] → MI = {stats['mean']:.4f} ± {stats['ci_high'] - stats['mean']:.4f} "
+                      f"({len(mis)} replicates) for query: {query}")
+            else:
+                print(f"[{spec.name}] → MI = {stats['mean']:.4f} for query: {query}")
+            writer.writerow(row)
+
+    if spec.results_store:
+        run_id = store_results(spec, all_chains, all_labels,
+                               trajectories={key: e.trajectory for key, e in estimators.items()})
+        print(f"[{spec.name}] responses stored as run {run_id} under {spec.results_store}")
+
+
+# ---- Grid ----
+async def run_spec(spec: ExperimentSpec, executor: ThreadPoolExecutor, semaphore: asyncio.Semaphore,
+                   resume: bool = False, verbose: bool = False) -> List[List[List[str]]]:
+    distractors = spec.distractors if spec.inject_distractors else None
+    report = StreamReport(spec.name)
+    usage = UsageReport(spec.name)
+    query_fn = functools.partial(query_deepseek, max_tokens=spec.max_tokens, stop=spec.stream_stop,
+                                 report=report, usage=usage, multi_sample=spec.multi_sample)
+    resume_from = load_chains(spec.journal_file) if resume else None
+    estimators: Dict[Tuple[str, int], OnlineMIEstimator] = {}
+    # Semantic chains are embedded in micro-batches alongside the fetching; the budget
+    # scheduler ranks queries on up-to-date counts, so it keeps clustering inline
+    pipeline = None
+    if spec.clustering == 'semantic' and spec.call_budget is None:
+        pipeline = EmbeddingPipeline(store_encode_fn(spec.embedding_model, _embedding_store(spec)),
+                                     processor=_answer_extractor(spec))
+
+    def chain_estimator(query: str, replicate: int) -> OnlineMIEstimator:
+        if pipeline is None:
+            estimators[(query, replicate)] = estimator = make_estimator(spec)
+            return estimator
+        # Pipelined chains only receive embeddings (add_embedding); the encode worker loads the model
+        estimators[(query, replicate)] = estimator = OnlineSemanticMI(
+            None, spec.similarity_threshold, tolerance=spec.early_stop_tolerance,
+            patience=spec.early_stop_patience, min_samples=spec.min_iterations)
+        return pipeline.wrap(estimator)
+
+    build_prompt = make_prompt_builder(spec.prompt_strategy, distractors, spec.prompt_layout)
+    scheduler = None
+    with RunJournal(spec.journal_file, append=resume) as journal, labelled(experiment=spec.name):
+        async with pipeline or nullcontext():
+            if spec.call_budget is not None:
+                scheduler = BudgetScheduler(spec.queries, spec.call_budget, rule=spec.budget_rule,
+                                            min_samples=spec.min_iterations, confidence=spec.confidence,
+                                            checkpoint=os.path.splitext(spec.journal_file)[0] + '.budget.json')
+                if not resume and os.path.exists(scheduler.checkpoint_path):
+                    os.remove(scheduler.checkpoint_path)
+                all_chains = await run_budgeted_chains(spec.queries, build_prompt, query_fn, scheduler,
+                                                       chain_estimator, verbose=verbose, journal=journal,
+                                                       resume_from=resume_from, executor=executor,
+                                                       semaphore=semaphore)
+            else:
+                all_chains = await run_replicate_chains(
+                    spec.queries,
+                    build_prompt,
+                    query_fn,
+                    repeat_count=spec.repeat_count,
+                    replicates=spec.replicates,
+                    verbose=verbose,
+                    journal=journal,
+                    resume_from=resume_from,
+                    executor=executor,
+                    semaphore=semaphore,
+                    make_estimator=chain_estimator,
+                )
+    # Clustering is CPU-bound; keep it off the event loop so other specs keep fetching
+    await asyncio.get_running_loop().run_in_executor(None, write_results, spec, all_chains, estimators)
+    if scheduler is not None:
+        print(f"[{spec.name}] {scheduler.format()}")
+    elif spec.early_stop_tolerance is not None:
+        ran = sum(len(chain) for chains in all_chains for chain in chains)
+        planned = spec.repeat_count * spec.replicates * len(spec.queries)
+        print(f"[{spec.name}] early stopping ran {ran} of {planned} iterations ({planned - ran} calls saved)")
+    if pipeline is not None:
+        print(f"[{spec.name}] embedding pipeline: {pipeline.stats()}")
+    if spec.clustering == 'cascade':
+        resolved = {stage: sum(e.cascade.resolved[stage] for e in estimators.values()) for stage in CASCADE_STAGES}
+        encoded = sum(e.cascade.encoded for e in estimators.values())
+        print(f"[{spec.name}] similarity cascade: pairs resolved {resolved}, {encoded} texts embedded")
+    if _answer_extractor(spec) is not None:
+        print(f"[{spec.name}] {_answer_extractor(spec).format()}")
+    if spec.stream_stop:
+        print(report.format())
+    print(usage.format())
+    return all_chains
+
+
+async def run_grid(specs: List[ExperimentSpec], concurrency: int = DEFAULT_GRID_CONCURRENCY,
+                   resume: bool = False, verbose: bool = False) -> List[List[List[List[str]]]]:
+    # Cascade specs load the model only if they need it
+    for model_name in {spec.embedding_model for spec in specs if spec.clustering == 'semantic'}:
+        warm_embedding_model(model_name)
+
+    semaphore = asyncio.Semaphore(concurrency)
+    with ThreadPoolExecutor(max_workers=concurrency) as executor:
+        return await asyncio.gather(*(run_spec(spec, executor, semaphore, resume=resume, verbose=verbose)
+                                      for spec in specs))
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Run a grid of experiment specs in one process")
+    parser.add_argument('specs', nargs='+', help="Spec files (.json, .toml, .yaml)")
+    parser.add_argument('--concurrency', type=int, default=DEFAULT_GRID_CONCURRENCY,
+                        help="Query chains in flight at once, across all specs")
+    parser.add_argument('--resume', action='store_true', help="Continue each spec from its journal")
+    parser.add_argument('--verbose', action='store_true', help="Print every prompt and response")
+    parser.add_argument('--replicates', type=int, help="Override each spec's replicate chains per query")
+    parser.add_argument('--budget', type=int, help="Allocate this many calls per spec adaptively across its queries")
+    parser.add_argument('--answer-extraction', choices=EXTRACTION_STRATEGIES,
+                        help="Override each spec's answer extraction before clustering")
+    args = parser.parse_args()
+
+    specs = [load_spec(path) for path in args.specs]
+    if args.replicates:
+        specs = [dataclasses.replace(spec, replicates=args.replicates) for spec in specs]
+    if args.budget:
+        specs = [dataclasses.replace(spec, call_budget=args.budget) for spec in specs]
+    if args.answer_extraction:
+        specs = [dataclasses.replace(spec, answer_extraction=args.answer_extraction) for spec in specs]
+    names = [spec.name for spec in specs]
+    if len(set(names)) != len(names):
+        parser.error(f"spec names must be unique, got {names}")
+
+    start = time.perf_counter()
+    asyncio.run(run_grid(specs, concurrency=args.concurrency, resume=args.resume, verbose=args.verbose))
+    print(f"Ran {len(specs)} specs in {time.perf_counter() - start:.1f}s")
+    print(f"Response cache: {RESPONSE_CACHE.stats()}")
+    print(USAGE.format())
+    if any(spec.multi_sample for spec in specs):
+        print(f"Multi-sample: {MULTI_SAMPLE.stats()}")
+    print(f"Metrics: {TELEMETRY.export()}")
+
+
+if __name__ == '__main__':
+    main()
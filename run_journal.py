@@ -0,0 +1,111 @@
+import json
+import os
+import threading
+import time
+from typing import Dict, List
+
+"""
+Append-only JSONL journal for crash-safe experiment runs.
+
+Every response is written to the journal as soon as it arrives, one JSON object per
+line, so a crash, Ctrl-C or network drop no longer throws away paid calls. Lines are
+handed to the OS immediately (they survive the process dying); fsync is batched every
+`fsync_every` records or `fsync_interval` seconds, so the extra durability against
+power loss costs almost nothing per call. `load_chains` rebuilds the in-progress chains
+for `--resume`; a torn last line from a crash is cut off before appending, and a failed
+call's "ERROR" placeholder is asked again rather than replayed.
+"""
+
+FAILED_RESPONSE = 'ERROR'  # what query_deepseek returns for a call that failed
+
+
+class RunJournal:
+    def __init__(self, path: str, append: bool = False, fsync_every: int = 32, fsync_interval: float = 2.0):
+        if os.path.dirname(path):
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+        self.path = path
+        self.fsync_every = fsync_every
+        self.fsync_interval = fsync_interval
+        if append:
+            _truncate_torn_line(path)
+        self._file = open(path, 'a' if append else 'w', encoding='utf-8')
+        self._unsynced = 0
+        self._last_sync = time.monotonic()
+        self._lock = threading.Lock()
+
+    def record(self, **entry) -> None:
+        line = json.dumps(entry, ensure_ascii=False) + '\n'
+        with self._lock:
+            self._file.write(line)
+            self._file.flush()
+            self._unsynced += 1
+            if (self._unsynced >= self.fsync_every
+                    or time.monotonic() - self._last_sync >= self.fsync_interval):
+                self._sync()
+
+    def _sync(self) -> None:
+        os.fsync(self._file.fileno())
+        self._unsynced = 0
+        self._last_sync = time.monotonic()
+
+    def close(self) -> None:
+        with self._lock:
+            if not self._file.closed:
+                self._file.flush()
+                self._sync()
+                self._file.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+# ---- Resume ----
+def _truncate_torn_line(path: str) -> None:
+    """
+    Cut a partial last line (a crash mid-write), so appended records start on a line of their own.
+    """
+    if not os.path.exists(path):
+        return
+    with open(path, 'rb+') as file:
+        data = file.read()  # read in full by load_chains for the same resume anyway
+        if data and not data.endswith(b'\n'):
+            file.truncate(data.rfind(b'\n') + 1)
+
+
+def load_journal(path: str) -> List[dict]:
+    entries = []
+    if not os.path.exists(path):
+        return entries
+    with open(path, encoding='utf-8') as file:
+        for line in file:
+            try:
+                entries.append(json.loads(line))
+            except json.JSONDecodeError:
+                # A line torn by a crash mid-write; the records around it are intact
+                continue
+    return entries
+
+
+def load_chains(path: str) -> Dict[str, List[str]]:
+    """
+    Responses per chain, in iteration order, up to the first missing iteration or
+    FAILED_RESPONSE. A chain resumed at iteration i replaces what it had recorded from i on.
+    """
+    by_chain: Dict[str, Dict[int, str]] = {}
+    for entry in load_journal(path):
+        iterations = by_chain.setdefault(entry['chain'], {})
+        if iterations and entry['iteration'] < next(reversed(iterations)):
+            for later in [i for i in iterations if i > entry['iteration']]:
+                del iterations[later]
+        iterations[entry['iteration']] = entry['response']
+
+    chains = {}
+    for chain, iterations in by_chain.items():
+        responses = []
+        while iterations.get(len(responses), FAILED_RESPONSE) != FAILED_RESPONSE:
+            responses.append(iterations[len(responses)])
+        chains[chain] = responses
+    return chains
@@ -0,0 +1,86 @@
+from typing import Callable, List, Optional
+
+import numpy as np
+
+from mi_estimators import mi_lower_bound
+
+"""
+Vectorized semantic clustering for the MI estimate.
+
+`cluster_responses_semantically` used to call `util.pytorch_cos_sim` once per (i, j)
+pair, i.e. one tiny tensor op and one device sync per pair. Here the embeddings are
+L2-normalized once and cosine similarities come from one matrix product, or from row
+blocks of it when the full n x n matrix would not fit in `max_block_bytes`. The greedy
+threshold assignment is unchanged (each unassigned response seeds a cluster and absorbs
+every later unassigned response with similarity >= threshold), but it runs over NumPy
+arrays and returns compact integer labels instead of lists of strings.
+"""
+
+DEFAULT_MAX_BLOCK_BYTES = 256 * 1024 * 1024
+
+
+def normalize_embeddings(embeddings) -> np.ndarray:
+    embeddings = np.asarray(embeddings, dtype=np.float32)
+    norms = np.linalg.norm(embeddings, axis=1, keepdims=True)
+    return embeddings / np.maximum(norms, 1e-12)
+
+
+def greedy_threshold_labels(embeddings, threshold: float,
+                            max_block_bytes: int = DEFAULT_MAX_BLOCK_BYTES) -> np.ndarray:
+    """
+    Cluster label (0, 1, ...) per row of `embeddings`, in order of first appearance.
+    """
+    emb = normalize_embeddings(embeddings)
+    n = len(emb)
+    labels = np.full(n, -1, dtype=np.int32)
+    # Similarity rows are computed for a block of candidate seeds at a time. Most
+    # candidates usually get absorbed by an earlier seed, so the block starts small and
+    # only grows (up to the memory bound) while most of it turns out to be new seeds.
+    max_rows = max(1, min(n, max_block_bytes // max(1, n * 4)))
+    block_rows = min(64, max_rows)
+    next_label = 0
+
+    candidates = np.arange(n)
+    while candidates.size:
+        block = candidates[:block_rows]
+        sims = emb[block] @ emb.T
+        seeds = 0
+        for row, seed in zip(sims, block):
+            if labels[seed] != -1:
+                continue
+            # Every unassigned response before `seed` would have seeded its own cluster,
+            # so "unassigned" already means "after seed"
+            members = (labels == -1) & (row >= threshold)
+            members[seed] = True
+            labels[members] = next_label
+            next_label += 1
+            seeds += 1
+        if seeds * 2 > len(block):
+            block_rows = min(block_rows * 2, max_rows)
+        candidates = np.flatnonzero(labels == -1)
+    return labels
+
+
+def cluster_responses_semantically(responses: List[str], model, threshold=0.7, store=None,
+                                   processor: Optional[Callable] = None) -> np.ndarray:
+    """
+    Cluster responses based on semantic similarity using Sentence Transformers.
+    With an EmbeddingStore, only texts it has never seen are encoded; `processor` (e.g.
+    an answer_extraction.AnswerExtractor) maps each response to the text that is.
+    """
+    if not responses:
+        return np.zeros(0, dtype=np.int32)
+    if processor is not None:
+        responses = [processor(response) for response in responses]
+    if store is not None:
+        embeddings = store.encode(responses, model)
+    else:
+        embeddings = model.encode(responses, convert_to_numpy=True)
+    return greedy_threshold_labels(embeddings, threshold)
+
+
+def mutual_information_estimate_semantic(responses: List[str], model, similarity_threshold=0.7,
+                                         store=None, processor: Optional[Callable] = None) -> float:
+    labels = cluster_responses_semantically(responses, model, threshold=similarity_threshold, store=store,
+                                            processor=processor)
+    return mi_lower_bound(labels)
@@ -0,0 +1,188 @@
+import re
+import unicodedata
+from typing import Callable, Dict, List, Optional
+
+import numpy as np
+from rapidfuzz import fuzz, process
+
+from embedding_store import normalize_text
+from lazy_loading import DEFAULT_EMBEDDING_MODEL, get_embedding_model
+from mi_estimators import mi_lower_bound
+from semantic_clustering import normalize_embeddings
+
+"""
+Cascaded similarity for the MI estimate: exact -> fuzzy -> embedding.
+
+The semantic path encodes every response and compares it with every cluster seed,
+although most responses repeat an earlier one verbatim. Here each (response, seed)
+pair is settled by the first stage that is sure about it:
+
+    exact      - equal text after embedding_store.normalize_text, which is what an
+                 EmbeddingStore encodes, so equal embeddings: a match in the semantic
+                 path too (without a store, up to whitespace and Unicode forms)
+    fuzzy      - fuzz.ratio of those texts >= `match_cutoff` is a match, and
+                 fuzz.token_set_ratio <= `reject_cutoff` is not
+    embedding  - cosine similarity >= `similarity_threshold`, as in the semantic path;
+                 for every other pair
+
+Assignment is otherwise the semantic path's: a response joins the first seed (in
+creation order) it matches, or seeds a new cluster. The exact stage never changes a
+label. The fuzzy cutoffs are a heuristic: a near-identical string or one with no words
+in common usually lands on the same side of the threshold, but the model may disagree,
+so for labels equal to cluster_responses_semantically set match_cutoff=100 and
+reject_cutoff=None. canonical_text (no "A:" label, casefolded, no punctuation) is
+an opt-in `canonicalize` that settles more pairs without the model and can merge
+answers the model keeps apart. Only texts that take part in an unsettled pair are
+ever encoded, and the model is not even loaded when there are none. `resolved`
+counts the pairs each stage settled.
+"""
+
+CASCADE_STAGES = ('exact', 'fuzzy', 'embedding')
+DEFAULT_MATCH_CUTOFF = 95
+DEFAULT_REJECT_CUTOFF = 40
+
+MATCH, NO_MATCH, UNSURE = 1, 0, -1
+
+_ANSWER_LABEL = re.compile(r'^\s*(?:a|answer)\s*:\s*', re.IGNORECASE)
+_PUNCTUATION = re.compile(r'[^\w\s]')
+
+
+def canonical_text(text: str) -> str:
+    """
+    "A: London." -> "london"; looser than what the model sees (see the module docstring).
+    """
+    text = _ANSWER_LABEL.sub('', unicodedata.normalize('NFKC', text))
+    return ' '.join(_PUNCTUATION.sub(' ', text).casefold().split())
+
+
+class SimilarityCascade:
+    """
+    Greedy first-seed clustering of one chain, one response at a time (`assign`) or in
+    bulk (`labels`, which batch-encodes every text the embedding stage may need up front).
+    """
+
+    def __init__(self, model=None, similarity_threshold: float = 0.7, match_cutoff: float = DEFAULT_MATCH_CUTOFF,
+                 reject_cutoff: Optional[float] = DEFAULT_REJECT_CUTOFF, store=None,
+                 canonicalize: Callable[[str], str] = normalize_text, scorer=fuzz.ratio,
+                 reject_scorer=fuzz.token_set_ratio, model_name: str = DEFAULT_EMBEDDING_MODEL,
+                 processor: Optional[Callable[[str], str]] = None):
+        self.model = model  # None loads `model_name` on the first uncertain pair
+        self.model_name = model_name
+        self.similarity_threshold = similarity_threshold
+        self.match_cutoff = match_cutoff
+        self.reject_cutoff = reject_cutoff
+        self.store = store
+        self.canonicalize = canonicalize
+        self.scorer = scorer
+        self.reject_scorer = reject_scorer
+        self.processor = processor  # applied first, e.g. an answer_extraction.AnswerExtractor
+        self.seeds: List[str] = []
+        self.resolved: Dict[str, int] = dict.fromkeys(CASCADE_STAGES, 0)
+        self.encoded = 0
+        self._seed_keys: List[str] = []
+        self._first_seed: Dict[str, int] = {}  # canonical text -> first seed with it
+        self._known: Dict[str, int] = {}  # identical texts always share a cluster
+        self._embeddings: Dict[str, np.ndarray] = {}
+
+    # ---- Stages ----
+    def _decisions(self, key: str, limit: int) -> np.ndarray:
+        decisions = np.full(limit, UNSURE, dtype=np.int8)
+        if limit:
+            seeds = self._seed_keys[:limit]
+            if self.reject_cutoff is not None:
+                scores = process.cdist([key], seeds, scorer=self.reject_scorer, dtype=np.float64)[0]
+                decisions[scores <= self.reject_cutoff] = NO_MATCH
+            scores = process.cdist([key], seeds, scorer=self.scorer, dtype=np.float64)[0]
+            decisions[scores >= self.match_cutoff] = MATCH
+        return decisions
+
+    def _embedding(self, text: str) -> np.ndarray:
+        if text not in self._embeddings:
+            self.prefetch([text])
+        return self._embeddings[text]
+
+    def prefetch(self, texts: List[str]) -> None:
+        """
+        Encode (in one batch) those of `texts` the embedding stage has not seen yet.
+        """
+        missing = list(dict.fromkeys(text for text in texts if text not in self._embeddings))
+        if not missing:
+            return
+        if self.model is None:
+            self.model = get_embedding_model(self.model_name)
+        if self.store is not None:
+            embeddings = self.store.encode(missing, self.model)
+        else:
+            embeddings = self.model.encode(missing, convert_to_numpy=True)
+        self._embeddings.update(zip(missing, normalize_embeddings(embeddings)))
+        self.encoded += len(missing)
+
+    # ---- Assignment ----
+    def assign(self, response: str) -> int:
+        if self.processor is not None:
+            response = self.processor(response)
+        label = self._known.get(response)
+        if label is not None:
+            self.resolved['exact'] += 1
+            return label
+        key = self.canonicalize(response)
+        exact = self._first_seed.get(key)
+        # Seeds before an exact match could still match first; the ones after never get asked
+        decisions = self._decisions(key, len(self.seeds) if exact is None else exact)
+        label = None
+        for seed in np.flatnonzero(decisions != NO_MATCH):
+            if decisions[seed] == UNSURE:
+                self.resolved['embedding'] += 1
+                if self._embedding(response) @ self._embedding(self.seeds[seed]) < self.similarity_threshold:
+                    continue
+            label = int(seed)
+            decisions = decisions[:seed + 1]
+            break
+        self.resolved['fuzzy'] += int((decisions != UNSURE).sum())
+        if label is None and exact is not None:
+            self.resolved['exact'] += 1
+            label = exact
+        if label is None:
+            label = len(self.seeds)
+            self.seeds.append(response)
+            self._seed_keys.append(key)
+            self._first_seed.setdefault(key, label)
+        self._known[response] = label
+        return label
+
+    def ambiguous_texts(self, responses: List[str]) -> List[str]:
+        """
+        The texts of `responses` that fall in the fuzzy stage's uncertain band with at
+        least one other (a superset of what `assign` will encode).
+        """
+        texts = list(dict.fromkeys(responses))
+        if self.processor is not None:
+            texts = list(dict.fromkeys(self.processor(text) for text in texts))
+        keys = [self.canonicalize(text) for text in texts]
+        if len(texts) < 2:
+            return []
+        unsure = process.cdist(keys, keys, scorer=self.scorer, dtype=np.float64, workers=-1) < self.match_cutoff
+        if self.reject_cutoff is not None:
+            unsure &= process.cdist(keys, keys, scorer=self.reject_scorer, dtype=np.float64,
+                                    workers=-1) > self.reject_cutoff
+        unsure &= np.array(keys, dtype=object)[:, None] != np.array(keys, dtype=object)[None, :]
+        return [text for text, row in zip(texts, unsure) if row.any()]
+
+    def labels(self, responses: List[str]) -> np.ndarray:
+        self.prefetch(self.ambiguous_texts(responses))
+        return np.fromiter((self.assign(response) for response in responses), dtype=np.int32, count=len(responses))
+
+    def stats(self) -> dict:
+        return {**self.resolved, 'encoded': self.encoded}
+
+
+def cluster_labels_cascade(responses: List[str], model=None, similarity_threshold: float = 0.7,
+                           **options) -> np.ndarray:
+    """
+    Cluster label (0, 1, ... in seed order) for each response; see SimilarityCascade.
+    """
+    return SimilarityCascade(model, similarity_threshold, **options).labels(responses)
+
+
+def mutual_information_estimate_cascade(responses, model=None, similarity_threshold: float = 0.7, **options):
+    return mi_lower_bound(cluster_labels_cascade(responses, model, similarity_threshold, **options))
@@ -1,26 +1,44 @@
-from openai import OpenAI
+import argparse
 import json
-import numpy as np
-import pandas as pd
-from scipy.stats import entropy
+import os
 from datetime import datetime
 
+from conversation import CONTEXT_STRATEGIES, DEFAULT_TOKEN_BUDGET, DEFAULT_WINDOW, Conversation
+from deepseek_client import MODEL, RESPONSE_CACHE, TELEMETRY, USAGE, create_chat_completion, get_openai_client
+from run_journal import RunJournal, load_chains
+from streaming import StreamReport
+from telemetry import labelled
+
 def write_to_file(fileName,data):
     # Write to file in a readable format
+    if os.path.dirname(fileName):
+        os.makedirs(os.path.dirname(fileName), exist_ok=True)
     with open(fileName, "w") as file:
         for item in data:
             file.write(json.dumps(item) + "\n") 
     
 
-API_KEY = "sk-310f243bc1be47e4852d643d3465076b"
-MODEL_NAME = 'deepseek-chat'
-base_url = "https://api.deepseek.com"
+MODEL_NAME = MODEL
+JOURNAL_FILE = 'journals/single-query.jsonl'  # Every response, as it arrives
+MAX_TOKENS = 32  # Answers are one word; 8000 only paid for run-on commentary
+STREAM_STOP = 'first_newline'  # Close the stream once the answer line is complete
+CONTEXT_STRATEGY = 'full'  # The baseline stimulus; bounded prompts (answer_set, window, ...) are opt-in
+
+parser = argparse.ArgumentParser()
+parser.add_argument('--resume', action='store_true',
+                    help="Replay the responses recorded in JOURNAL_FILE, then continue the conversation")
+parser.add_argument('--context', choices=CONTEXT_STRATEGIES, default=CONTEXT_STRATEGY,
+                    help="How much of the conversation each request re-sends")
+parser.add_argument('--window', type=int, default=DEFAULT_WINDOW, help="Answers kept by --context window")
+parser.add_argument('--token-budget', type=int, default=DEFAULT_TOKEN_BUDGET,
+                    help="Prompt token cap for --context token_budget")
+args = parser.parse_args()
 
 current_datetime = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
 current_datetime = current_datetime.replace(" ", "@")
 
 
-client = OpenAI(api_key=API_KEY, base_url=base_url)
+client = get_openai_client()
 
 system_prompt00 = "Respond with one word answers."
 
@@ -30,39 +48,43 @@ system_prompt01 = """
     has one correct answer then continue responding with that answer.
 """
 usr_prompt = "Q: What is the capital of France?"
-system_msg = {'role': "system", 'content':system_prompt01}
-usr_msg = {'role': "user", 'content':usr_prompt}
-
-
-messages = [system_msg, usr_msg]
+conversation = Conversation(system_prompt01, usr_prompt, strategy=args.context,
+                            window=args.window, token_budget=args.token_budget)
 
 iterations = 100
+recorded = load_chains(JOURNAL_FILE).get('conversation', []) if args.resume else []
+journal = RunJournal(JOURNAL_FILE, append=args.resume)
+report = StreamReport('conversation')
 for i in range(iterations):
-    response = client.chat.completions.create(
-        model=MODEL_NAME, 
-        messages=messages,
-        temperature=1.0,
-        max_tokens=8000,
-        stream=False
-    )
-    response_content = response.choices[0].message.content
+    if i < len(recorded):
+        response_content = recorded[i]
+    else:
+        with labelled(query=usr_prompt):
+            response = create_chat_completion(
+                client,
+                sample_index=i,
+                model=MODEL_NAME,
+                messages=conversation.messages(),
+                temperature=1.0,
+                max_tokens=MAX_TOKENS,
+                stop=STREAM_STOP,
+                report=report
+            )
+        response_content = response['choices'][0]['message']['content']
+        journal.record(chain='conversation', iteration=i, response=response_content)
     
-    response_msg = {'role':"assistant", 'content':response_content}
-    messages.append(response_msg)
-    
-    if(i == 0):
-        usr_prompt += f"\n A: {response_content}"
-        msg = {'role':"user", 'content':usr_prompt}
-    
-    if(i != 0):
-        usr_prompt += f"\n Another response: {response_content}"
-        msg = {'role':"user", 'content':usr_prompt}
-    
-    print('i: ', i)
-    messages.append(msg)
+    conversation.add_response(response_content)
+    print('i: ', i, 'prompt tokens: ', conversation.prompt_tokens())
     
+journal.close()
+print(report.format())
+print(f"Sent ~{conversation.prompt_tokens_sent} prompt tokens over {iterations} requests ({args.context} context)")
+
 file_name = f'chats/convo-{current_datetime}.txt'
-write_to_file(file_name, messages)
+write_to_file(file_name, conversation.transcript())
+print(f"Response cache: {RESPONSE_CACHE.stats()}")
+print(USAGE.format())
+print(f"Metrics: {TELEMETRY.export()}")
 
 
 
@@ -0,0 +1,304 @@
+import argparse
+import hashlib
+import json
+import random
+import re
+import threading
+import time
+from dataclasses import dataclass, field, fields
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Dict, Optional
+
+"""
+Local OpenAI-compatible stand-in for the DeepSeek chat completions endpoint.
+
+Serves POST /v1/chat/completions (the requests path) and /chat/completions (the
+OpenAI SDK with base_url) so every runner can be exercised without a key:
+
+    python standin_server.py --port 8089 --config standin.json
+    DEEPSEEK_BASE_URL=http://127.0.0.1:8089 python Experiment02.py
+
+Behavior is set by StandInConfig (a JSON file whose keys are its fields):
+
+    answers       - {query substring: {answer: weight}}; a prompt takes the
+                    distribution of the longest key it contains, else a Zipf-weighted
+                    "Answer 1".."Answer 5" distribution of its own
+    templates     - {format string: weight} wrapped around the answer, e.g. "A: {}."
+    seed          - answers are drawn from Random(seed, prompt, k) for the k-th
+                    request with that prompt, so a run is reproducible request by request
+    latency       - {"distribution": "constant"|"uniform"|"lognormal", ...}; see sample_latency
+    error_rate_429, error_rate_500, retry_after - injected failures
+    honor_n       - return n choices for n > 1 (false: one choice, like an endpoint without n)
+    stream_chunk_delay - seconds between streamed chunks
+
+Responses carry `usage` with prompt_cache_hit_tokens / prompt_cache_miss_tokens from a
+simulated context cache (prefixes seen before, in 64-token units).
+"""
+
+CACHE_UNIT_TOKENS = 64
+CHARS_PER_TOKEN = 4
+
+
+@dataclass
+class StandInConfig:
+    answers: Dict[str, Dict[str, float]] = field(default_factory=dict)
+    templates: Dict[str, float] = field(default_factory=lambda: {"{}.": 0.6, "A: {}.": 0.3, "{}": 0.1})
+    seed: int = 0
+    latency: Dict[str, float] = field(default_factory=lambda: {'distribution': 'lognormal', 'median': 0.05,
+                                                               'sigma': 0.5})
+    error_rate_429: float = 0.0
+    error_rate_500: float = 0.0
+    retry_after: float = 0.1
+    stream_chunk_delay: float = 0.002
+    honor_n: bool = True
+    model: str = 'deepseek-chat'
+
+
+def load_standin_config(path: Optional[str]) -> StandInConfig:
+    if not path:
+        return StandInConfig()
+    with open(path, encoding='utf-8') as file:
+        data = json.load(file)
+    unknown = set(data) - {f.name for f in fields(StandInConfig)}
+    if unknown:
+        raise ValueError(f"{path}: unknown stand-in config keys {sorted(unknown)}")
+    return StandInConfig(**data)
+
+
+def sample_latency(spec: Dict[str, float], rng: random.Random) -> float:
+    """
+    constant: {"seconds"}; uniform: {"low", "high"}; lognormal: {"median", "sigma"}.
+    """
+    distribution = spec.get('distribution', 'constant')
+    if distribution == 'constant':
+        return spec.get('seconds', 0.0)
+    if distribution == 'uniform':
+        return rng.uniform(spec.get('low', 0.0), spec.get('high', 0.0))
+    if distribution == 'lognormal':
+        return spec.get('median', 0.05) * rng.lognormvariate(0.0, spec.get('sigma', 0.5))
+    raise ValueError(f"unknown latency distribution {distribution!r}")
+
+
+def _tokens(text: str) -> int:
+    return len(text) // CHARS_PER_TOKEN + 1
+
+
+def _weighted(choices: Dict[str, float], rng: random.Random) -> str:
+    keys = list(choices)
+    return rng.choices(keys, weights=[choices[k] for k in keys])[0]
+
+
+# ---- Model ----
+class StandInModel:
+    """
+    The request -> response logic, independent of HTTP.
+    """
+
+    def __init__(self, config: StandInConfig):
+        self.config = config
+        self._seen: Dict[str, int] = {}
+        self._prefixes = set()
+        self._lock = threading.Lock()
+        self._fault_rng = random.Random(config.seed)
+        self.requests = 0
+        self.errors = 0
+
+    def _distribution(self, prompt: str) -> Dict[str, float]:
+        matches = [key for key in self.config.answers if key in prompt]
+        if matches:
+            return self.config.answers[max(matches, key=len)]
+        return {f"Answer {i}": 1.0 / i for i in range(1, 6)}
+
+    def _rng(self, prompt: str) -> random.Random:
+        with self._lock:
+            k = self._seen.get(prompt, 0)
+            self._seen[prompt] = k + 1
+        digest = hashlib.sha256(f"{self.config.seed}\0{prompt}\0{k}".encode('utf-8')).digest()
+        return random.Random(int.from_bytes(digest[:8], 'big'))
+
+    def _cache_split(self, prompt: str, prompt_tokens: int) -> tuple:
+        unit = CACHE_UNIT_TOKENS * CHARS_PER_TOKEN
+        keys = [hashlib.sha1(prompt[:end].encode('utf-8')).digest() for end in range(unit, len(prompt) + 1, unit)]
+        with self._lock:
+            hit_units = 0
+            for key in keys:
+                if key not in self._prefixes:
+                    break
+                hit_units += 1
+            self._prefixes.update(keys)
+        hit = min(prompt_tokens, hit_units * CACHE_UNIT_TOKENS)
+        return hit, prompt_tokens - hit
+
+    def fault(self) -> Optional[int]:
+        """
+        429 or 500 to inject for this request, or None.
+        """
+        with self._lock:
+            self.requests += 1
+            roll = self._fault_rng.random()
+            status = (429 if roll < self.config.error_rate_429
+                      else 500 if roll < self.config.error_rate_429 + self.config.error_rate_500 else None)
+            if status:
+                self.errors += 1
+        return status
+
+    def _choice(self, prompt: str, index: int, max_tokens: Optional[int]) -> tuple:
+        rng = self._rng(prompt)
+        answer = _weighted(self.config.templates, rng).format(_weighted(self._distribution(prompt), rng))
+        completion_tokens = _tokens(answer)
+        finish_reason = 'stop'
+        if max_tokens is not None and completion_tokens > max_tokens:
+            answer, completion_tokens, finish_reason = answer[:max_tokens * CHARS_PER_TOKEN], max_tokens, 'length'
+        choice = {'index': index, 'message': {'role': 'assistant', 'content': answer},
+                  'finish_reason': finish_reason, 'logprobs': None}
+        return choice, completion_tokens, rng
+
+    def complete(self, payload: dict) -> tuple:
+        """
+        (chat completion dict, latency to simulate) for a request payload. With n > 1
+        the k-th choice is the answer the k-th of n separate requests would get.
+        """
+        prompt = '\n'.join(str(m.get('content') or '') for m in payload.get('messages', []))
+        choices, completion_tokens, rngs = [], 0, []
+        n = max(1, int(payload.get('n') or 1)) if self.config.honor_n else 1
+        for index in range(n):
+            choice, tokens, rng = self._choice(prompt, index, payload.get('max_tokens'))
+            choices.append(choice)
+            completion_tokens += tokens
+            rngs.append(rng)
+        prompt_tokens = _tokens(prompt)
+        hit, miss = self._cache_split(prompt, prompt_tokens)
+        completion = {
+            'id': f"standin-{rngs[0].getrandbits(64):016x}",
+            'object': 'chat.completion',
+            'created': int(time.time()),
+            'model': payload.get('model', self.config.model),
+            'choices': choices,
+            'usage': {'prompt_tokens': prompt_tokens, 'completion_tokens': completion_tokens,
+                      'total_tokens': prompt_tokens + completion_tokens,
+                      'prompt_cache_hit_tokens': hit, 'prompt_cache_miss_tokens': miss},
+        }
+        return completion, sample_latency(self.config.latency, rngs[0])
+
+
+# ---- HTTP ----
+class StandInHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"  # keep-alive, like the real endpoint
+    disable_nagle_algorithm = True
+    model: StandInModel = None  # set on the subclass made by StandInServer
+
+    def log_message(self, format, *args):
+        pass
+
+    def _send_json(self, status: int, body: dict, headers: Optional[dict] = None) -> None:
+        data = json.dumps(body).encode('utf-8')
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(data)))
+        for name, value in (headers or {}).items():
+            self.send_header(name, value)
+        self.end_headers()
+        self.wfile.write(data)
+
+    def do_POST(self):
+        payload = json.loads(self.rfile.read(int(self.headers.get('Content-Length', 0))) or b'{}')
+        if self.path.rstrip('/') not in ('/v1/chat/completions', '/chat/completions'):
+            self._send_json(404, {'error': {'message': f"no route {self.path}"}})
+            return
+
+        status = self.model.fault()
+        if status == 429:
+            self._send_json(429, {'error': {'message': "Rate limit reached (stand-in)", 'type': 'rate_limit'}},
+                            {'Retry-After': str(self.model.config.retry_after)})
+            return
+        if status == 500:
+            self._send_json(500, {'error': {'message': "Internal error (stand-in)", 'type': 'server_error'}})
+            return
+
+        completion, latency = self.model.complete(payload)
+        if not payload.get('stream'):
+            time.sleep(latency)
+            self._send_json(200, completion)
+            return
+        self._stream(completion, latency, (payload.get('stream_options') or {}).get('include_usage', False))
+
+    def _stream(self, completion: dict, latency: float, include_usage: bool) -> None:
+        self.send_response(200)
+        self.send_header('Content-Type', 'text/event-stream')
+        self.send_header('Transfer-Encoding', 'chunked')
+        self.end_headers()
+
+        def send_event(data: str) -> None:
+            event = f"data: {data}\n\n".encode('utf-8')
+            self.wfile.write(f"{len(event):x}\r\n".encode('ascii') + event + b"\r\n")
+            self.wfile.flush()
+
+        def chunk(choices: list, usage=None) -> str:
+            return json.dumps({'id': completion['id'], 'object': 'chat.completion.chunk',
+                               'created': completion['created'], 'model': completion['model'],
+                               'choices': choices, 'usage': usage})
+
+        time.sleep(latency)  # time to first token
+        try:
+            for choice in completion['choices']:
+                for piece in re.findall(r'\S+\s*|\s+', choice['message']['content']):
+                    send_event(chunk([{'index': choice['index'], 'delta': {'content': piece}, 'finish_reason': None}]))
+                    time.sleep(self.model.config.stream_chunk_delay)
+                send_event(chunk([{'index': choice['index'], 'delta': {}, 'finish_reason': choice['finish_reason']}]))
+            if include_usage:
+                send_event(chunk([], completion['usage']))
+            send_event('[DONE]')
+            self.wfile.write(b"0\r\n\r\n")
+        except (BrokenPipeError, ConnectionResetError):
+            self.close_connection = True  # the client stopped reading early
+
+
+class StandInServer:
+    """
+    The stand-in on a background thread: `with StandInServer(config) as server: server.base_url`.
+    """
+
+    def __init__(self, config: Optional[StandInConfig] = None, host: str = '127.0.0.1', port: int = 0):
+        self.model = StandInModel(config or StandInConfig())
+        handler = type('BoundStandInHandler', (StandInHandler,), {'model': self.model})
+        self.httpd = ThreadingHTTPServer((host, port), handler)
+        self.httpd.daemon_threads = True
+        self.base_url = f"http://{host}:{self.httpd.server_port}"
+        self._thread = None
+
+    def start(self) -> 'StandInServer':
+        self._thread = threading.Thread(target=self.httpd.serve_forever, daemon=True, name='standin-server')
+        self._thread.start()
+        return self
+
+    def stop(self) -> None:
+        self.httpd.shutdown()
+        self.httpd.server_close()
+
+    def __enter__(self) -> 'StandInServer':
+        return self.start()
+
+    def __exit__(self, *exc) -> None:
+        self.stop()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Local OpenAI-compatible stand-in for DeepSeek")
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=8089)
+    parser.add_argument('--config', help="StandInConfig JSON file")
+    args = parser.parse_args()
+
+    server = StandInServer(load_standin_config(args.config), host=args.host, port=args.port)
+    print(f"Stand-in listening; run the scripts with DEEPSEEK_BASE_URL={server.base_url}")
+    try:
+        server.httpd.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.httpd.server_close()
+        print(f"Served {server.model.requests} requests ({server.model.errors} injected errors)")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,195 @@
+import json
+import re
+import threading
+import time
+from typing import Callable, Dict, Iterable, Optional
+
+"""
+Streaming chat completions with early termination.
+
+Answers are meant to be one word or one line, but the model often keeps going
+("A: Manchester.  (Note: Los Angeles is not a city in the UK...)"). In streaming mode
+the text is checked after every chunk against an answer-complete condition, and the
+stream is closed as soon as it is met, so the trailing commentary is neither waited
+for nor (mostly) generated. Every live stream records time-to-first-token and total
+latency; StreamReport aggregates them and estimates the tokens and seconds saved.
+
+Stop conditions map the text so far to the cut position, or None to keep reading:
+
+    first_newline  - stop at the first non-leading newline
+    first_sentence - stop after the first '.', '!' or '?' followed by whitespace
+    pattern:<re>   - stop at the first match of the regular expression
+"""
+
+StopCondition = Callable[[str], Optional[int]]
+
+
+# ---- Stop Conditions ----
+def first_newline(text: str) -> Optional[int]:
+    stripped = len(text) - len(text.lstrip())
+    index = text.find('\n', stripped)
+    return index if index != -1 else None
+
+
+_SENTENCE_END = re.compile(r'[.!?](?=\s)')
+
+
+def first_sentence(text: str) -> Optional[int]:
+    match = _SENTENCE_END.search(text, len(text) - len(text.lstrip()))
+    return match.end() if match else None
+
+
+def stop_pattern(pattern: str) -> StopCondition:
+    compiled = re.compile(pattern)
+
+    def condition(text: str) -> Optional[int]:
+        match = compiled.search(text)
+        return match.start() if match else None
+    return condition
+
+
+STOP_CONDITIONS: Dict[str, StopCondition] = {
+    'first_newline': first_newline,
+    'first_sentence': first_sentence,
+}
+
+
+def get_stop_condition(name: Optional[str]) -> Optional[StopCondition]:
+    if name is None:
+        return None
+    if name.startswith('pattern:'):
+        return stop_pattern(name[len('pattern:'):])
+    if name not in STOP_CONDITIONS:
+        raise ValueError(f"Unknown stop condition {name!r}; expected one of "
+                         f"{sorted(STOP_CONDITIONS)} or 'pattern:<regex>'")
+    return STOP_CONDITIONS[name]
+
+
+# ---- Stream Consumers ----
+def _consume(deltas: Iterable[tuple], stop: Optional[StopCondition], start: float, close: Callable) -> dict:
+    """
+    deltas yields (content_delta, usage_or_None, finish_reason_or_None) per chunk.
+    Returns a chat-completion-shaped dict with a 'stream' section of timings.
+    """
+    text, chunks, ttft, usage, finish_reason, cancelled = '', 0, None, None, None, False
+    try:
+        for delta, chunk_usage, chunk_finish in deltas:
+            usage = chunk_usage or usage
+            finish_reason = chunk_finish or finish_reason
+            if not delta:
+                continue
+            if ttft is None:
+                ttft = time.perf_counter() - start
+            text += delta
+            chunks += 1
+            cut = stop(text) if stop else None
+            if cut is not None:
+                text, cancelled, finish_reason = text[:cut], True, 'stop_condition'
+                break
+    finally:
+        close()
+
+    latency = time.perf_counter() - start
+    completion_tokens = usage['completion_tokens'] if usage and not cancelled else chunks
+    return {
+        'choices': [{'index': 0, 'message': {'role': 'assistant', 'content': text},
+                     'finish_reason': finish_reason}],
+        'usage': usage,
+        'stream': {'ttft': ttft, 'latency': latency, 'cancelled': cancelled,
+                   'completion_tokens': completion_tokens},
+    }
+
+
+def iter_sse_deltas(lines: Iterable) -> Iterable[tuple]:
+    """
+    (content_delta, usage, finish_reason) from the `data: {...}` lines of an SSE body.
+    """
+    for line in lines:
+        if isinstance(line, bytes):
+            line = line.decode('utf-8')
+        if not line.startswith('data:'):
+            continue
+        data = line[len('data:'):].strip()
+        if data == '[DONE]':
+            return
+        chunk = json.loads(data)
+        choice = (chunk.get('choices') or [{}])[0]
+        yield (choice.get('delta') or {}).get('content'), chunk.get('usage'), choice.get('finish_reason')
+
+
+def consume_http_stream(response, stop: Optional[StopCondition], start: float) -> dict:
+    """
+    Read a streaming `requests`/`httpx` response, closing it early when `stop` fires.
+    """
+    lines = response.iter_lines()
+    return _consume(iter_sse_deltas(lines), stop, start, response.close)
+
+
+def consume_openai_stream(stream, stop: Optional[StopCondition], start: float) -> dict:
+    """
+    Read an OpenAI-SDK `Stream[ChatCompletionChunk]`, closing it early when `stop` fires.
+    """
+    def deltas():
+        for chunk in stream:
+            choice = chunk.choices[0] if chunk.choices else None
+            usage = chunk.usage.model_dump() if getattr(chunk, 'usage', None) else None
+            yield (choice.delta.content if choice else None), usage, (choice.finish_reason if choice else None)
+
+    return _consume(deltas(), stop, start, stream.close)
+
+
+# ---- Run Report ----
+class StreamReport:
+    """
+    Per-experiment streaming stats. Savings are estimates: a cancelled stream is assumed
+    to have saved the tokens of an average completed stream beyond what it received
+    (or `baseline_completion_tokens` when none completed), at the observed decode rate.
+    """
+
+    def __init__(self, name: str, baseline_completion_tokens: Optional[float] = None):
+        self.name = name
+        self.baseline_completion_tokens = baseline_completion_tokens
+        self.streams = []
+        self._lock = threading.Lock()
+
+    def record(self, response: dict) -> None:
+        stats = response.get('stream')
+        if stats:
+            with self._lock:
+                self.streams.append(stats)
+
+    def summary(self) -> dict:
+        with self._lock:
+            streams = list(self.streams)
+        if not streams:
+            return {'experiment': self.name, 'streams': 0}
+
+        completed = [s for s in streams if not s['cancelled']]
+        cancelled = [s for s in streams if s['cancelled']]
+        baseline = (sum(s['completion_tokens'] for s in completed) / len(completed) if completed
+                    else self.baseline_completion_tokens)
+        decoding = [s for s in streams if s['ttft'] is not None and s['completion_tokens'] > 1]
+        seconds_per_token = (sum(s['latency'] - s['ttft'] for s in decoding)
+                             / max(1, sum(s['completion_tokens'] - 1 for s in decoding))) if decoding else 0.0
+        tokens_saved = sum(max(0.0, baseline - s['completion_tokens']) for s in cancelled) if baseline else None
+        ttfts = [s['ttft'] for s in streams if s['ttft'] is not None]
+        return {
+            'experiment': self.name,
+            'streams': len(streams),
+            'cancelled': len(cancelled),
+            'mean_ttft_s': sum(ttfts) / len(ttfts) if ttfts else None,
+            'mean_latency_s': sum(s['latency'] for s in streams) / len(streams),
+            'completion_tokens_received': sum(s['completion_tokens'] for s in streams),
+            'est_tokens_saved': tokens_saved,
+            'est_seconds_saved': tokens_saved * seconds_per_token if tokens_saved is not None else None,
+        }
+
+    def format(self) -> str:
+        summary = self.summary()
+        if not summary['streams']:
+            return f"[{self.name}] no live streams"
+        saved_tokens = summary['est_tokens_saved']
+        saved_seconds = summary['est_seconds_saved']
+        return (f"[{self.name}] {summary['streams']} streams, {summary['cancelled']} stopped early, "
+                f"TTFT {summary['mean_ttft_s'] or 0:.3f}s, latency {summary['mean_latency_s']:.3f}s, "
+                f"~{saved_tokens or 0:.0f} tokens / ~{saved_seconds or 0:.1f}s saved")
@@ -0,0 +1,263 @@
+import contextvars
+import json
+import os
+import sys
+import threading
+import time
+from bisect import bisect_left
+from contextlib import contextmanager
+from typing import Dict, List, Optional, Tuple
+
+from usage_report import cache_split
+
+"""
+Per-call telemetry for model calls.
+
+Every call through deepseek_client records its wall latency, prompt and completion
+tokens, status, retries, whether the local response cache served it, and how many
+prompt tokens DeepSeek's context cache served. Latency and token counts go into
+fixed-bucket histograms kept per (experiment, query); counters cover the rest.
+
+At the end of a run `export` writes both a Prometheus text-format file (for the
+node_exporter textfile collector, or to diff by eye) and a JSON summary with
+per-experiment and per-query quantiles.
+
+The experiment and query labels come from context: the experiment engine labels each
+chain with its query, run_grid labels each spec, and the experiment label defaults to
+the running script's name.
+"""
+
+DEFAULT_METRICS_DIR = os.environ.get('DEEPSEEK_METRICS_DIR', 'metrics')
+
+LATENCY_BUCKETS = (0.05, 0.1, 0.25, 0.5, 1, 2, 4, 8, 15, 30, 60, 120)
+TOKEN_BUCKETS = tuple(2 ** i for i in range(16))  # 1 .. 32768
+
+_labels: contextvars.ContextVar = contextvars.ContextVar('telemetry_labels', default={})
+_call_record: contextvars.ContextVar = contextvars.ContextVar('telemetry_call_record', default=None)
+
+
+# ---- Labels ----
+@contextmanager
+def labelled(**labels):
+    """
+    Attach labels (experiment=..., query=...) to every call made in this context.
+    """
+    token = _labels.set({**_labels.get(), **labels})
+    try:
+        yield
+    finally:
+        _labels.reset(token)
+
+
+def capture_call() -> dict:
+    """
+    Have the next call recorded in this context also fill the returned dict (latency_s,
+    status, retries, source, prompt_tokens, completion_tokens), for per-response storage.
+    """
+    record = {}
+    _call_record.set(record)
+    return record
+
+
+def current_labels() -> Tuple[str, str]:
+    labels = _labels.get()
+    experiment = labels.get('experiment') or os.path.splitext(os.path.basename(sys.argv[0]))[0] or 'interactive'
+    return experiment, labels.get('query', '')
+
+
+# ---- Histogram ----
+class Histogram:
+    def __init__(self, buckets: tuple):
+        self.buckets = buckets
+        self.counts = [0] * (len(buckets) + 1)  # the last slot is +Inf
+        self.sum = 0.0
+        self.count = 0
+
+    def observe(self, value: float) -> None:
+        self.counts[bisect_left(self.buckets, value)] += 1
+        self.sum += value
+        self.count += 1
+
+    def merge(self, other: 'Histogram') -> None:
+        self.counts = [a + b for a, b in zip(self.counts, other.counts)]
+        self.sum += other.sum
+        self.count += other.count
+
+    def quantile(self, q: float) -> Optional[float]:
+        """
+        Linear interpolation inside the bucket, like PromQL's histogram_quantile.
+        """
+        if not self.count:
+            return None
+        rank = q * self.count
+        cumulative = 0
+        for i, count in enumerate(self.counts):
+            if count and cumulative + count >= rank:
+                if i == len(self.buckets):
+                    return float(self.buckets[-1])
+                lower = self.buckets[i - 1] if i else 0.0
+                return lower + (self.buckets[i] - lower) * (rank - cumulative) / count
+            cumulative += count
+        return float(self.buckets[-1])
+
+    def summary(self) -> dict:
+        return {'count': self.count, 'sum': self.sum,
+                'mean': self.sum / self.count if self.count else None,
+                'p50': self.quantile(0.5), 'p90': self.quantile(0.9), 'p99': self.quantile(0.99)}
+
+
+class _Series:
+    def __init__(self):
+        self.latency = Histogram(LATENCY_BUCKETS)
+        self.prompt_tokens = Histogram(TOKEN_BUCKETS)
+        self.completion_tokens = Histogram(TOKEN_BUCKETS)
+        self.calls: Dict[Tuple[str, str], int] = {}  # (status, source) -> count
+        self.retries = 0
+        self.context_cache_hit_tokens = 0
+        self.context_cache_miss_tokens = 0
+
+    def merge(self, other: '_Series') -> None:
+        self.latency.merge(other.latency)
+        self.prompt_tokens.merge(other.prompt_tokens)
+        self.completion_tokens.merge(other.completion_tokens)
+        for key, count in other.calls.items():
+            self.calls[key] = self.calls.get(key, 0) + count
+        self.retries += other.retries
+        self.context_cache_hit_tokens += other.context_cache_hit_tokens
+        self.context_cache_miss_tokens += other.context_cache_miss_tokens
+
+    def summary(self) -> dict:
+        calls = sum(self.calls.values())
+        cached = sum(count for (_, source), count in self.calls.items() if source == 'response_cache')
+        shared = sum(count for (_, source), count in self.calls.items() if source == 'multi_sample')
+        errors = sum(count for (status, _), count in self.calls.items() if status != '200')
+        return {
+            'calls': calls,
+            'api_calls': calls - cached - shared,
+            'response_cache_hits': cached,
+            'multi_sample_shares': shared,
+            'errors': errors,
+            'retries': self.retries,
+            'status': {status: sum(c for (s, _), c in self.calls.items() if s == status)
+                       for status in sorted({s for s, _ in self.calls})},
+            'latency_s': self.latency.summary(),
+            'prompt_tokens': self.prompt_tokens.summary(),
+            'completion_tokens': self.completion_tokens.summary(),
+            'context_cache_hit_tokens': self.context_cache_hit_tokens,
+            'context_cache_miss_tokens': self.context_cache_miss_tokens,
+        }
+
+
+# ---- Registry ----
+def _escape(value) -> str:
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+class Telemetry:
+    def __init__(self):
+        self.started = time.time()
+        self._series: Dict[Tuple[str, str], _Series] = {}
+        self._lock = threading.Lock()
+
+    def record_call(self, latency: float, status, retries: int = 0, usage: Optional[dict] = None,
+                    source: str = 'api') -> None:
+        """
+        One model call. `source` is 'api', 'response_cache' or 'multi_sample' (a choice
+        handed out from another caller's n>1 call); only API calls feed the latency
+        and token histograms.
+        """
+        record = _call_record.get()
+        if record is not None:
+            record.update(latency_s=latency, status=str(status), retries=retries, source=source,
+                          prompt_tokens=(usage or {}).get('prompt_tokens'),
+                          completion_tokens=(usage or {}).get('completion_tokens'))
+        key = current_labels()
+        with self._lock:
+            series = self._series.get(key)
+            if series is None:
+                series = self._series[key] = _Series()
+            calls_key = (str(status), source)
+            series.calls[calls_key] = series.calls.get(calls_key, 0) + 1
+            series.retries += retries
+            if source != 'api':
+                return
+            series.latency.observe(latency)
+            if usage:
+                series.prompt_tokens.observe(usage.get('prompt_tokens') or 0)
+                series.completion_tokens.observe(usage.get('completion_tokens') or 0)
+                hit, miss = cache_split(usage)
+                series.context_cache_hit_tokens += hit
+                series.context_cache_miss_tokens += miss
+
+    def _snapshot(self) -> Dict[Tuple[str, str], _Series]:
+        with self._lock:
+            snapshot = {}
+            for key, series in self._series.items():
+                snapshot[key] = copy = _Series()
+                copy.merge(series)
+            return snapshot
+
+    # ---- Export ----
+    def summary(self) -> dict:
+        experiments: Dict[str, dict] = {}
+        totals: Dict[str, _Series] = {}
+        for (experiment, query), series in sorted(self._snapshot().items()):
+            totals.setdefault(experiment, _Series()).merge(series)
+            experiments.setdefault(experiment, {'queries': {}})['queries'][query] = series.summary()
+        for experiment, total in totals.items():
+            experiments[experiment].update(total.summary())
+        return {'started': self.started, 'finished': time.time(), 'experiments': experiments}
+
+    def prometheus(self) -> str:
+        lines: List[str] = []
+        snapshot = sorted(self._snapshot().items())
+
+        def label_text(experiment: str, query: str, **extra) -> str:
+            labels = {'experiment': experiment, 'query': query, **extra}
+            return '{' + ','.join(f'{name}="{_escape(value)}"' for name, value in labels.items()) + '}'
+
+        def histogram(name: str, help_text: str, attribute: str) -> None:
+            lines.extend([f"# HELP {name} {help_text}", f"# TYPE {name} histogram"])
+            for (experiment, query), series in snapshot:
+                h = getattr(series, attribute)
+                cumulative = 0
+                for bound, count in zip(h.buckets + (float('inf'),), h.counts):
+                    cumulative += count
+                    le = '+Inf' if bound == float('inf') else repr(float(bound))
+                    lines.append(f"{name}_bucket{label_text(experiment, query, le=le)} {cumulative}")
+                lines.append(f"{name}_sum{label_text(experiment, query)} {h.sum}")
+                lines.append(f"{name}_count{label_text(experiment, query)} {h.count}")
+
+        def counter(name: str, help_text: str, values) -> None:
+            lines.extend([f"# HELP {name} {help_text}", f"# TYPE {name} counter"])
+            lines.extend(f"{name}{labels} {value}" for labels, value in values)
+
+        histogram('deepseek_call_latency_seconds', "Wall latency of API calls, retries included.", 'latency')
+        histogram('deepseek_prompt_tokens', "Prompt tokens per API call.", 'prompt_tokens')
+        histogram('deepseek_completion_tokens', "Completion tokens per API call.", 'completion_tokens')
+        counter('deepseek_calls_total', "Model calls by status and source (api, response_cache or multi_sample).",
+                [(label_text(e, q, status=status, source=source), count)
+                 for (e, q), s in snapshot for (status, source), count in sorted(s.calls.items())])
+        counter('deepseek_retries_total', "Retried attempts (429/5xx/transport errors).",
+                [(label_text(e, q), s.retries) for (e, q), s in snapshot])
+        counter('deepseek_context_cache_hit_tokens_total', "Prompt tokens served by the context cache.",
+                [(label_text(e, q), s.context_cache_hit_tokens) for (e, q), s in snapshot])
+        counter('deepseek_context_cache_miss_tokens_total', "Prompt tokens not served by the context cache.",
+                [(label_text(e, q), s.context_cache_miss_tokens) for (e, q), s in snapshot])
+        return '\n'.join(lines) + '\n'
+
+    def export(self, name: Optional[str] = None, directory: str = DEFAULT_METRICS_DIR) -> Tuple[str, str]:
+        """
+        Write <directory>/<name>.prom and <directory>/<name>.json (name defaults to the
+        script's); returns both paths. Files are replaced atomically so a scraper never
+        reads half of one.
+        """
+        name = name or current_labels()[0]
+        os.makedirs(directory, exist_ok=True)
+        paths = (os.path.join(directory, f'{name}.prom'), os.path.join(directory, f'{name}.json'))
+        contents = (self.prometheus(), json.dumps(self.summary(), indent=2))
+        for path, content in zip(paths, contents):
+            with open(path + '.tmp', 'w', encoding='utf-8') as file:
+                file.write(content)
+            os.replace(path + '.tmp', path)
+        return paths
@@ -0,0 +1,93 @@
+import os
+import threading
+from typing import Dict, Optional
+
+"""
+Token usage and context-cache accounting.
+
+DeepSeek serves repeated prompt prefixes from its context cache, bills those tokens at
+a fraction of the normal input price and reports the split in `usage` as
+`prompt_cache_hit_tokens` / `prompt_cache_miss_tokens`. UsageReport keeps that split
+(and the latency) for every live call and summarizes it, so the effect of a prompt
+layout shows up directly as hit rate, latency and cost.
+
+Calls served by the local response cache are not API calls and are not recorded.
+Streams cut short by a stop condition never receive the final usage chunk; they are
+counted as calls without usage.
+"""
+
+# USD per million tokens (deepseek-chat list prices); override for other models
+PRICES_PER_MILLION: Dict[str, float] = {
+    'cache_hit': float(os.environ.get('DEEPSEEK_PRICE_CACHE_HIT', 0.07)),
+    'cache_miss': float(os.environ.get('DEEPSEEK_PRICE_CACHE_MISS', 0.27)),
+    'output': float(os.environ.get('DEEPSEEK_PRICE_OUTPUT', 1.10)),
+}
+
+
+def cache_split(usage: Optional[dict]) -> tuple:
+    """
+    (hit, miss) prompt tokens from a usage dict; servers without a context cache count as all miss.
+    """
+    if not usage:
+        return 0, 0
+    hit = usage.get('prompt_cache_hit_tokens') or 0
+    miss = usage.get('prompt_cache_miss_tokens')
+    if miss is None:
+        miss = max(0, (usage.get('prompt_tokens') or 0) - hit)
+    return hit, miss
+
+
+class UsageReport:
+    def __init__(self, name: str):
+        self.name = name
+        self.calls = []  # (prompt_cache_hit_tokens, prompt_cache_miss_tokens, completion_tokens, latency) or None usage
+        self._lock = threading.Lock()
+
+    def record(self, usage: Optional[dict], latency: float) -> None:
+        if usage:
+            hit, miss = cache_split(usage)
+            entry = (hit, miss, usage.get('completion_tokens') or 0, latency)
+        else:
+            entry = (None, None, None, latency)
+        with self._lock:
+            self.calls.append(entry)
+
+    def summary(self) -> dict:
+        with self._lock:
+            calls = list(self.calls)
+        reported = [c for c in calls if c[0] is not None]
+        hit = sum(c[0] for c in reported)
+        miss = sum(c[1] for c in reported)
+        completion = sum(c[2] for c in reported)
+        # A call "hits" when most of its prompt came from the context cache
+        hit_latencies = [c[3] for c in reported if c[0] > c[1]]
+        miss_latencies = [c[3] for c in reported if c[0] <= c[1]]
+        cost = (hit * PRICES_PER_MILLION['cache_hit'] + miss * PRICES_PER_MILLION['cache_miss']
+                + completion * PRICES_PER_MILLION['output']) / 1e6
+        return {
+            'experiment': self.name,
+            'calls': len(calls),
+            'calls_with_usage': len(reported),
+            'prompt_tokens': hit + miss,
+            'prompt_cache_hit_tokens': hit,
+            'prompt_cache_miss_tokens': miss,
+            'cache_hit_rate': hit / (hit + miss) if hit + miss else 0.0,
+            'completion_tokens': completion,
+            'mean_latency_cache_hit_s': sum(hit_latencies) / len(hit_latencies) if hit_latencies else None,
+            'mean_latency_cache_miss_s': sum(miss_latencies) / len(miss_latencies) if miss_latencies else None,
+            'est_cost_usd': cost,
+            'est_cache_savings_usd': hit * (PRICES_PER_MILLION['cache_miss'] - PRICES_PER_MILLION['cache_hit']) / 1e6,
+        }
+
+    def format(self) -> str:
+        s = self.summary()
+        if not s['calls']:
+            return f"[{self.name}] no API calls"
+
+        def seconds(value):
+            return f"{value:.3f}s" if value is not None else "-"
+        return (f"[{self.name}] {s['calls']} calls ({s['calls_with_usage']} with usage), "
+                f"{s['prompt_tokens']} prompt tokens, {s['cache_hit_rate']:.0%} from context cache; "
+                f"latency {seconds(s['mean_latency_cache_hit_s'])} on cache hits vs "
+                f"{seconds(s['mean_latency_cache_miss_s'])} on misses; "
+                f"~${s['est_cost_usd']:.4f} (${s['est_cache_savings_usd']:.4f} saved by the cache)")